@@ -8,6 +8,7 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import os
 from dotenv import load_dotenv
+from connector import WorkflowAPIConnector
 
 # Load environment variables
 load_dotenv()
@@ -15,6 +16,10 @@ load_dotenv()
 # Configuration
 API_URL = os.getenv("API_URL", "http://localhost:8000")
 REFRESH_INTERVAL = 5  # Seconds between dashboard updates
+connector = WorkflowAPIConnector(API_URL)
+
+# Dashboard status of an email after the node of a run progress event
+EMAIL_STATUS = {"send_email": "replied", "skip_unrelated_email": "skipped"}
 
 # Set page configuration
 st.set_page_config(
@@ -146,12 +151,48 @@ if 'last_refresh' not in st.session_state:
 if 'workflow_status' not in st.session_state:
     st.session_state.workflow_status = "Stopped"
 
+# Background run followed live, and the id of its last event received
+if 'current_run_id' not in st.session_state:
+    st.session_state.current_run_id = None
+
+if 'run_event_cursor' not in st.session_state:
+    st.session_state.run_event_cursor = 0
+
 def format_datetime(dt):
     """Format datetime for display."""
     if isinstance(dt, datetime):
         return dt.strftime("%Y-%m-%d %H:%M:%S")
     return dt
 
+def apply_run_event(event):
+    """Update the dashboard state from a progress event of the current run."""
+    if event["event"] == "status":
+        level = "ERROR" if event["status"] == "failed" else "INFO"
+        message = f"Run {st.session_state.current_run_id[:8]} {event['status']}"
+        if event.get("error"):
+            message += f": {event['error']}"
+        st.session_state.workflow_logs.append({"timestamp": datetime.now(), "message": message, "level": level})
+        if event["status"] in ("succeeded", "failed"):
+            st.session_state.workflow_status = "Stopped"
+        return
+    email_id = event.get("email_id")
+    if not email_id:
+        return
+    email = next((e for e in st.session_state.processed_emails if e["id"] == email_id), None)
+    if email is None:
+        email = {"id": email_id, "timestamp": datetime.now(), "subject": "", "sender": "",
+                 "category": "", "status": "pending", "response": ""}
+        st.session_state.processed_emails.append(email)
+    if event.get("category") and not email["category"]:
+        email["category"] = event["category"]
+        categories = st.session_state.email_categories
+        categories[email["category"]] = categories.get(email["category"], 0) + 1
+        st.session_state.workflow_logs.append({
+            "timestamp": datetime.now(), "message": f"Categorized {email_id} as: {email['category']}", "level": "INFO"
+        })
+    email["status"] = EMAIL_STATUS.get(event["node"], email["status"])
+    email["timestamp"] = datetime.now()
+
 # Sidebar
 with st.sidebar:
     st.markdown("### 🔧 Controls")
@@ -166,32 +207,30 @@ with st.sidebar:
                 "level": "INFO"
             })
             
-            # Call the API to start the workflow
-            try:
-                response = requests.post(f"{API_URL}/invoke", 
-                                         json={"input": {"emails": [], "current_email": {}, "email_category": "", "generated_email": ""}})
-                if response.status_code == 200:
-                    st.session_state.workflow_logs.append({
-                        "timestamp": datetime.now(),
-                        "message": "API call successful",
-                        "level": "INFO"
-                    })
-                else:
-                    st.session_state.workflow_logs.append({
-                        "timestamp": datetime.now(),
-                        "message": f"API error: {response.status_code} - {response.text}",
-                        "level": "ERROR"
-                    })
-            except Exception as e:
+            # Start a background run, its progress is followed below
+            result = connector.start_run()
+            if result["success"]:
+                st.session_state.current_run_id = result["data"]["run_id"]
+                st.session_state.run_event_cursor = 0
+                st.session_state.run_count += 1
+                st.session_state.workflow_logs.append({
+                    "timestamp": datetime.now(),
+                    "message": f"Run {st.session_state.current_run_id[:8]} queued",
+                    "level": "INFO"
+                })
+            else:
+                st.session_state.workflow_status = "Stopped"
                 st.session_state.workflow_logs.append({
                     "timestamp": datetime.now(),
-                    "message": f"Error calling API: {str(e)}",
+                    "message": f"Error calling API: {result['error']}",
                     "level": "ERROR"
                 })
             
     with col2:
         if st.button("🛑 Stop Workflow", use_container_width=True):
+            # Stops following the run, the API finishes it in the background
             st.session_state.workflow_status = "Stopped"
+            st.session_state.current_run_id = None
             st.session_state.workflow_logs.append({
                 "timestamp": datetime.now(),
                 "message": "Workflow stopped manually",
@@ -535,29 +574,56 @@ with tab4:
         else:
             st.info("No email processing data available yet.")
     
-    # Processing time metrics (if we had real data)
-    st.markdown('<h2 class="subheader">Processing Performance</h2>', unsafe_allow_html=True)
-    
-    # Mock performance data
-    performance_data = {
-        "category": ["pricing", "support", "marketing", "billing", "technical"],
-        "avg_time": [15.2, 22.7, 8.5, 18.3, 25.1]
-    }
-    
-    fig = go.Figure(data=[go.Bar(
-        x=performance_data["category"],
-        y=performance_data["avg_time"],
-        marker_color='#1976D2'
-    )])
-    
-    fig.update_layout(
-        title="Average Processing Time by Email Category (seconds)",
-        xaxis_title="Email Category",
-        yaxis_title="Average Time (s)",
-        height=400
-    )
+    # Inbox-to-draft latency per category and stage, against the SLA
+    st.markdown('<h2 class="subheader">Inbox-to-Draft Latency</h2>', unsafe_allow_html=True)
     
-    st.plotly_chart(fig, use_container_width=True)
+    sla = connector.get_sla_report()
+    if not sla["success"]:
+        st.warning(f"Could not load the SLA report: {sla['error']}")
+    elif not sla["data"]["categories"]:
+        st.info("No drafted email with a known arrival time yet.")
+    else:
+        for category in sla["data"]["alerts"]:
+            st.error(f"SLA breached for {category}")
+        
+        categories = sla["data"]["categories"]
+        stages = ["detection", "queue_wait", "processing", "gmail_write"]
+        fig = go.Figure(data=[
+            go.Bar(
+                name=stage,
+                x=list(categories),
+                y=[(report["stages"].get(stage) or {}).get("p95_seconds") or 0 for report in categories.values()]
+            )
+            for stage in stages
+        ])
+        fig.add_trace(go.Scatter(
+            name="SLA",
+            x=list(categories),
+            y=[report["sla_seconds"] for report in categories.values()],
+            mode="markers",
+            marker=dict(symbol="line-ew-open", size=40, color="#E53935")
+        ))
+        fig.update_layout(
+            barmode="stack",
+            title="p95 Inbox-to-Draft Latency by Email Category and Stage (seconds)",
+            xaxis_title="Email Category",
+            yaxis_title="Seconds",
+            height=400
+        )
+        st.plotly_chart(fig, use_container_width=True)
+        
+        st.dataframe(pd.DataFrame([
+            {
+                "category": category,
+                "drafts": (report["stages"].get("total") or {}).get("count", 0),
+                "p50 total (s)": (report["stages"].get("total") or {}).get("p50_seconds"),
+                "p95 total (s)": (report["stages"].get("total") or {}).get("p95_seconds"),
+                "max total (s)": (report["stages"].get("total") or {}).get("max_seconds"),
+                "SLA (s)": report["sla_seconds"],
+                "breaches": report["breaches"],
+            }
+            for category, report in categories.items()
+        ]), use_container_width=True)
 
 # Auto-refresh mechanism
 st.markdown("---")
@@ -572,15 +638,26 @@ if auto_refresh:
     # For demo purposes, we're just updating the last refresh time
     st.session_state.last_refresh = datetime.now()
     
-    # In a production app, you would call your API to get updated status
-    # Example:
-    # try:
-    #     response = requests.get(f"{API_URL}/status")
-    #     if response.status_code == 200:
-    #         data = response.json()
-    #         update_session_state_from_data(data)
-    # except Exception as e:
-    #     st.error(f"Error refreshing data: {str(e)}")
+    # Follow the current run live: the API pushes its progress events, no polling
+    run_id = st.session_state.current_run_id
+    if run_id and st.session_state.workflow_status == "Running":
+        refresh_placeholder.markdown(f"Following run {run_id[:8]} live...")
+        for message in connector.stream_run_events(run_id, after=st.session_state.run_event_cursor):
+            if not message["success"]:
+                st.session_state.workflow_logs.append({
+                    "timestamp": datetime.now(),
+                    "message": f"Lost run progress stream: {message['error']}",
+                    "level": "ERROR"
+                })
+                st.session_state.workflow_status = "Stopped"
+                break
+            st.session_state.run_event_cursor = message["data"]["id"]
+            apply_run_event(message["data"])
+            refresh_placeholder.markdown(
+                f"Following run {run_id[:8]} live: {len(st.session_state.processed_emails)} emails seen..."
+            )
+        # Redraw the dashboard with the run's results
+        st.rerun()
     
     # This would trigger a refresh after the specified interval
     if auto_refresh:
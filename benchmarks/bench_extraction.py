@@ -0,0 +1,69 @@
+"""
+Benchmark of the structured-field extractor.
+
+Measures extraction throughput and the prompt tokens saved when the writer and
+proofreader receive the extracted fields instead of the full email body.
+
+Usage: python -m benchmarks.bench_extraction [--emails 20000]
+"""
+import argparse
+import json
+import time
+from src.state import Email
+from src.extraction import extract_fields, format_fields
+from src.prompts import EMAIL_WRITER_PROMPT, EMAIL_PROOFREADER_PROMPT, EMAIL_PROOFREADER_INPUT
+from src.tokens import count_tokens
+
+# Writer runs up to 3 times per email, each draft is proofread
+MAX_TRIALS = 3
+
+
+def load_emails(path="test_email.json"):
+    with open(path) as f:
+        return [Email(**email) for email in json.load(f)]
+
+
+def prompt_tokens(email, fields_only):
+    """Tokens of one writer call plus one proofreader call for an email."""
+    fields = format_fields(extract_fields(email))
+    if fields_only:
+        context = f"# **EMAIL SUBJECT:** {email.subject}"
+    else:
+        context = f"# **EMAIL CONTENT:**\n{email.body}"
+    writer_input = (
+        f"# **EMAIL CATEGORY:** maturity_reinvestment\n\n"
+        f"# **EXTRACTED FIELDS:**\n{fields}\n\n{context}\n\n# **INFORMATION:**\n"
+    )
+    proofreader_input = EMAIL_PROOFREADER_PROMPT + EMAIL_PROOFREADER_INPUT.format(
+        initial_email=context, email_fields=fields, generated_email=""
+    )
+    return count_tokens(EMAIL_WRITER_PROMPT + writer_input) + count_tokens(proofreader_input)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--emails", type=int, default=20000, help="Number of emails to extract")
+    args = parser.parse_args()
+
+    emails = load_emails()
+    batch = [emails[i % len(emails)] for i in range(args.emails)]
+
+    # Throughput
+    start = time.perf_counter()
+    for email in batch:
+        extract_fields(email)
+    elapsed = time.perf_counter() - start
+    print(f"Extracted {len(batch)} emails in {elapsed:.3f}s "
+          f"({len(batch) / elapsed:,.0f} emails/s, {elapsed / len(batch) * 1e6:.1f} us/email)")
+
+    # Prompt token savings
+    full = sum(prompt_tokens(email, fields_only=False) for email in emails)
+    compact = sum(prompt_tokens(email, fields_only=True) for email in emails)
+    print(f"Writer + proofreader prompt tokens per email: "
+          f"{full / len(emails):.0f} (body) vs {compact / len(emails):.0f} (fields only)")
+    print(f"Saved per email over {MAX_TRIALS} trials: {(full - compact) * MAX_TRIALS / len(emails):.0f} tokens "
+          f"({(full - compact) / full:.1%})")
+
+
+if __name__ == "__main__":
+    main()
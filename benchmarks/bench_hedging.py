@@ -0,0 +1,58 @@
+"""
+Tail latency of hedged versus plain chain calls.
+
+Calls the categorization chain against a FakeChatModel with a heavy latency
+tail and reports p50/p95/p99 latency and the extra LLM calls (cost) caused by
+hedging.
+
+Usage: python -m benchmarks.bench_hedging [--calls 400] [--tail-probability 0.03]
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.prompts import ChatPromptTemplate
+from src.routing import HedgedRunnable, LatencyWindow
+from src.structure_outputs import CategorizeEmailOutput
+from benchmarks.fake_llm import FakeChatModel
+
+
+def measure(chain, calls, concurrency):
+    latencies = LatencyWindow(size=calls)
+
+    def call(index):
+        start = time.perf_counter()
+        chain.invoke({"email": f"email {index}"})
+        latencies.record(time.perf_counter() - start)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(call, range(calls)))
+    return [latencies.percentile(p) for p in (50, 95, 99)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.02, help="Usual latency in seconds")
+    parser.add_argument("--tail-latency", type=float, default=0.5, help="Tail latency in seconds")
+    parser.add_argument("--tail-probability", type=float, default=0.03)
+    args = parser.parse_args()
+
+    prompt = ChatPromptTemplate.from_messages([("system", "Categorize the email."), ("human", "{email}")])
+    for hedged in (False, True):
+        llm = FakeChatModel(latency=args.latency, tail_latency=args.tail_latency,
+                            tail_probability=args.tail_probability, seed=42)
+        chain = prompt | llm.with_structured_output(CategorizeEmailOutput)
+        if hedged:
+            chain = HedgedRunnable(chain, "categorize_email", min_delay=0)
+            # Warm up the latency window so the hedge delay tracks the observed p95
+            measure(chain, 50, args.concurrency)
+            llm.calls = 0
+        p50, p95, p99 = measure(chain, args.calls, args.concurrency)
+        extra = llm.calls / args.calls - 1
+        print(f"{'hedged' if hedged else 'plain':>7}: p50 {p50 * 1000:6.1f} ms  p95 {p95 * 1000:6.1f} ms  "
+              f"p99 {p99 * 1000:6.1f} ms  extra calls {extra:+.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Re-indexing cost of the knowledge base indexer after small edits.
+
+Builds a synthetic knowledge base of markdown sections, indexes it into a
+Chroma store with FakeEmbeddings (configurable latency per embedded text),
+then re-indexes it unchanged, after a one-line edit, after adding a section
+and after deleting one. Each step reports its time and the texts it
+embedded: an edit should cost about one section, whatever the base size.
+The persistent embedding cache is left out, only the indexer's diff is
+measured.
+
+Usage: python -m benchmarks.bench_indexing [--sections 2000] [--embedding-latency-per-text 0.001]
+"""
+import os
+import random
+import argparse
+import tempfile
+from langchain_chroma import Chroma
+from src.indexing import KnowledgeBaseIndexer, embedding_config
+from benchmarks.fake_llm import FakeEmbeddings
+
+WORDS = ("interest", "maturity", "principal", "client", "rate", "account", "reinvestment", "term", "business",
+         "day", "margin", "benchmark", "repayment", "request", "billing", "cycle", "records", "fees")
+
+
+def section(index, rng):
+    sentences = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 16))).capitalize() + "."
+                 for _ in range(rng.randint(2, 6))]
+    return f"## Topic {index}\n" + "\n".join(sentences)
+
+
+def write(path, sections):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("# Synthetic knowledge base\n\n" + "\n\n".join(sections))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sections", type=int, default=2000, help="Sections of the synthetic knowledge base")
+    parser.add_argument("--embedding-latency-per-text", type=float, default=0.001, help="Seconds per embedded text")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "knowledge.md")
+    sections = [section(index, rng) for index in range(args.sections)]
+    embeddings = FakeEmbeddings(size=384, latency_per_text=args.embedding_latency_per_text)
+    indexer = KnowledgeBaseIndexer(
+        store=Chroma(collection_name="bench", embedding_function=embeddings, persist_directory=directory),
+        manifest_path=os.path.join(directory, "index.json"),
+        numpy_dir=os.path.join(directory, "vectors"),
+        embedding={**embedding_config(), "model": "fake"},
+    )
+
+    middle = args.sections // 2
+    steps = [
+        ("full index", lambda: None),
+        ("unchanged", lambda: None),
+        ("one-line edit", lambda: sections.__setitem__(middle, sections[middle] + "\nFees are waived this year.")),
+        ("section added", lambda: sections.insert(middle, section(args.sections, rng))),
+        ("section deleted", lambda: sections.pop(0)),
+    ]
+    print(f"{args.sections} sections, {args.embedding_latency_per_text * 1000:g} ms per embedded text")
+    print(f"{'step':<16} {'seconds':>8} {'embedded':>9} {'added':>6} {'deleted':>8} {'kept':>6}")
+    for name, edit in steps:
+        edit()
+        write(path, sections)
+        texts = embeddings.texts
+        stats = indexer.sync([path])
+        print(f"{name:<16} {stats['seconds']:>8.2f} {embeddings.texts - texts:>9} {stats['added']:>6} "
+              f"{stats['deleted']:>8} {stats['kept']:>6}")
+
+
+if __name__ == "__main__":
+    main()
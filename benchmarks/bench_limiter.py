@@ -0,0 +1,76 @@
+"""
+LLM limiter, adaptive concurrency and circuit breaker against the stub OpenAI server.
+
+Phase 1 bursts categorization calls at a stub that rate-limits above a few
+concurrent requests and shows the client backing off. Phase 2 makes the stub
+fail every request and shows the circuit opening and calls failing fast.
+
+Usage: python -m benchmarks.bench_limiter [--calls 200] [--threads 16]
+"""
+import argparse
+import json
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_openai import ChatOpenAI
+from src.agents import Agents
+from src.limiter import LLMGuard, CircuitBreaker, CircuitOpenError
+from benchmarks.stub_openai_server import start_server
+
+
+def burst(agents, calls, threads):
+    outcomes = {"ok": 0, "circuit_open": 0, "failed": 0}
+
+    def call(index):
+        try:
+            agents.categorize_email.invoke({"email": f"Please reinvest my deposit #{index} on maturity."})
+            return "ok"
+        except CircuitOpenError:
+            return "circuit_open"
+        except Exception:
+            return "failed"
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for outcome in executor.map(call, range(calls)):
+            outcomes[outcome] += 1
+    return outcomes, time.perf_counter() - start
+
+
+def control(base_url, **settings):
+    request = urllib.request.Request(base_url.replace("/v1", "/control"), data=json.dumps(settings).encode(),
+                                     headers={"Content-Type": "application/json"})
+    urllib.request.urlopen(request).read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=16)
+    args = parser.parse_args()
+
+    server, base_url = start_server(latency=0.05, jitter=0.05, max_concurrency=4)
+    guard = LLMGuard(requests_per_minute=100_000, tokens_per_minute=10_000_000, max_concurrency=args.threads,
+                     breaker=CircuitBreaker(failure_threshold=5, reset_seconds=2))
+    llm = ChatOpenAI(model_name="gpt-4o-mini", base_url=base_url, api_key="stub", max_retries=0)
+    agents = Agents(llm=llm, embeddings=DeterministicFakeEmbedding(size=256), guard=guard)
+
+    outcomes, elapsed = burst(agents, args.calls, args.threads)
+    print(f"Burst against a 4-slot provider: {outcomes} in {elapsed:.2f}s, "
+          f"429s seen {guard.stats['rate_limited']}, concurrency limit now {guard.concurrency.limit:.1f}")
+
+    control(base_url, error_rate=1.0)
+    outcomes, elapsed = burst(agents, args.calls, args.threads)
+    print(f"Provider outage: {outcomes} in {elapsed:.2f}s, provider errors {guard.stats['provider_errors']}, "
+          f"rejected by open circuit {guard.stats['rejected']}, circuit {guard.breaker.state}")
+
+    control(base_url, error_rate=0.0)
+    time.sleep(guard.breaker.reset_seconds)
+    outcomes, elapsed = burst(agents, 20, 1)
+    print(f"After recovery: {outcomes} in {elapsed:.2f}s, circuit {guard.breaker.state}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
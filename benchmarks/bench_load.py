@@ -0,0 +1,206 @@
+"""
+Offline load test of the Workflow graph: throughput, per-email latency and peak memory.
+
+Fills a FakeGmailService with a synthetic inbox, fetches it through the real
+GmailToolsClass into the EmailQueue, then runs the workflow over it with the
+FakeChatModel and FakeEmbeddings. Gmail, LLM and embedding calls get the
+configured latency and error rates; Gmail errors are injected once the inbox
+is fetched, as a failed fetch_unanswered_emails returns no email at all.
+A run that crashes (e.g. on a failed draft creation) is resumed from its
+checkpoint, like the next main.py run would.
+
+The latency of an email is the time from the end of the previous email to
+the node that finished it: drafted, skipped (unrelated, leased or out of
+trials), parked (LLM unavailable) or deferred (backpressure).
+
+Usage: python -m benchmarks.bench_load [--emails 1000] [--llm-latency 0.0] [--llm-error-rate 0.0]
+       [--gmail-latency 0.0] [--gmail-error-rate 0.0] [--storage sqlite] [--backpressure] [--trace-memory]
+"""
+import os
+import time
+import random
+import argparse
+import resource
+import tempfile
+import contextlib
+import tracemalloc
+from langgraph.checkpoint.memory import MemorySaver
+from src.agents import Agents
+from src.graph import Workflow
+from src.nodes import Nodes
+from src.state import Email
+from src.limiter import LLMGuard
+from src.latency import LatencyTracker
+from src.progress import ProgressStore
+from src.storage import create_checkpointer
+from src.priority import PRE_CATEGORY_PATTERNS
+from src.email_queue import InMemoryEmailQueue, SqliteEmailQueue
+from src.leases import InMemoryLeaseManager, SqliteLeaseManager
+from src.backpressure import BackpressureController
+from src.tools.GmailTools import GmailToolsClass
+from benchmarks.fake_llm import FakeChatModel, FakeEmbeddings
+from benchmarks.fake_gmail import FakeGmailService, synthetic_messages, MAILBOX
+
+# Node that finished an email -> outcome
+OUTCOMES = {
+    "send_email": "drafted",
+    "skip_unrelated_email": "skipped",
+    "park_email": "parked",
+    "defer_email": "deferred",
+}
+REPLY = ("Dear Customer,\n\nThanks for your email and instructions. We have loaded your instruction as "
+         "requested.\n\nBest regards,\nThe Agentia Team")
+
+
+def scripted_answers(reject_rate=0.0, seed=0):
+    """
+    Answers of the fake chat model: the category guessed from the email's keywords,
+    a fixed reply, and a review rejecting drafts with probability reject_rate.
+    """
+    rng = random.Random(seed)
+
+    def respond(prompt, tool):
+        name = tool["name"] if tool else ""
+        if name == "CategorizeEmailOutput":
+            # The system prompt names every category, only the email is matched
+            email = prompt.rsplit("EMAIL CONTENT:**", 1)[-1]
+            category = next((category for category, pattern in PRE_CATEGORY_PATTERNS if pattern.search(email)),
+                            "unrelated")
+            return {"category": category}
+        if name == "WriterOutput":
+            return {"email": REPLY}
+        if name == "ProofReaderOutput":
+            send = rng.random() >= reject_rate
+            return {"feedback": "Clear and complete." if send else "Too vague, restate the instruction.", "send": send}
+        return None
+
+    return respond
+
+
+def peak_rss_mb():
+    """Peak resident set size of the process, in MB (ru_maxrss is in KB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def build(args, directory):
+    gmail = FakeGmailService(synthetic_messages(args.emails, seed=args.seed), latency=args.gmail_latency,
+                             seed=args.seed)
+    llm = FakeChatModel(respond=scripted_answers(args.reject_rate, args.seed), latency=args.llm_latency,
+                        tail_latency=args.llm_tail_latency, tail_probability=args.llm_tail_probability,
+                        error_rate=args.llm_error_rate, seed=args.seed)
+    embeddings = FakeEmbeddings(size=768, latency=args.embedding_latency, error_rate=args.embedding_error_rate,
+                                seed=args.seed)
+    runtime_db = os.path.join(directory, "runtime.sqlite3")
+    if args.storage == "sqlite":
+        queue, leases = SqliteEmailQueue(runtime_db), SqliteLeaseManager(runtime_db)
+        checkpointer = create_checkpointer(os.path.join(directory, "checkpoints.sqlite3"))
+    else:
+        queue, leases, checkpointer = InMemoryEmailQueue(), InMemoryLeaseManager(), MemorySaver()
+    nodes = Nodes(
+        # No client-side rate limits against the local model
+        agents=Agents(llm=llm, embeddings=embeddings,
+                      guard=LLMGuard(requests_per_minute=10 ** 9, tokens_per_minute=10 ** 12)),
+        gmail_tools=GmailToolsClass(service=gmail),
+        progress=ProgressStore(runtime_db),
+        queue=queue,
+        leases=leases,
+        backpressure=BackpressureController(enabled=args.backpressure),
+    )
+    return Workflow(checkpointer=checkpointer, nodes=nodes), gmail, llm
+
+
+def run(args):
+    os.environ.setdefault("MY_EMAIL", MAILBOX)
+    workflow, gmail, llm = build(args, tempfile.mkdtemp())
+    nodes = workflow.nodes
+
+    start = time.perf_counter()
+    emails = [Email(**email) for email in nodes.gmail_tools.fetch_unanswered_emails(max_results=args.emails)]
+    queue_key = "load"
+    nodes.queue.put_many(queue_key, emails)
+    fetch_seconds = time.perf_counter() - start
+    gmail.error_rate, gmail.rate_limit_rate = args.gmail_error_rate, args.gmail_rate_limit_rate
+
+    latency = LatencyTracker(window=max(1, len(emails)))
+    crashes = 0
+    config = {"recursion_limit": 20 * len(emails) + 10}
+    start = last = time.perf_counter()
+    # The nodes log every step, keep the report readable
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+        while True:
+            try:
+                for output in workflow.stream({"queue_key": queue_key}, run_name="load", config=config):
+                    outcome = next((OUTCOMES[node] for node in output if node in OUTCOMES), None)
+                    if outcome:
+                        now = time.perf_counter()
+                        latency.record(outcome, now - last)
+                        latency.record("all", now - last)
+                        last = now
+                break
+            except Exception:
+                # Resumed from the last checkpoint by the next stream() call
+                crashes += 1
+                if crashes > max(10, len(emails)):
+                    raise
+    run_seconds = time.perf_counter() - start
+    return {
+        "fetched": len(emails),
+        "fetch_seconds": fetch_seconds,
+        "run_seconds": run_seconds,
+        "crashes": crashes,
+        "latency": latency,
+        "gmail_calls": dict(gmail.calls),
+        "llm_calls": llm.calls,
+        "backpressure": nodes.backpressure.status()["emails"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=1000, help="Synthetic inbox size")
+    parser.add_argument("--seed", type=int, default=7, help="Seed of the inbox and of the injected errors")
+    parser.add_argument("--storage", default="sqlite", choices=["sqlite", "memory"],
+                        help="Checkpointer, EmailQueue and leases backend")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds per LLM call")
+    parser.add_argument("--llm-tail-latency", type=float, default=0.0, help="Seconds of a slow LLM call")
+    parser.add_argument("--llm-tail-probability", type=float, default=0.0, help="Share of slow LLM calls")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="Share of LLM calls failing with a 500")
+    parser.add_argument("--reject-rate", type=float, default=0.0, help="Share of drafts the proofreader rejects")
+    parser.add_argument("--embedding-latency", type=float, default=0.0, help="Seconds per embedding call")
+    parser.add_argument("--embedding-error-rate", type=float, default=0.0, help="Share of embedding calls failing")
+    parser.add_argument("--gmail-latency", type=float, default=0.0, help="Seconds per Gmail API request")
+    parser.add_argument("--gmail-error-rate", type=float, default=0.0, help="Share of Gmail requests failing with a 500")
+    parser.add_argument("--gmail-rate-limit-rate", type=float, default=0.0, help="Share of Gmail requests failing with a 429")
+    parser.add_argument("--backpressure", action="store_true", help="Degrade the workflow under the backlog, off by default")
+    parser.add_argument("--trace-memory", action="store_true", help="Also report the peak Python heap (slower)")
+    args = parser.parse_args()
+
+    if args.trace_memory:
+        tracemalloc.start()
+    rss_before = peak_rss_mb()
+    result = run(args)
+    latency = result["latency"]
+
+    completed = latency.count("all")
+    print(f"{args.emails} emails in the inbox, {result['fetched']} fetched in {result['fetch_seconds']:.2f}s "
+          f"({args.storage} storage)")
+    print(f"{completed} emails processed in {result['run_seconds']:.2f}s: "
+          f"{completed / result['run_seconds']:.1f} emails/s, {result['crashes']} crashed runs resumed")
+    print(f"{'outcome':<10} {'count':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for outcome in ["all"] + sorted(set(OUTCOMES.values())):
+        if not latency.count(outcome):
+            continue
+        p50, p95, p99 = (latency.percentile(outcome, p) * 1000 for p in (50, 95, 99))
+        print(f"{outcome:<10} {latency.count(outcome):>6} {p50:>8.1f} {p95:>8.1f} {p99:>8.1f} "
+              f"{latency.summary()[outcome]['max_seconds'] * 1000:>8.1f}")
+    print(f"LLM calls: {result['llm_calls']}, Gmail requests: "
+          + ", ".join(f"{method} {count}" for method, count in sorted(result["gmail_calls"].items())))
+    if args.backpressure:
+        print("Backpressure levels: " + ", ".join(f"{level} {count}" for level, count in result["backpressure"].items()))
+    print(f"Peak RSS: {peak_rss_mb():.0f} MB ({peak_rss_mb() - rss_before:+.0f} MB during the run)")
+    if args.trace_memory:
+        print(f"Peak Python heap: {tracemalloc.get_traced_memory()[1] / 2 ** 20:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmark of email body normalization on long reply threads.
+
+Builds synthetic threads (a short reply on top of quoted earlier messages,
+signatures and disclaimers) and reports the tokens sent to the LLM per email
+before and after normalization, plus normalization throughput.
+
+Usage: python -m benchmarks.bench_normalize [--depth 10] [--emails 2000]
+"""
+import argparse
+import time
+from src.normalize import normalize_body
+from src.tokens import count_tokens
+
+REPLY = (
+    "Hi FinPower team,\n\nPlease reinvest my term deposit of $25,000 maturing on 1 June "
+    "for another 12 months at the current rate.\n\nThanks,\nJordan"
+)
+SIGNATURE = "--\nJordan Smith\nFinance Manager | Acme Holdings\n+64 9 555 0100"
+DISCLAIMER = (
+    "CONFIDENTIALITY NOTICE: This email and any attachments are confidential and may be "
+    "privileged. They are intended solely for the use of the addressee. If you are not the "
+    "intended recipient, please notify the sender and delete this message."
+)
+EARLIER = (
+    "Hello Jordan,\n\nThanks for getting in touch. Your investment details are attached, let us "
+    "know how you would like to proceed at maturity.\n\nKind regards,\nFinPower Operations"
+)
+
+
+def build_thread(depth):
+    """A reply quoting `depth` earlier messages, Gmail style."""
+    body = f"{REPLY}\n{SIGNATURE}\n\n{DISCLAIMER}"
+    quoted = ""
+    for level in range(depth, 0, -1):
+        message = f"{EARLIER}\n\n{DISCLAIMER}"
+        if quoted:
+            message += f"\n\nOn Mon, 3 Mar 2025 at 10:{level:02d}, Someone <someone@example.com> wrote:\n{quoted}"
+        quoted = "\n".join("> " + line for line in message.split("\n"))
+    return f"{body}\n\nOn Tue, 4 Mar 2025 at 09:00, FinPower <ops@finpower.example> wrote:\n{quoted}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--depth", type=int, default=10, help="Number of quoted messages per thread")
+    parser.add_argument("--emails", type=int, default=2000, help="Number of emails to normalize")
+    args = parser.parse_args()
+
+    for depth in sorted({0, 1, args.depth // 2, args.depth}):
+        thread = build_thread(depth)
+        before = count_tokens(thread)
+        after = count_tokens(normalize_body(thread))
+        # Tokens per email: categorizer, query generator, 3 writer trials and 3 proofreads
+        print(f"depth {depth:>3}: {before:>6} -> {after:>4} tokens per prompt "
+              f"({1 - after / before:.1%} less, ~{(before - after) * 8} tokens saved per email)")
+
+    thread = build_thread(args.depth)
+    start = time.perf_counter()
+    for _ in range(args.emails):
+        normalize_body(thread)
+    elapsed = time.perf_counter() - start
+    print(f"Normalized {args.emails} threads of depth {args.depth} in {elapsed:.3f}s "
+          f"({args.emails / elapsed:,.0f} emails/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Latency to draft per priority class under LIFO, FIFO and priority scheduling.
+
+Simulates a worker draining an InMemoryEmailQueue while emails arrive as a
+Poisson stream: urgent instructions (a maturity date in the next two days),
+other instructions, and unrelated emails. Drafting an instruction takes
+--service seconds, skipping an unrelated email a tenth of it. The clock is
+simulated, so the run takes seconds whatever the load.
+
+Usage: python -m benchmarks.bench_priority [--emails 2000] [--load 0.95]
+"""
+import argparse
+import random
+from datetime import date, timedelta
+from src.state import Email
+from src.email_queue import InMemoryEmailQueue
+from src.priority import priority_key, priority_class, received_at
+from src.latency import LatencyTracker
+
+TEMPLATES = {
+    "urgent": ("Deposit maturity", "Hello, my term deposit ending 4455 matures on {date}. Please reinvest it for 6 months."),
+    "normal": ("Interest rate", "Hello, I would like to refix the interest rate of my loan ending 8812 for 3 years."),
+    "low": ("Our newsletter", "Discover our spring offers and the latest news from our partners."),
+}
+# Share of each kind in the stream
+MIX = {"urgent": 0.1, "normal": 0.5, "low": 0.4}
+
+
+def synthetic_stream(count, mean_gap, seed=7):
+    rng = random.Random(seed)
+    arrival, emails = 1_700_000_000.0, []
+    for index in range(count):
+        arrival += rng.expovariate(1 / mean_gap)
+        kind = rng.choices(list(MIX), weights=list(MIX.values()))[0]
+        subject, body = TEMPLATES[kind]
+        due = (date.today() + timedelta(days=rng.choice((0, 1, 2)))).strftime("%d %B %Y")
+        emails.append(Email(
+            id=f"email-{index}", threadId=f"thread-{index}", messageId=f"<{index}@bench>", references="",
+            sender="customer@example.com", subject=subject, body=body.format(date=due),
+            internalDate=int(arrival * 1000),
+        ))
+    return emails
+
+
+def simulate(emails, scorer, service):
+    """Drains the queue with one worker, returns the latency tracker per priority class."""
+    queue, latency = InMemoryEmailQueue(scorer=scorer), LatencyTracker(window=len(emails))
+    classes = {email.id: priority_class(email) for email in emails}
+    clock, arrived = 0.0, 0
+    while arrived < len(emails) or queue.size("bench"):
+        if not queue.size("bench"):
+            clock = max(clock, received_at(emails[arrived]))
+        batch = []
+        while arrived < len(emails) and received_at(emails[arrived]) <= clock:
+            batch.append(emails[arrived])
+            arrived += 1
+        queue.put_many("bench", batch)
+        email = queue.get(queue.peek("bench"))
+        clock += service / 10 if classes[email.id] == "low" else service
+        latency.record(classes[email.id], clock - received_at(email))
+        queue.remove("bench", email.id)
+    return latency
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--emails", type=int, default=2000, help="Emails in the stream")
+    parser.add_argument("--service", type=float, default=30.0, help="Seconds to draft one instruction")
+    parser.add_argument("--load", type=float, default=0.95, help="Worker utilization")
+    args = parser.parse_args()
+
+    mean_service = args.service * (1 - MIX["low"]) + args.service / 10 * MIX["low"]
+    emails = synthetic_stream(args.emails, mean_service / args.load)
+    schedulers = {
+        "lifo": lambda email: 0.0,
+        "fifo": lambda email: -received_at(email),
+        "priority": priority_key,
+    }
+    print(f"{args.emails} emails, {args.load:.0%} load, latency to draft in minutes")
+    print(f"{'scheduler':<10} {'class':<7} {'count':>6} {'p50':>8} {'p95':>8} {'max':>8}")
+    for name, scorer in schedulers.items():
+        for priority, stats in sorted(simulate(emails, scorer, args.service).summary().items()):
+            print(f"{name:<10} {priority:<7} {stats['count']:>6} {stats['p50_seconds'] / 60:>8.1f} "
+                  f"{stats['p95_seconds'] / 60:>8.1f} {stats['max_seconds'] / 60:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
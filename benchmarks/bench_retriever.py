@@ -0,0 +1,117 @@
+"""
+Retrieval latency of the numpy vector store against Chroma, at growing index sizes.
+
+Fills each store with the same random unit embeddings, then times the
+retriever's search for the top k chunks of random query embeddings (the
+query embedding itself is not timed, it is the same for both). The numpy
+store is timed in memory and memory-mapped from a saved index. Chroma's
+HNSW index is approximate: its recall against the exact numpy top-k is
+reported too.
+
+Filling Chroma is slow (minutes at 100k chunks on one core), it is skipped
+above --chroma-max chunks. The default dimension keeps 1M chunks within
+1.5 GB; OpenAI's text-embedding-3-small has 1536 dimensions.
+
+Usage: python -m benchmarks.bench_retriever [--sizes 1000 100000 1000000] [--dim 384] [--k 3]
+       [--queries 200] [--chroma-max 100000]
+"""
+import gc
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import numpy as np
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from src.retriever import NumpyVectorStore, load_index
+
+# Chunks added to Chroma per call, below its maximum batch size
+CHROMA_BATCH = 5000
+
+
+def unit_vectors(count, dim, rng):
+    vectors = rng.standard_normal((count, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def time_queries(search, queries):
+    """Per-query latencies of search(query) in microseconds, after one untimed call."""
+    search(queries[0])
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query)
+        latencies.append((time.perf_counter() - start) * 1e6)
+    return latencies
+
+
+def report(size, store, latencies, recall=""):
+    latencies = sorted(latencies)
+    p95 = latencies[int(0.95 * (len(latencies) - 1))]
+    print(f"{size:>9} {store:<14} {statistics.median(latencies):>11.1f} {p95:>11.1f} {recall:>8}")
+
+
+def bench_size(size, args, rng, queries):
+    embedding = DeterministicFakeEmbedding(size=args.dim)
+    matrix = unit_vectors(size, args.dim, rng)
+    ids = [str(row) for row in range(size)]
+    texts = [f"chunk {row}" for row in range(size)]
+    metadatas = [{} for _ in range(size)]
+
+    store = NumpyVectorStore(embedding, matrix, ids, texts, metadatas)
+    exact = [[document.id for document in store.similarity_search_by_vector(query, k=args.k)] for query in queries]
+    report(size, "numpy", time_queries(lambda query: store.similarity_search_by_vector(query, k=args.k), queries))
+
+    directory = tempfile.mkdtemp()
+    store.save(directory)
+    del store
+    gc.collect()
+    mapped = NumpyVectorStore.load(directory, embedding, mmap=True)
+    report(size, "numpy (mmap)", time_queries(lambda query: mapped.similarity_search_by_vector(query, k=args.k), queries))
+    del mapped
+    load_index.cache_clear()
+    shutil.rmtree(directory)
+
+    if size > args.chroma_max:
+        print(f"{size:>9} {'chroma':<14} {'skipped, over --chroma-max':>32}")
+        return
+    from langchain_chroma import Chroma
+    directory = tempfile.mkdtemp()
+    chroma = Chroma(collection_name="bench", embedding_function=embedding, persist_directory=directory)
+    start = time.perf_counter()
+    for batch in range(0, size, CHROMA_BATCH):
+        rows = slice(batch, batch + CHROMA_BATCH)
+        chroma._collection.add(ids=ids[rows], embeddings=matrix[rows], documents=texts[rows])
+    fill_seconds = time.perf_counter() - start
+    latencies = time_queries(lambda query: chroma.similarity_search_by_vector(query.tolist(), k=args.k), queries)
+    found = [[document.id for document in chroma.similarity_search_by_vector(query.tolist(), k=args.k)]
+             for query in queries]
+    recall = sum(len(set(hits) & set(truth)) for hits, truth in zip(found, exact)) / (len(queries) * args.k)
+    report(size, "chroma", latencies, f"{recall:.1%}")
+    print(f"{'':>9} (chroma filled in {fill_seconds:.1f}s)")
+    del chroma
+    gc.collect()
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000], help="Chunks in the index")
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension")
+    parser.add_argument("--k", type=int, default=3, help="Chunks retrieved per query, 3 in the workflow")
+    parser.add_argument("--queries", type=int, default=200, help="Timed queries per store and size")
+    parser.add_argument("--chroma-max", type=int, default=100000, help="Largest index filled into Chroma")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    queries = unit_vectors(args.queries, args.dim, rng)
+    print(f"Top {args.k} of {args.queries} queries, {args.dim} dimensions")
+    print(f"{'chunks':>9} {'store':<14} {'median us':>11} {'p95 us':>11} {'recall':>8}")
+    for size in args.sizes:
+        bench_size(size, args, rng, queries)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Encode/decode cost of the state models.
+
+Compares, for the sample emails and their extracted fields, pydantic JSON
+(the public schema, used by the API), LangGraph's default checkpoint
+serializer and the msgspec codec of src.serialization.
+
+Usage: python -m benchmarks.bench_serialization [--iterations 20000] [--body-size 4000]
+"""
+import argparse
+import json
+import timeit
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from src.state import Email
+from src.extraction import extract_fields
+from src.serialization import StateSerializer, encode_email, decode_email
+
+
+def per_op(fn, iterations):
+    """Average microseconds per call."""
+    return timeit.timeit(fn, number=iterations) / iterations * 1e6
+
+
+def report(label, obj, codecs, iterations):
+    print(f"\n{label}")
+    print(f"{'codec':<16} {'encode us':>10} {'decode us':>10} {'bytes':>7}")
+    for name, (encode, decode) in codecs.items():
+        data = encode(obj)
+        assert decode(data) == obj, name
+        print(f"{name:<16} {per_op(lambda: encode(obj), iterations):>10.2f} "
+              f"{per_op(lambda: decode(data), iterations):>10.2f} {len(data[1] if isinstance(data, tuple) else data):>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--body-size", type=int, default=4000, help="Characters of the synthetic long email body")
+    args = parser.parse_args()
+
+    with open("test_email.json") as f:
+        sample = json.load(f)[0]
+    email = Email(**sample)
+    long_email = Email(**{**sample, "body": (sample["body"] + "\n") * (args.body_size // len(sample["body"]) + 1)})
+    fields = extract_fields(email)
+
+    default_serde = JsonPlusSerializer(allowed_msgpack_modules=True)
+    state_serde = StateSerializer()
+    email_codecs = {
+        "pydantic json": (lambda e: e.model_dump_json().encode(), lambda d: Email.model_validate_json(d)),
+        "langgraph": (default_serde.dumps_typed, default_serde.loads_typed),
+        "msgspec": (encode_email, decode_email),
+    }
+    fields_codecs = {
+        "pydantic json": (lambda f: f.model_dump_json().encode(), lambda d: type(fields).model_validate_json(d)),
+        "langgraph": (default_serde.dumps_typed, default_serde.loads_typed),
+        "state serde": (state_serde.dumps_typed, state_serde.loads_typed),
+    }
+
+    report("Email (sample)", email, email_codecs, args.iterations)
+    report(f"Email ({len(long_email.body)} chars body)", long_email, email_codecs, args.iterations)
+    report("EmailFields", fields, fields_codecs, args.iterations)
+
+
+if __name__ == "__main__":
+    main()
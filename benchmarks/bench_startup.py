@@ -0,0 +1,110 @@
+"""
+Cold start of the API server, and what each imported package costs.
+
+Each run starts a fresh interpreter and times, in order: importing
+deploy_api, building its Workflow, the warm-up the gunicorn master runs
+before forking, the post-fork reset of a worker, then the components only
+built on first use: the first LLM chain and the retriever (Chroma). A
+separate run imports deploy_api with -X importtime and lists the packages
+taking the longest to import.
+
+No LLM, embedding or Gmail request is made: a placeholder OPENAI_API_KEY is
+set if none is, and the runtime databases go to a temporary directory.
+
+Usage: python -m benchmarks.bench_startup [--runs 5] [--top 15]
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+from collections import Counter
+
+PHASES = """
+import json, time
+start = time.perf_counter()
+phases = {}
+import deploy_api
+phases["import deploy_api"] = time.perf_counter() - start
+started = time.perf_counter()
+workflow = deploy_api.services().workflow
+phases["build workflow"] = time.perf_counter() - started
+for name, step in [
+    ("warm up (master)", workflow.warm_up),
+    ("after fork (worker)", workflow.after_fork),
+    ("first chain", lambda: workflow.nodes.agents.categorize_email),
+    ("first retriever", lambda: workflow.nodes.agents.retriever),
+]:
+    started = time.perf_counter()
+    step()
+    phases[name] = time.perf_counter() - started
+phases["total"] = time.perf_counter() - start
+print(json.dumps(phases))
+"""
+
+
+def child_env(directory):
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "bench-startup")
+    env.update({
+        "RUNTIME_DB": os.path.join(directory, "runtime.sqlite3"),
+        "CHECKPOINT_DB": os.path.join(directory, "checkpoints.sqlite3"),
+        "CASSETTE_MODE": "",
+        "INBOX_DAEMON": "false",
+    })
+    return env
+
+
+def run_phases(env):
+    output = subprocess.run([sys.executable, "-c", PHASES], env=env, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def import_times(env):
+    """Self and cumulative import time (s) of each module imported by deploy_api, from -X importtime."""
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", "import deploy_api"], env=env,
+                            capture_output=True, text=True, check=True)
+    modules = []
+    for line in output.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append((name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6))
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Cold starts to time, the median is reported")
+    parser.add_argument("--top", type=int, default=15, help="Packages listed by import time")
+    args = parser.parse_args()
+
+    env = child_env(tempfile.mkdtemp())
+    runs = [run_phases(env) for _ in range(args.runs)]
+    print(f"Cold start, median of {args.runs} runs")
+    print(f"{'phase':<24} {'median ms':>10} {'min ms':>8} {'max ms':>8}")
+    for phase in runs[0]:
+        seconds = [run[phase] for run in runs]
+        print(f"{phase:<24} {statistics.median(seconds) * 1000:>10.0f} {min(seconds) * 1000:>8.0f} "
+              f"{max(seconds) * 1000:>8.0f}")
+
+    modules = import_times(env)
+    packages = Counter()
+    for name, self_seconds, _ in modules:
+        packages[name.split(".")[0]] += self_seconds
+    total = sum(packages.values())
+    print(f"\nImport of deploy_api: {total * 1000:.0f} ms over {len(modules)} modules, by package")
+    print(f"{'package':<28} {'ms':>8} {'share':>7}")
+    for package, seconds in packages.most_common(args.top):
+        print(f"{package:<28} {seconds * 1000:>8.0f} {seconds / total:>7.1%}")
+    print("\nSlowest modules of the app (cumulative, with their own imports)")
+    own = sorted((module for module in modules if module[0].split(".")[0] in ("src", "deploy_api")),
+                 key=lambda module: module[2], reverse=True)
+    for name, _, cumulative in own[:args.top]:
+        print(f"{name:<28} {cumulative * 1000:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Checkpointed graph state size against inbox size.
+
+Runs the workflow over synthetic inboxes of growing size with the local
+FakeChatModel and an in-memory Gmail stand-in, then serializes every
+checkpoint with LangGraph's serializer. With the emails held in the
+EmailQueue the bytes per step stay flat; the "emails in state" column
+adds the serialized email list the state used to carry, for comparison.
+
+Usage: python -m benchmarks.bench_state_size [--sizes 10 100 500] [--queue memory]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import tempfile
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from src.agents import Agents
+from src.limiter import LLMGuard
+from src.graph import Workflow
+from src.nodes import Nodes
+from src.email_queue import InMemoryEmailQueue, SqliteEmailQueue
+from src.progress import ProgressStore
+from src.state import Email
+from benchmarks.fake_llm import FakeChatModel
+
+
+class InboxStub:
+    """Serves a fixed list of emails and accepts every draft."""
+
+    def __init__(self, emails):
+        self.emails = emails
+
+    def fetch_unanswered_emails(self):
+        return self.emails
+
+    def create_draft_reply(self, email, reply_text):
+        return {"id": f"draft-{email.id}"}
+
+
+def synthetic_inbox(samples, size):
+    emails = []
+    for index in range(size):
+        email = dict(samples[index % len(samples)])
+        email["id"] = email["threadId"] = email["messageId"] = f"synthetic-{index}"
+        emails.append(email)
+    return emails
+
+
+def measure(emails, queue_kind, directory):
+    serde = JsonPlusSerializer()
+    runtime_db = os.path.join(directory, f"runtime-{len(emails)}.sqlite3")
+    nodes = Nodes(
+        # No client-side rate limits against the local model
+        agents=Agents(llm=FakeChatModel(), embeddings=DeterministicFakeEmbedding(size=768),
+                      guard=LLMGuard(requests_per_minute=10 ** 9, tokens_per_minute=10 ** 12)),
+        gmail_tools=InboxStub(emails),
+        progress=ProgressStore(runtime_db),
+        queue=SqliteEmailQueue(runtime_db) if queue_kind == "sqlite" else InMemoryEmailQueue(),
+    )
+    workflow = Workflow(checkpointer=MemorySaver(), nodes=nodes)
+    config = {"recursion_limit": 20 * len(emails) + 10}
+    # The nodes log every step, keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in workflow.stream({"queue_key": ""}, config=config, thread_id=f"bench-{len(emails)}"):
+            pass
+
+    history = workflow.app.get_state_history({"configurable": {"thread_id": f"bench-{len(emails)}"}})
+    sizes = [len(serde.dumps_typed(snapshot.values)[1]) for snapshot in history]
+    # What each step carried on top when the state held the full email list
+    email_list = len(serde.dumps_typed([Email(**email) for email in emails])[1])
+    return len(sizes), statistics.mean(sizes), max(sizes), email_list
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 500], help="Inbox sizes to run")
+    parser.add_argument("--queue", default="memory", choices=["memory", "sqlite"], help="EmailQueue backend")
+    args = parser.parse_args()
+
+    with open("test_email.json") as f:
+        samples = json.load(f)
+
+    directory = tempfile.mkdtemp()
+    print(f"{'inbox':>6} {'steps':>6} {'mean bytes':>11} {'max bytes':>10} {'emails in state':>16}")
+    for size in args.sizes:
+        steps, mean, largest, email_list = measure(synthetic_inbox(samples, size), args.queue, directory)
+        print(f"{size:>6} {steps:>6} {mean:>11.0f} {largest:>10} {mean + email_list:>16.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Bandwidth and client parse time of full node events against node deltas.
+
+Runs the workflow over a synthetic inbox with the local FakeChatModel, then
+encodes every node event the way LangServe's /stream does (the node's full
+output) and the way /stream_deltas does, and times json parsing of both on
+the client side.
+
+Usage: python -m benchmarks.bench_stream_deltas [--emails 50]
+"""
+import argparse
+import contextlib
+import io
+import json
+import tempfile
+import time
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langgraph.checkpoint.memory import MemorySaver
+from langserve.serialization import WellKnownLCSerializer
+from src.agents import Agents
+from src.graph import Workflow
+from src.nodes import Nodes
+from src.limiter import LLMGuard
+from src.email_queue import InMemoryEmailQueue
+from src.progress import ProgressStore
+from src.deltas import stream_deltas, encode_delta
+from benchmarks.fake_llm import FakeChatModel
+from benchmarks.bench_state_size import InboxStub, synthetic_inbox
+
+
+def realistic_answers(prompt, tool):
+    """Drafts and reviews of production length, the stub defaults are a few bytes."""
+    if tool and tool["name"] == "WriterOutput":
+        return {"email": "Dear customer,\n\n" + "Thank you for reaching out to FinPower. " * 40 + "\n\nBest regards"}
+    if tool and tool["name"] == "ProofReaderOutput":
+        return {"feedback": "The draft answers the request accurately and politely. " * 6, "send": True}
+    return None
+
+
+def parse_seconds(payloads, rounds=20):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for payload in payloads:
+            json.loads(payload)
+    return (time.perf_counter() - start) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--emails", type=int, default=50, help="Synthetic inbox size")
+    args = parser.parse_args()
+
+    with open("test_email.json") as f:
+        emails = synthetic_inbox(json.load(f), args.emails)
+    nodes = Nodes(
+        agents=Agents(llm=FakeChatModel(respond=realistic_answers), embeddings=DeterministicFakeEmbedding(size=768),
+                      guard=LLMGuard(requests_per_minute=10 ** 9, tokens_per_minute=10 ** 12)),
+        gmail_tools=InboxStub(emails),
+        progress=ProgressStore(tempfile.mktemp(suffix=".sqlite3")),
+        queue=InMemoryEmailQueue(),
+    )
+    workflow = Workflow(checkpointer=MemorySaver(), nodes=nodes)
+    with contextlib.redirect_stdout(io.StringIO()):
+        events = list(workflow.stream({"queue_key": ""}, config={"recursion_limit": 20 * args.emails + 10},
+                                      thread_id="bench"))
+
+    serializer = WellKnownLCSerializer()
+    modes = {
+        "full events": [serializer.dumps(event) for event in events],
+        "deltas": [encode_delta(delta).encode() for delta in stream_deltas(iter(events))],
+        "deltas + full": [encode_delta(delta).encode() for delta in stream_deltas(iter(events), full=True)],
+    }
+
+    print(f"{len(events)} node events for {args.emails} emails")
+    print(f"{'mode':<14} {'bytes':>10} {'bytes/event':>12} {'parse ms':>9}")
+    for mode, payloads in modes.items():
+        size = sum(len(payload) for payload in payloads)
+        print(f"{mode:<14} {size:>10} {size / len(payloads):>12.0f} {parse_seconds(payloads) * 1000:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
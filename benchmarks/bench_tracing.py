@@ -0,0 +1,70 @@
+"""
+Overhead of tracing, per span and on whole workflow runs.
+
+Times an empty span with tracing on and off, then runs the workflow over a
+synthetic inbox with the local FakeChatModel with each setting.
+
+Usage: python -m benchmarks.bench_tracing [--emails 50] [--spans 100000]
+"""
+import argparse
+import contextlib
+import io
+import json
+import tempfile
+import time
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langgraph.checkpoint.memory import MemorySaver
+from src.agents import Agents
+from src.graph import Workflow
+from src.nodes import Nodes
+from src.limiter import LLMGuard
+from src.email_queue import InMemoryEmailQueue
+from src.progress import ProgressStore
+from src.tracing import Tracer, tracer
+from benchmarks.fake_llm import FakeChatModel
+from benchmarks.bench_state_size import InboxStub, synthetic_inbox
+
+
+def span_seconds(enabled, count):
+    spans = Tracer(enabled=enabled)
+    start = time.perf_counter()
+    for _ in range(count):
+        with spans.span("llm", "bench") as span:
+            span.set(tokens=1)
+    return (time.perf_counter() - start) / count
+
+
+def run_seconds(emails, enabled):
+    tracer.enabled = enabled
+    nodes = Nodes(
+        agents=Agents(llm=FakeChatModel(), embeddings=DeterministicFakeEmbedding(size=768),
+                      guard=LLMGuard(requests_per_minute=10 ** 9, tokens_per_minute=10 ** 12)),
+        gmail_tools=InboxStub(emails),
+        progress=ProgressStore(tempfile.mktemp(suffix=".sqlite3")),
+        queue=InMemoryEmailQueue(),
+    )
+    workflow = Workflow(checkpointer=MemorySaver(), nodes=nodes)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in workflow.stream({"queue_key": ""}, config={"recursion_limit": 20 * len(emails) + 10},
+                                 thread_id="bench"):
+            pass
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--emails", type=int, default=50, help="Synthetic inbox size")
+    parser.add_argument("--spans", type=int, default=100_000, help="Spans timed per setting")
+    args = parser.parse_args()
+
+    with open("test_email.json") as f:
+        emails = synthetic_inbox(json.load(f), args.emails)
+    print(f"{'tracing':<8} {'us/span':>8} {'run s':>7}")
+    for enabled in (False, True):
+        per_span = span_seconds(enabled, args.spans)
+        print(f"{'on' if enabled else 'off':<8} {per_span * 1e6:>8.2f} {run_seconds(emails, enabled):>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
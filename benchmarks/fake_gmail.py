@@ -0,0 +1,363 @@
+"""
+In-process stand-in for the Gmail API, and a synthetic inbox to fill it.
+
+FakeGmailService answers the calls GmailToolsClass makes on the resource
+returned by googleapiclient's build("gmail", "v1"): messages list/get/modify/
+send, drafts list/create, history list, labels list/create, getProfile and
+watch. Messages, drafts and labels live in memory; each request can be slowed
+down and made to fail with the HttpErrors the real API returns.
+
+synthetic_messages builds message resources in the format of
+messages.get(format="full"): every FinPower category and unrelated emails,
+plain text, HTML and multipart bodies, follow-ups in existing threads and
+emails sent by the mailbox itself, at any inbox size.
+"""
+import re
+import json
+import time
+import base64
+import random
+import threading
+from collections import Counter
+import httplib2
+from googleapiclient.errors import HttpError
+
+MAILBOX = "finpower@example.com"
+SYSTEM_LABELS = ("INBOX", "UNREAD", "SENT", "DRAFT")
+
+NAMES = ["Alice", "Bob", "Carol", "David", "Emma", "Farid", "Grace", "Hiro", "Ines", "Jack", "Kavya", "Liam",
+         "Maria", "Noah", "Olga", "Pedro", "Quinn", "Rosa", "Sam", "Tara"]
+MONTHS = ["January", "February", "March", "April", "May", "June", "July", "August", "September", "October",
+          "November", "December"]
+
+# (category, share of the inbox, subject, body), the body placeholders are filled per email
+TEMPLATES = [
+    ("maturity_reinvestment", 0.2, "Reinvestment of my term deposit",
+     "Hello FinPower team,\n\nMy term deposit of ${amount} ending {ending} matures on {date}. "
+     "I'd like to reinvest the proceeds for another {term} months at the current rate.{signatories}\n\n"
+     "Thanks,\n{name}"),
+    ("maturity_repayment", 0.15, "Repayment at maturity",
+     "Dear FinPower,\n\nMy deposit of ${amount} ending {ending} matures on {date}. Please repay the full "
+     "principal and interest to my linked account.{signatories}\n\nRegards,\n{name}"),
+    ("refix_interest_rate", 0.15, "Refix my loan interest rate",
+     "Hi,\n\nMy loan ending {ending} is currently fixed at {rate}%. I would like to refix it for {term} months "
+     "from {date}.{signatories}\n\nBest,\n{name}"),
+    ("floating_interest_rate", 0.1, "Move my loan to a floating rate",
+     "Hello,\n\nPlease move my loan ending {ending} from its fixed rate to a floating interest rate when the "
+     "current term ends on {date}.{signatories}\n\nKind regards,\n{name}"),
+    ("change_contact_details", 0.1, "Update of my contact details",
+     "Hello,\n\nI have moved. Please update my address to {number} Harbour Street and my phone number to "
+     "021 {number} {ending}.{signatories}\n\nThanks,\n{name}"),
+    ("unrelated", 0.3, "Our spring newsletter",
+     "Discover our spring offers, the latest news from our partners and {number} reasons to visit us.\n\n"
+     "The Marketing Team"),
+]
+SIGNATORIES = " My co-signatory {cosigner} agrees, as the account requires two signatories."
+# Shares of the emails that reply in an existing thread, that the mailbox sent, and of the body formats
+FOLLOW_UP_RATE = 0.1
+OWN_EMAIL_RATE = 0.03
+BODY_FORMATS = {"plain": 0.6, "multipart": 0.3, "html": 0.1}
+
+
+def _b64(text):
+    return base64.urlsafe_b64encode(text.encode()).decode()
+
+
+def _html(text):
+    paragraphs = "".join(f"<p>{paragraph.replace(chr(10), '<br>')}</p>" for paragraph in text.split("\n\n"))
+    return f"<html><head><style>p {{margin: 0}}</style></head><body>{paragraphs}</body></html>"
+
+
+def _payload(headers, body, body_format):
+    if body_format == "plain":
+        return {"mimeType": "text/plain", "headers": headers, "body": {"size": len(body), "data": _b64(body)}}
+    html = _html(body)
+    if body_format == "html":
+        return {"mimeType": "text/html", "headers": headers, "body": {"size": len(html), "data": _b64(html)}}
+    return {
+        "mimeType": "multipart/alternative", "headers": headers, "body": {"size": 0},
+        "parts": [
+            {"mimeType": "text/plain", "body": {"size": len(body), "data": _b64(body)}},
+            {"mimeType": "text/html", "body": {"size": len(html), "data": _b64(html)}},
+        ],
+    }
+
+
+def synthetic_messages(count, hours=6.0, mailbox=MAILBOX, seed=7, now=None):
+    """
+    Builds a synthetic inbox of Gmail message resources.
+
+    @param count: Number of messages
+    @param hours: The messages are received evenly over the last `hours` hours
+    @param mailbox: Address of the mailbox, the sender of its own emails
+    @param seed: Seed of the random choices, the same seed gives the same inbox
+    @param now: Epoch seconds of the last receipt, defaults to now
+    @return: List of message resources, oldest first, each with its "category" for reference
+    """
+    rng = random.Random(seed)
+    now = now or time.time()
+    weights = [share for _, share, _, _ in TEMPLATES]
+    formats, format_weights = list(BODY_FORMATS), list(BODY_FORMATS.values())
+    messages, threads = [], []
+    for index in range(count):
+        received = now - hours * 3600 * (count - index - rng.random()) / count
+        name, cosigner = rng.sample(NAMES, 2)
+        sender = f"{name} <{name.lower()}{rng.randint(1, 999)}@example.com>"
+        if threads and rng.random() < FOLLOW_UP_RATE:
+            # Follow-up of an earlier email, by its sender or by the mailbox
+            thread_id, subject, sender, references = rng.choice(threads)
+            category, subject = "follow_up", f"Re: {subject}"
+            sender = f"FinPower <{mailbox}>" if rng.random() < OWN_EMAIL_RATE * 10 else sender
+            body = f"Hello,\n\nFollowing up on my previous email, could you confirm you received it?\n\n{name}"
+        else:
+            category, _, subject, template = rng.choices(TEMPLATES, weights=weights)[0]
+            thread_id, references = f"thread{index:06d}", ""
+            if rng.random() < OWN_EMAIL_RATE:
+                sender = f"FinPower <{mailbox}>"
+            due = time.localtime(received + rng.randint(1, 60) * 86400)
+            body = template.format(
+                name=name, cosigner=cosigner, amount=f"{rng.randint(1, 500) * 1000:,}",
+                ending=rng.randint(1000, 9999), date=f"{due.tm_mday} {MONTHS[due.tm_mon - 1]}",
+                term=rng.choice((3, 6, 12, 24)), rate=f"{rng.uniform(3, 7):.2f}", number=rng.randint(2, 99),
+                signatories=SIGNATORIES.format(cosigner=cosigner) if rng.random() < 0.2 else "",
+            )
+        message_id = f"<synthetic-{index}@example.com>"
+        headers = [
+            {"name": "From", "value": sender},
+            {"name": "To", "value": mailbox},
+            {"name": "Subject", "value": subject},
+            {"name": "Message-ID", "value": message_id},
+        ]
+        if references:
+            headers += [{"name": "In-Reply-To", "value": references.split()[-1]},
+                        {"name": "References", "value": references}]
+        messages.append({
+            "id": f"msg{index:06d}",
+            "threadId": thread_id,
+            "labelIds": ["INBOX", "UNREAD"],
+            "snippet": body[:100],
+            "internalDate": str(int(received * 1000)),
+            "payload": _payload(headers, body, rng.choices(formats, weights=format_weights)[0]),
+            "category": category,
+        })
+        threads.append((thread_id, subject.removeprefix("Re: "), sender, f"{references} {message_id}".strip()))
+    return messages
+
+
+def http_error(status, reason):
+    """Builds the HttpError googleapiclient raises for an API error response."""
+    content = json.dumps({"error": {"code": status, "message": reason}}).encode()
+    return HttpError(httplib2.Response({"status": status, "reason": reason}), content)
+
+
+class FakeRequest:
+    """Request returned by the resource methods, run by execute() like googleapiclient's HttpRequest."""
+
+    def __init__(self, service, method, handler):
+        self.service = service
+        self.method = method
+        self.handler = handler
+
+    def execute(self):
+        self.service._before_call(self.method)
+        return self.handler()
+
+
+class FakeGmailService:
+    """
+    In-memory Gmail mailbox answering the API calls of GmailToolsClass.
+
+    Every executed request sleeps `latency` seconds, then fails with a 500
+    HttpError with probability `error_rate` or a 429 with `rate_limit_rate`.
+    maxResults is not capped at 500 like the real API, so one
+    fetch_unanswered_emails call can return a whole synthetic inbox.
+    """
+
+    def __init__(self, messages=(), mailbox=MAILBOX, latency=0.0, error_rate=0.0, rate_limit_rate=0.0, seed=0):
+        self.mailbox = mailbox
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        # Executed requests per method, e.g. "messages.get"
+        self.calls = Counter()
+        self.messages = {}
+        self.drafts = {}
+        self.labels = {name: {"id": name, "name": name, "type": "system"} for name in SYSTEM_LABELS}
+        # (historyId, id of the added message)
+        self.history = []
+        self.history_id = 1
+        self._ids = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.deliver(messages)
+
+    def _before_call(self, method):
+        with self._lock:
+            self.calls[method] += 1
+            draw = self._random.random()
+        if self.latency:
+            time.sleep(self.latency)
+        if draw < self.error_rate:
+            raise http_error(500, "Backend Error")
+        if draw < self.error_rate + self.rate_limit_rate:
+            raise http_error(429, "Too many concurrent requests for user")
+
+    def _new_id(self, prefix):
+        with self._lock:
+            self._ids += 1
+            return f"{prefix}{self._ids:06d}"
+
+    def deliver(self, messages):
+        """Adds messages to the mailbox, recording them in its history like new arrivals."""
+        with self._lock:
+            for message in messages:
+                self.history_id += 1
+                self.messages[message["id"]] = {**message, "historyId": str(self.history_id)}
+                self.history.append((self.history_id, message["id"]))
+
+    def users(self):
+        return _Users(self)
+
+
+class _Users:
+    def __init__(self, service):
+        self.service = service
+
+    def messages(self):
+        return _Messages(self.service)
+
+    def drafts(self):
+        return _Drafts(self.service)
+
+    def history(self):
+        return _History(self.service)
+
+    def labels(self):
+        return _Labels(self.service)
+
+    def getProfile(self, userId):
+        service = self.service
+        return FakeRequest(service, "getProfile", lambda: {
+            "emailAddress": service.mailbox,
+            "messagesTotal": len(service.messages),
+            "threadsTotal": len({message["threadId"] for message in service.messages.values()}),
+            "historyId": str(service.history_id),
+        })
+
+    def watch(self, userId, body):
+        service = self.service
+        return FakeRequest(service, "watch", lambda: {
+            "historyId": str(service.history_id),
+            "expiration": str(int((time.time() + 7 * 86400) * 1000)),
+        })
+
+
+def _query_bounds(query):
+    """Epoch seconds of the after: and before: terms of a Gmail search query."""
+    after = re.search(r"after:(\d+)", query or "")
+    before = re.search(r"before:(\d+)", query or "")
+    return (int(after.group(1)) if after else 0), (int(before.group(1)) if before else float("inf"))
+
+
+class _Messages:
+    def __init__(self, service):
+        self.service = service
+
+    def list(self, userId, q=None, maxResults=100, pageToken=None, labelIds=None):
+        def handler():
+            after, before = _query_bounds(q)
+            labels = set(labelIds or ["INBOX"])
+            matching = [
+                message for message in self.service.messages.values()
+                if labels <= set(message["labelIds"]) and after <= int(message["internalDate"]) // 1000 < before
+            ]
+            matching.sort(key=lambda message: int(message["internalDate"]), reverse=True)
+            start = int(pageToken or 0)
+            page = matching[start:start + maxResults]
+            response = {"messages": [{"id": m["id"], "threadId": m["threadId"]} for m in page],
+                        "resultSizeEstimate": len(matching)}
+            if start + maxResults < len(matching):
+                response["nextPageToken"] = str(start + maxResults)
+            return response
+        return FakeRequest(self.service, "messages.list", handler)
+
+    def get(self, userId, id, format="full"):
+        def handler():
+            message = self.service.messages.get(id)
+            if message is None:
+                raise http_error(404, "Requested entity was not found.")
+            return {key: value for key, value in message.items() if key != "category"}
+        return FakeRequest(self.service, "messages.get", handler)
+
+    def modify(self, userId, id, body):
+        def handler():
+            message = self.service.messages.get(id)
+            if message is None:
+                raise http_error(404, "Requested entity was not found.")
+            removed = set(body.get("removeLabelIds", []))
+            labels = [label for label in message["labelIds"] if label not in removed]
+            message["labelIds"] = labels + [label for label in body.get("addLabelIds", []) if label not in labels]
+            return {"id": id, "threadId": message["threadId"], "labelIds": message["labelIds"]}
+        return FakeRequest(self.service, "messages.modify", handler)
+
+    def send(self, userId, body):
+        def handler():
+            message_id = self.service._new_id("sent")
+            self.service.messages[message_id] = {
+                "id": message_id, "threadId": body.get("threadId") or message_id, "labelIds": ["SENT"],
+                "internalDate": str(int(time.time() * 1000)), "raw": body["raw"],
+            }
+            return {"id": message_id, "threadId": self.service.messages[message_id]["threadId"], "labelIds": ["SENT"]}
+        return FakeRequest(self.service, "messages.send", handler)
+
+
+class _Drafts:
+    def __init__(self, service):
+        self.service = service
+
+    def list(self, userId):
+        return FakeRequest(self.service, "drafts.list", lambda: {"drafts": list(self.service.drafts.values())})
+
+    def create(self, userId, body):
+        def handler():
+            message = body["message"]
+            draft_id, message_id = self.service._new_id("draft"), self.service._new_id("msg-draft")
+            draft = {"id": draft_id, "message": {"id": message_id, "threadId": message.get("threadId") or message_id,
+                                                  "labelIds": ["DRAFT"]}}
+            self.service.drafts[draft_id] = {**draft, "raw": message["raw"]}
+            return draft
+        return FakeRequest(self.service, "drafts.create", handler)
+
+
+class _History:
+    def __init__(self, service):
+        self.service = service
+
+    def list(self, userId, startHistoryId, historyTypes=None, labelId=None):
+        def handler():
+            start = int(startHistoryId)
+            return {
+                "history": [{"id": str(history_id), "messagesAdded": [{"message": {"id": message_id}}]}
+                            for history_id, message_id in self.service.history if history_id > start],
+                "historyId": str(self.service.history_id),
+            }
+        return FakeRequest(self.service, "history.list", handler)
+
+    def list_next(self, previous_request, previous_response):
+        # Every history record fits in one page
+        return None
+
+
+class _Labels:
+    def __init__(self, service):
+        self.service = service
+
+    def list(self, userId):
+        return FakeRequest(self.service, "labels.list", lambda: {"labels": list(self.service.labels.values())})
+
+    def create(self, userId, body):
+        def handler():
+            label = {"id": self.service._new_id("Label_"), "name": body["name"], "type": "user"}
+            self.service.labels[label["id"]] = label
+            return label
+        return FakeRequest(self.service, "labels.create", handler)
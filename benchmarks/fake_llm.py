@@ -0,0 +1,191 @@
+"""
+Local stand-ins for the OpenAI chat and embedding models.
+
+FakeChatModel answers deterministically without any network call, supports
+`with_structured_output` through tool calling, and reports token usage like
+the OpenAI API does, including the prompt tokens served from a simulated
+provider-side prefix cache. FakeEmbeddings returns deterministic vectors.
+Both can inject latency and the errors the OpenAI client raises.
+"""
+import time
+import uuid
+import random
+import threading
+from collections import deque
+from typing import Any, Callable, Optional
+import httpx
+import openai
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from src.tokens import CHARS_PER_TOKEN, count_tokens
+
+
+def provider_error(rate_limited=False):
+    """Builds the error the OpenAI client raises on a 500 or, if rate_limited, a 429 response."""
+    status = 429 if rate_limited else 500
+    response = httpx.Response(status, request=httpx.Request("POST", "https://api.openai.com/v1/fake"))
+    if rate_limited:
+        return openai.RateLimitError("Rate limit reached (injected)", response=response, body=None)
+    return openai.InternalServerError("The server had an error (injected)", response=response, body=None)
+
+
+def stub_arguments(schema, defs=None):
+    """Builds a valid value for a JSON schema, picking the first option of every choice."""
+    defs = defs if defs is not None else schema.get("$defs", schema.get("definitions", {}))
+    if "$ref" in schema:
+        return stub_arguments(defs[schema["$ref"].split("/")[-1]], defs)
+    for key in ("anyOf", "oneOf", "allOf"):
+        if key in schema:
+            return stub_arguments(schema[key][0], defs)
+    if "enum" in schema:
+        return schema["enum"][0]
+    if "default" in schema:
+        return schema["default"]
+    kind = schema.get("type", "object")
+    if kind == "object":
+        properties = schema.get("properties", {})
+        return {name: stub_arguments(prop, defs) for name, prop in properties.items()}
+    if kind == "array":
+        return [stub_arguments(schema.get("items", {}), defs)]
+    if kind == "boolean":
+        return True
+    if kind in ("integer", "number"):
+        return 1
+    return "stub"
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic chat model reporting OpenAI-like usage.
+
+    The prefix cache mimics OpenAI: a prompt is cached once it shares at least
+    `min_cached_tokens` leading tokens with a recent prompt, in blocks of
+    `cache_block_tokens` tokens.
+    """
+
+    respond: Optional[Callable[[str, Optional[dict]], Any]] = None
+    # Simulated latency: `latency` seconds, or `tail_latency` with `tail_probability`
+    latency: float = 0.0
+    tail_latency: float = 0.0
+    tail_probability: float = 0.0
+    # Share of the calls failing with a 500 and with a 429, after their latency
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    seed: int = 0
+    # Number of calls served, including failed ones
+    calls: int = 0
+    min_cached_tokens: int = 1024
+    cache_block_tokens: int = 128
+    cache_size: int = 256
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._recent_prompts = deque(maxlen=self.cache_size)
+        self._lock = threading.Lock()
+        self._random = random.Random(self.seed)
+
+    @property
+    def _llm_type(self):
+        return "fake-chat"
+
+    def bind_tools(self, tools, tool_choice=None, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], tool_choice=tool_choice, **kwargs)
+
+    def _cached_tokens(self, prompt):
+        """Number of leading prompt tokens a provider prefix cache would serve."""
+        with self._lock:
+            shared = max((_common_prefix(prompt, previous) for previous in self._recent_prompts), default=0)
+            self._recent_prompts.append(prompt)
+        shared_tokens = shared // CHARS_PER_TOKEN
+        if shared_tokens < self.min_cached_tokens:
+            return 0
+        return shared_tokens - shared_tokens % self.cache_block_tokens
+
+    def _sleep(self):
+        with self._lock:
+            self.calls += 1
+            tail = self._random.random() < self.tail_probability
+            draw = self._random.random()
+        delay = self.tail_latency if tail else self.latency
+        if delay:
+            time.sleep(delay)
+        if draw < self.error_rate + self.rate_limit_rate:
+            raise provider_error(rate_limited=draw >= self.error_rate)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self._sleep()
+        prompt = "\n".join(f"{message.type}: {message.content}" for message in messages)
+        tools = kwargs.get("tools")
+        tool = tools[0]["function"] if tools else None
+
+        answer = self.respond(prompt, tool) if self.respond else None
+        if tool:
+            args = answer if answer is not None else stub_arguments(tool["parameters"])
+            message = AIMessage(content="", tool_calls=[{"name": tool["name"], "args": args, "id": f"call_{uuid.uuid4().hex[:12]}"}])
+            output_text = str(args)
+        else:
+            output_text = answer if answer is not None else "I don't know."
+            message = AIMessage(content=output_text)
+
+        input_tokens = count_tokens(prompt)
+        output_tokens = count_tokens(output_text)
+        message.usage_metadata = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+            "input_token_details": {"cache_read": min(self._cached_tokens(prompt), input_tokens)},
+        }
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class FakeEmbeddings(DeterministicFakeEmbedding):
+    """Deterministic embeddings, the same text always gets the same vector, with latency and error injection."""
+
+    # Seconds per call, plus per embedded text
+    latency: float = 0.0
+    latency_per_text: float = 0.0
+    error_rate: float = 0.0
+    seed: int = 0
+    # Number of calls and of texts embedded, including failed calls
+    calls: int = 0
+    texts: int = 0
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._lock = threading.Lock()
+        self._random = random.Random(self.seed)
+
+    def _call(self, count):
+        with self._lock:
+            self.calls += 1
+            self.texts += count
+            draw = self._random.random()
+        delay = self.latency + self.latency_per_text * count
+        if delay:
+            time.sleep(delay)
+        if draw < self.error_rate:
+            raise provider_error()
+
+    def embed_documents(self, texts):
+        self._call(len(texts))
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        self._call(1)
+        return super().embed_query(text)
+
+
+def _common_prefix(a, b):
+    """Length of the common prefix of two strings."""
+    size = min(len(a), len(b))
+    index = 0
+    # Compare in chunks first, then character by character
+    step = 256
+    while index + step <= size and a[index:index + step] == b[index:index + step]:
+        index += step
+    while index < size and a[index] == b[index]:
+        index += 1
+    return index
@@ -0,0 +1,173 @@
+"""
+Local stub of the OpenAI HTTP API with latency and error injection.
+
+Serves /v1/chat/completions and /v1/embeddings with deterministic answers
+(structured outputs are filled from the requested JSON schema). Latency,
+5xx errors and 429 rate limits are injected at configurable rates, which can
+be changed at runtime with POST /control, e.g. {"error_rate": 1.0} to
+simulate an outage.
+
+Usage: python -m benchmarks.stub_openai_server [--port 8787] [--latency 0.05] [--error-rate 0.0] [--rate-limit-rate 0.0]
+Point the app at it with OPENAI_BASE_URL=http://127.0.0.1:8787/v1 OPENAI_API_KEY=stub
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from benchmarks.fake_llm import stub_arguments
+from src.tokens import count_tokens
+
+
+class StubSettings:
+    def __init__(self, latency=0.05, jitter=0.0, error_rate=0.0, rate_limit_rate=0.0, max_concurrency=0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        # Requests above this many in flight get a 429, 0 disables the limit
+        self.max_concurrency = max_concurrency
+        self.random = random.Random(seed)
+        self.in_flight = 0
+        self.stats = {"requests": 0, "errors": 0, "rate_limited": 0}
+        self.lock = threading.Lock()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    settings: StubSettings = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            return self._send(200, self.settings.stats)
+        self._send(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        settings = self.settings
+
+        if self.path == "/control":
+            for key, value in request.items():
+                if hasattr(settings, key):
+                    setattr(settings, key, value)
+            return self._send(200, {"status": "ok"})
+
+        with settings.lock:
+            settings.stats["requests"] += 1
+            settings.in_flight += 1
+            draw = settings.random.random()
+            over_limit = settings.max_concurrency and settings.in_flight > settings.max_concurrency
+            delay = settings.latency + settings.random.random() * settings.jitter
+        try:
+            time.sleep(delay)
+            if over_limit or draw < settings.rate_limit_rate:
+                with settings.lock:
+                    settings.stats["rate_limited"] += 1
+                return self._send(429, {"error": {"message": "Rate limit reached", "type": "rate_limit_exceeded"}},
+                                  {"Retry-After": "1"})
+            if draw < settings.rate_limit_rate + settings.error_rate:
+                with settings.lock:
+                    settings.stats["errors"] += 1
+                return self._send(500, {"error": {"message": "Injected server error", "type": "server_error"}})
+            if self.path.endswith("/chat/completions"):
+                return self._send(200, chat_completion(request))
+            if self.path.endswith("/embeddings"):
+                return self._send(200, embeddings(request))
+            self._send(404, {"error": {"message": "not found"}})
+        finally:
+            with settings.lock:
+                settings.in_flight -= 1
+
+
+def chat_completion(request):
+    prompt = "\n".join(str(message.get("content", "")) for message in request.get("messages", []))
+    message = {"role": "assistant", "content": None}
+    response_format = request.get("response_format") or {}
+    tools = request.get("tools")
+    if response_format.get("type") == "json_schema":
+        message["content"] = json.dumps(stub_arguments(response_format["json_schema"]["schema"]))
+    elif tools:
+        function = tools[0]["function"]
+        message["tool_calls"] = [{
+            "id": f"call_{uuid.uuid4().hex[:12]}",
+            "type": "function",
+            "function": {"name": function["name"], "arguments": json.dumps(stub_arguments(function["parameters"]))},
+        }]
+    else:
+        message["content"] = "I don't know."
+    prompt_tokens = count_tokens(prompt)
+    completion_tokens = count_tokens(message["content"] or json.dumps(message.get("tool_calls")))
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request.get("model", "stub"),
+        "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if tools else "stop"}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": 0},
+        },
+    }
+
+
+def embeddings(request, size=256):
+    inputs = request.get("input", [])
+    inputs = [inputs] if isinstance(inputs, str) else inputs
+    data = []
+    for index, text in enumerate(inputs):
+        seed = int(hashlib.sha256(str(text).encode()).hexdigest()[:8], 16)
+        rng = random.Random(seed)
+        data.append({"object": "embedding", "index": index, "embedding": [rng.uniform(-1, 1) for _ in range(size)]})
+    return {"object": "list", "data": data, "model": request.get("model", "stub"),
+            "usage": {"prompt_tokens": 0, "total_tokens": 0}}
+
+
+def start_server(port=0, **settings):
+    """Starts the stub in a background thread, returns (server, base_url)."""
+    handler = type("Handler", (StubHandler,), {"settings": StubSettings(**settings)})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--max-concurrency", type=int, default=0)
+    args = parser.parse_args()
+
+    server, url = start_server(args.port, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                               rate_limit_rate=args.rate_limit_rate, max_concurrency=args.max_concurrency)
+    print(f"Stub OpenAI API listening on {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -15,29 +15,27 @@ class WorkflowAPIConnector:
     def __init__(self, api_url=None):
         self.api_url = api_url or os.getenv("API_URL", "http://localhost:8000")
     
+    @staticmethod
+    def default_initial_state():
+        """Initial state of a new workflow run"""
+        return {
+            "queue_key": "",
+            "pending_emails": 0,
+            "current_email_id": "",
+            "email_category": "",
+            "signatories_count": 0,
+            "generated_email": "",
+            "rag_queries": [],
+            "retrieved_documents": "",
+            "writer_messages": [],
+            "sendable": False,
+            "trials": 0
+        }
+    
     def start_workflow(self, initial_state=None):
         """Start the workflow with an optional initial state"""
         if initial_state is None:
-            initial_state = {
-                "emails": [],
-                "current_email": {
-                    "id": "",
-                    "threadId": "",
-                    "messageId": "",
-                    "references": "",
-                    "sender": "",
-                    "subject": "",
-                    "body": ""
-                },
-                "email_category": "",
-                "signatories_count": 0,
-                "generated_email": "",
-                "rag_queries": [],
-                "retrieved_documents": "",
-                "writer_messages": [],
-                "sendable": False,
-                "trials": 0
-            }
+            initial_state = self.default_initial_state()
         
         try:
             response = requests.post(
@@ -68,26 +66,7 @@ class WorkflowAPIConnector:
     def stream_workflow(self, initial_state=None):
         """Stream the workflow execution with an optional initial state"""
         if initial_state is None:
-            initial_state = {
-                "emails": [],
-                "current_email": {
-                    "id": "",
-                    "threadId": "",
-                    "messageId": "",
-                    "references": "",
-                    "sender": "",
-                    "subject": "",
-                    "body": ""
-                },
-                "email_category": "",
-                "signatories_count": 0,
-                "generated_email": "",
-                "rag_queries": [],
-                "retrieved_documents": "",
-                "writer_messages": [],
-                "sendable": False,
-                "trials": 0
-            }
+            initial_state = self.default_initial_state()
         
         try:
             response = requests.post(
@@ -131,6 +110,190 @@ class WorkflowAPIConnector:
                 "timestamp": datetime.now()
             }
     
+    def stream_workflow_deltas(self, initial_state=None, full=False, thread_id=None):
+        """
+        Stream one compact event per node run (email id, category, timing, draft hash).
+        
+        The first event holds the run's thread_id, use get_run_state for its full state.
+        Set full to also receive each node's whole output.
+        """
+        payload = {"input": initial_state or self.default_initial_state(), "full": full}
+        if thread_id:
+            payload["thread_id"] = thread_id
+        
+        try:
+            response = requests.post(f"{self.api_url}/stream_deltas", json=payload, stream=True)
+            
+            if response.status_code != 200:
+                yield {
+                    "success": False,
+                    "error": f"API returned status code {response.status_code}",
+                    "response": response.text,
+                    "timestamp": datetime.now()
+                }
+                return
+            
+            event = "message"
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith("event: "):
+                    event = line[7:]
+                elif line.startswith("data: ") and event in ("metadata", "delta"):
+                    yield {
+                        "success": True,
+                        "event": event,
+                        "data": json.loads(line[6:]),
+                        "timestamp": datetime.now()
+                    }
+        except Exception as e:
+            yield {
+                "success": False,
+                "error": str(e),
+                "timestamp": datetime.now()
+            }
+    
+    def get_run_state(self, thread_id):
+        """Get the full checkpointed state of a workflow run"""
+        try:
+            response = requests.get(f"{self.api_url}/state/{thread_id}")
+            
+            if response.status_code == 200:
+                return {
+                    "success": True,
+                    "data": response.json(),
+                    "timestamp": datetime.now()
+                }
+            else:
+                return {
+                    "success": False,
+                    "error": f"API returned status code {response.status_code}",
+                    "response": response.text,
+                    "timestamp": datetime.now()
+                }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "timestamp": datetime.now()
+            }
+    
+    def start_run(self, initial_state=None, profile=False):
+        """Start a background workflow run, profiled if asked, returns its run_id without waiting for it"""
+        try:
+            response = requests.post(
+                f"{self.api_url}/runs",
+                json={"input": initial_state or self.default_initial_state(), "profile": profile}
+            )
+            
+            if response.status_code == 202:
+                return {
+                    "success": True,
+                    "data": response.json(),
+                    "timestamp": datetime.now()
+                }
+            else:
+                return {
+                    "success": False,
+                    "error": f"API returned status code {response.status_code}",
+                    "response": response.text,
+                    "timestamp": datetime.now()
+                }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "timestamp": datetime.now()
+            }
+    
+    def get_run(self, run_id):
+        """Get the status and per-email progress of a background run"""
+        try:
+            response = requests.get(f"{self.api_url}/runs/{run_id}")
+            
+            if response.status_code == 200:
+                return {
+                    "success": True,
+                    "data": response.json(),
+                    "timestamp": datetime.now()
+                }
+            else:
+                return {
+                    "success": False,
+                    "error": f"API returned status code {response.status_code}",
+                    "response": response.text,
+                    "timestamp": datetime.now()
+                }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "timestamp": datetime.now()
+            }
+    
+    def get_run_profile(self, run_id):
+        """Get the per-node profile summary of a finished profiled run"""
+        try:
+            response = requests.get(f"{self.api_url}/runs/{run_id}/profile")
+            
+            if response.status_code == 200:
+                return {
+                    "success": True,
+                    "data": response.json(),
+                    "timestamp": datetime.now()
+                }
+            else:
+                return {
+                    "success": False,
+                    "error": f"API returned status code {response.status_code}",
+                    "response": response.text,
+                    "timestamp": datetime.now()
+                }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "timestamp": datetime.now()
+            }
+    
+    def stream_run_events(self, run_id, after=0):
+        """
+        Follow the progress events of a background run until it ends.
+        
+        Each event carries an id, pass the last one received as `after` to resume.
+        """
+        try:
+            response = requests.get(
+                f"{self.api_url}/runs/{run_id}/events",
+                params={"after": after},
+                stream=True
+            )
+            
+            if response.status_code != 200:
+                yield {
+                    "success": False,
+                    "error": f"API returned status code {response.status_code}",
+                    "response": response.text,
+                    "timestamp": datetime.now()
+                }
+                return
+            
+            event = "message"
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith("event: "):
+                    event = line[7:]
+                elif line.startswith("data: ") and event != "end":
+                    yield {
+                        "success": True,
+                        "event": event,
+                        "data": json.loads(line[6:]),
+                        "timestamp": datetime.now()
+                    }
+        except Exception as e:
+            yield {
+                "success": False,
+                "error": str(e),
+                "timestamp": datetime.now()
+            }
+    
     def get_workflow_status(self):
         """Get the current status of the workflow"""
         try:
@@ -156,6 +319,31 @@ class WorkflowAPIConnector:
                 "timestamp": datetime.now()
             }
     
+    def get_sla_report(self):
+        """Get the inbox-to-draft latency per stage and email category, with the active SLA alerts"""
+        try:
+            response = requests.get(f"{self.api_url}/sla")
+            
+            if response.status_code == 200:
+                return {
+                    "success": True,
+                    "data": response.json(),
+                    "timestamp": datetime.now()
+                }
+            else:
+                return {
+                    "success": False,
+                    "error": f"API returned status code {response.status_code}",
+                    "response": response.text,
+                    "timestamp": datetime.now()
+                }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "timestamp": datetime.now()
+            }
+    
     def trigger_gmail_webhook(self):
         """Manually trigger the Gmail webhook to process new emails"""
         try:
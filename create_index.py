@@ -1,56 +1,44 @@
-from langchain_community.document_loaders import TextLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
-from langchain_chroma import Chroma
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough
-from langchain_core.output_parsers import StrOutputParser
-from dotenv import load_dotenv
-
-# Load environment variables from a .env file
-load_dotenv()
-
-RAG_SEARCH_PROMPT_TEMPLATE = """
-Using the following pieces of retrieved context, answer the question comprehensively and concisely.
-Ensure your response fully addresses the question based on the given context.
+"""
+Indexes the knowledge base for the RAG retriever.
 
-**IMPORTANT:**
-Just provide the answer and never mention or refer to having access to the external context or information in your answer.
-If you are unable to determine the answer from the provided context, state 'I don't know.'
+Only the chunks added or changed since the last run are embedded, with the
+same model the runtime embeds its queries with (EMBEDDING_MODEL), and the
+chunks gone from the files are deleted. The Chroma store in db/ and the
+numpy index exported from it are updated, and db/index.json records the
+embedding settings the runtime checks before querying them.
 
-Question: {question}
-Context: {context}
+Usage: python create_index.py [--full] [--query "What are your pricing options?"] [files...]
 """
+import argparse
+from dotenv import load_dotenv
 
-print("Loading & Chunking Docs...")
-loader = TextLoader("./data/agency.txt")
-docs = loader.load()
-
-doc_splitter = RecursiveCharacterTextSplitter(chunk_size=300, chunk_overlap=50)
-doc_chunks = doc_splitter.split_documents(docs)
+# Load environment variables from a .env file, before the settings are read
+load_dotenv()
 
-print("Creating vector embeddings...")
-embeddings = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004")
+from src.indexing import KnowledgeBaseIndexer, KNOWLEDGE_BASE, INDEX_MANIFEST
 
-vectorstore = Chroma.from_documents(doc_chunks, embeddings, persist_directory="db")
 
-# Semantic vector search
-vectorstore_retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", default=KNOWLEDGE_BASE, help="Knowledge base files")
+    parser.add_argument("--full", action="store_true", help="Rebuild the whole index")
+    parser.add_argument("--query", default="What are your pricing options?", help="Test search once indexed")
+    args = parser.parse_args()
 
-# Test RAG chain
-print("Test RAG chain...")
-prompt = ChatPromptTemplate.from_template(RAG_SEARCH_PROMPT_TEMPLATE)
-llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash", temperature=0.1)
+    indexer = KnowledgeBaseIndexer()
+    print("Indexing " + ", ".join(args.files) + "...")
+    stats = indexer.sync(args.files, full=args.full)
+    print(f"{stats['files_indexed']} files indexed, {stats['files_skipped']} unchanged: {stats['added']} chunks "
+          f"embedded, {stats['deleted']} deleted, {stats['kept']} kept in {stats['seconds']:.2f}s ({INDEX_MANIFEST})")
+    embeddings = indexer.store.embeddings
+    if hasattr(embeddings, "summary"):
+        print(f"Embedding cache: {embeddings.summary()}")
 
-rag_chain = (
-    {"context": vectorstore_retriever, "question": RunnablePassthrough()}
-    | prompt
-    | llm
-    | StrOutputParser()
-)
+    if args.query:
+        print(f"Test search: {args.query}")
+        for document in indexer.store.similarity_search(args.query, k=3):
+            print(f"- [{document.metadata.get('section', '')}] {document.page_content[:100]}")
 
-query = "What are your pricing options?"
-result = rag_chain.invoke(query)
-print(f"Question: {query}")
-print(f"Answer: {result}")
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+"""
+Long-running inbox daemon.
+
+Serves the API, so Gmail push notifications reach /gmail/webhook, and runs
+the inbox daemon next to it: the Gmail watch is renewed on schedule and the
+mailbox is polled at an adaptive interval whenever pushes are not arriving
+(no GMAIL_PUBSUB_TOPIC, or pushes silent for PUSH_SILENCE_SECONDS).
+
+Usage: python daemon.py
+"""
+import os
+import uvicorn
+import deploy_api
+
+
+def main():
+    deploy_api.app.add_event_handler("startup", lambda: deploy_api.services().inbox_daemon.start())
+    uvicorn.run(deploy_api.app, host="0.0.0.0", port=int(os.getenv("PORT", "8000")))
+
+
+if __name__ == "__main__":
+    main()
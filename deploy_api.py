@@ -1,11 +1,22 @@
 import uvicorn
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, HTTPException, Header
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from langserve import add_routes
-from src.graph import Workflow
+from sse_starlette.sse import EventSourceResponse
+from pydantic import BaseModel
+from typing import Optional
 from dotenv import load_dotenv
-import os, base64, json
-from src.tools.GmailTools import GmailToolsClass
+import os, json, uuid, threading
+from src.usage import usage_tracker
+from src.latency import draft_latency
+from src.tracing import tracer
+from src.sla import sla_tracker, SLA_PERCENTILE
+from src.deltas import stream_deltas, encode_delta
+from src.jobs import JobManager
+from src.webhook import NotificationCoalescer, InboxSync, decode_notification
+from src.daemon import InboxDaemon, watch_mailbox
+from src.indexing import check_index
 
 # Load .env file
 load_dotenv()
@@ -27,40 +38,250 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
-def get_runnable():
-    return  Workflow().app
+class Services:
+    """The workflow and its background machinery, built once by services()."""
 
-# Fetch LangGraph Automation runnable which generates the workouts
-runnable = get_runnable()
+    def __init__(self):
+        # Imported here: the graph pulls in the LLM clients, import time the tooling does not need
+        from src.graph import Workflow
+        self.workflow = Workflow()
+        # Background runs of the workflow started with POST /runs
+        self.job_manager = JobManager(self.workflow)
+        # Gmail pushes are acked at once, then coalesced per mailbox into one incremental
+        # sync whose emails are preloaded in the queue of a new background run
+        self.inbox_sync = InboxSync(
+            self.workflow.nodes.gmail_tools,
+            self.workflow.progress,
+            self.workflow.nodes.queue,
+            lambda initial_state: self.job_manager.submit(initial_state, {"recursion_limit": 100}),
+        )
+        self.push_coalescer = NotificationCoalescer(self.inbox_sync)
+        # Renews the Gmail watch and polls while pushes are missing, started by daemon.py
+        # or with INBOX_DAEMON=true, in a single process (gunicorn.conf.py starts one worker)
+        self.inbox_daemon = InboxDaemon(
+            self.inbox_sync,
+            self.workflow.nodes.gmail_tools,
+            self.workflow.progress,
+            os.environ.get("GMAIL_PUBSUB_TOPIC"),
+        )
+        self._register_gauges()
 
-# Create the Fast API route to invoke the runnable
-add_routes(app, runnable)
+    def _register_gauges(self):
+        # Current load, read when /metrics is scraped
+        nodes = self.workflow.nodes
+        tracer.metrics.register_gauge("email_queue_backlog", lambda: nodes.queue.backlog(),
+                                      "Emails waiting in the email queues")
+        tracer.metrics.register_gauge("backpressure_level", lambda: nodes.backpressure.current,
+                                      "Degradation level, 0 for the full workflow")
+        tracer.metrics.register_gauge(
+            "inbox_to_draft_seconds",
+            lambda: {(("category", category),): seconds for category, seconds in sla_tracker.total_percentiles().items()},
+            f"p{SLA_PERCENTILE:g} inbox-to-draft latency per email category",
+        )
+        tracer.metrics.register_gauge("sla_alerts", lambda: len(sla_tracker.alerts()),
+                                      "Email categories breaching their inbox-to-draft SLA")
+        tracer.metrics.register_gauge("running_jobs", lambda: self.job_manager.status()["running"],
+                                      "Workflow runs in progress")
+
+
+_services = None
+_services_lock = threading.Lock()
+
+
+def services():
+    """
+    Returns the app's Services, built on the first call: importing this module
+    (tooling, tests) opens no database and builds no workflow.
+    """
+    global _services
+    with _services_lock:
+        if _services is None:
+            _services = Services()
+        return _services
+
+def per_request_config(config, request):
+    # Every run of these routes is checkpointed on a new thread of its own: they call
+    # the graph directly, interrupted runs are resumed through /stream_deltas
+    config.setdefault("configurable", {})["thread_id"] = f"api-{uuid.uuid4().hex}"
+    return config
+
+@app.on_event("startup")
+async def build_workflow():
+    # Create the Fast API route to invoke the LangGraph runnable, once the workflow is built
+    add_routes(app, services().workflow.app, per_req_config_modifier=per_request_config)
+
+class StreamDeltasRequest(BaseModel):
+    input: dict = {"queue_key": ""}
+    config: dict = {"recursion_limit": 100}
+    # Send each node's whole update along with its delta
+    full: bool = False
+    # Resume an interrupted run instead of starting a new one
+    thread_id: Optional[str] = None
+
+@app.post("/stream_deltas")
+async def stream_workflow_deltas(request: StreamDeltasRequest):
+    # Streams one compact event per node (email id, category, timing, draft hash)
+    # instead of the nodes' full outputs; fetch a run's full state from /state/{thread_id}
+    thread_id = request.thread_id or f"api-{uuid.uuid4().hex}"
+
+    def events():
+        yield {"event": "metadata", "data": encode_delta({"thread_id": thread_id})}
+        run = services().workflow.stream(request.input, run_name="api", config=request.config, thread_id=thread_id)
+        for delta in stream_deltas(run, full=request.full):
+            yield {"event": "delta", "data": encode_delta(delta)}
+        yield {"event": "end", "data": ""}
+
+    return EventSourceResponse(events())
+
+@app.get("/state/{thread_id}")
+async def run_state(thread_id: str):
+    # Full checkpointed state of a run
+    snapshot = services().workflow.app.get_state({"configurable": {"thread_id": thread_id}})
+    if not snapshot.values:
+        raise HTTPException(status_code=404, detail="Unknown run")
+    return json.loads(encode_delta({"values": snapshot.values, "next": list(snapshot.next)}))
+
+class RunRequest(BaseModel):
+    input: dict = {"queue_key": ""}
+    config: dict = {"recursion_limit": 100}
+    # Sample the stacks and track the allocations of this run, which then runs alone
+    profile: bool = False
+
+@app.post("/runs", status_code=202)
+async def start_run(request: RunRequest):
+    # Queue a workflow run on the worker pool and return its id right away
+    try:
+        job = services().job_manager.submit(request.input, request.config, request.profile)
+    except RuntimeError as e:
+        # A profiled run waits for the other runs to finish
+        raise HTTPException(status_code=409, detail=str(e))
+    return job.to_dict()
+
+@app.get("/runs")
+async def list_runs():
+    return [job.to_dict(emails=False) for job in reversed(services().job_manager.jobs())]
+
+@app.get("/runs/{run_id}")
+async def get_run(run_id: str):
+    # Status and per-email progress of a run
+    job = services().job_manager.get(run_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown run")
+    return job.to_dict()
+
+@app.get("/runs/{run_id}/profile")
+async def run_profile(run_id: str, folded: bool = False):
+    # Per-node profile summary of a finished profiled run, or its collapsed stacks for flame graph tools
+    job = services().job_manager.get(run_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown run")
+    if job.profile_summary is None:
+        raise HTTPException(status_code=404, detail="Run not profiled or not finished")
+    if folded:
+        with open(job.profile_summary["folded"]) as f:
+            return PlainTextResponse(f.read())
+    return job.profile_summary
+
+@app.get("/runs/{run_id}/events")
+async def run_events(run_id: str, after: int = 0, last_event_id: Optional[str] = Header(None)):
+    # Live progress of a run as server-sent events, until the run ends.
+    # Reconnecting clients resume after the Last-Event-ID header (or ?after=)
+    job = services().job_manager.get(run_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown run")
+    cursor = int(last_event_id) if last_event_id and last_event_id.isdigit() else after
+
+    def events():
+        nonlocal cursor
+        while True:
+            batch = job.events[cursor:] if job.done else services().job_manager.wait_events(run_id, cursor)
+            for event in batch:
+                cursor = event["id"]
+                yield {"event": event["event"], "id": str(event["id"]), "data": encode_delta(event)}
+            if not batch and job.done:
+                yield {"event": "end", "data": ""}
+                return
+
+    return EventSourceResponse(events())
+
+@app.get("/status")
+async def workflow_status():
+    # Worker pool usage and the latest runs
+    return services().job_manager.status()
 
 @app.on_event("startup")
 async def subscribe_gmail_push():
-    # Subscribe to Gmail push notifications via Pub/Sub
+    # Subscribe to Gmail push notifications via Pub/Sub, the daemon also renews it
+    if os.getenv("INBOX_DAEMON", "false").lower() == "true":
+        services().inbox_daemon.start()
+        return
     topic = os.environ.get("GMAIL_PUBSUB_TOPIC")
     if topic:
-        GmailToolsClass().service.users().watch(
-            userId="me",
-            body={"labelIds": ["INBOX"], "topicName": topic}
-        ).execute()
+        workflow = services().workflow
+        watch_mailbox(workflow.nodes.gmail_tools, workflow.progress, topic)
+
+@app.on_event("startup")
+async def check_vector_index():
+    # Refuse to serve RAG answers from chunks embedded with another model than the queries
+    check_index()
 
 @app.post("/gmail/webhook")
 async def gmail_webhook(request: Request):
-    # Handle Pub/Sub push from Gmail
+    # Handle Pub/Sub push from Gmail: queue it and ack right away, Pub/Sub
+    # redelivers pushes that are not acked within its deadline
     envelope = await request.json()
-    data = envelope.get("message", {}).get("data")
-    if not data:
+    notification = decode_notification(envelope)
+    if notification is None:
         return {"status": "no_message"}
-    notif = json.loads(base64.urlsafe_b64decode(data).decode())
-    # Fetch new emails and create drafts
-    gtools = GmailToolsClass()
-    new_emails = gtools.fetch_unanswered_emails()
-    for email in new_emails:
-        # auto-create draft with original body
-        gtools.create_draft_reply(email, "")
-    return {"status": "processed", "count": len(new_emails)}
+    app_services = services()
+    app_services.inbox_daemon.notify_push()
+    accepted = app_services.push_coalescer.submit(*notification)
+    return {"status": "queued" if accepted else "duplicate"}
+
+@app.get("/gmail/webhook/stats")
+async def gmail_webhook_stats():
+    # Pushes received, redeliveries dropped and mailbox syncs run, daemon polls
+    return {**services().push_coalescer.stats, "daemon": services().inbox_daemon.stats}
+
+@app.get("/usage")
+async def llm_usage():
+    # Token usage and prompt-cache hit ratio per agent chain
+    return usage_tracker.summary()
+
+@app.get("/backpressure")
+async def backpressure_status():
+    # Current degradation level, its signals and the emails handled at each level
+    return services().workflow.nodes.backpressure.status()
+
+@app.get("/degraded")
+async def degraded_emails(level: Optional[str] = None, drafted: Optional[bool] = None):
+    # Emails handled in a degraded mode, to review or reprocess
+    return services().workflow.progress.degraded(level, drafted)
+
+@app.get("/spend")
+async def email_spend(limit: int = 100):
+    # Time, tokens and LLM calls consumed by the latest processed emails
+    return services().workflow.progress.spend(limit)
+
+@app.get("/sla")
+async def sla_report():
+    # Inbox-to-draft latency per stage and email category, SLA targets and active alerts
+    return {"alerts": sla_tracker.alerts(), "categories": sla_tracker.report()}
+
+@app.get("/latency")
+async def draft_latency_summary():
+    # Latency from Gmail receipt to draft creation per priority class
+    return draft_latency.summary()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    # Span latency histograms, counters and load gauges in the Prometheus text format
+    return PlainTextResponse(tracer.metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/traces")
+async def traces(limit: int = 100, email_id: Optional[str] = None):
+    # Latest spans (nodes, LLM and Gmail calls), optionally of one email
+    return tracer.recent(limit, email_id)
 
 def main():
     # Start the API
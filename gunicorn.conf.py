@@ -0,0 +1,42 @@
+"""
+Gunicorn settings of the API server.
+
+The app is imported once in the master (preload_app), warmed up there, and
+the workers are forked from it: they share its imported modules and loaded
+data instead of each paying the cold start. Clients and connections are
+never shared across the fork: the LLM, embedding and Gmail clients are only
+built on first use in a worker, and the SQLite connections opened by the
+master are reopened in each worker.
+
+Workflow runs started with POST /runs live in the memory of their worker,
+so one worker is started by default (WEB_CONCURRENCY). The inbox daemon
+(INBOX_DAEMON=true) also runs in a single worker: it polls and renews the
+Gmail watch in the process receiving the pushes, and its syncs are
+serialized per process only. With it, one worker is started whatever
+WEB_CONCURRENCY is.
+
+Usage: gunicorn -c gunicorn.conf.py deploy_api:app
+"""
+import os
+
+bind = os.getenv("GUNICORN_BIND", f"0.0.0.0:{os.getenv('PORT', '8000')}")
+# One worker by default: the runs of POST /runs and their events are kept in the memory of the
+# worker that started them, another worker answers GET /runs/{id} with a 404. Raise it only for
+# deployments not using /runs. Every worker would also start its own inbox daemon, see above
+workers = 1 if os.getenv("INBOX_DAEMON", "false").lower() == "true" else int(os.getenv("WEB_CONCURRENCY", "1"))
+worker_class = "uvicorn.workers.UvicornWorker"
+# Workflow runs stream for minutes, do not kill busy workers
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "600"))
+preload_app = True
+
+
+def when_ready(server):
+    # Master process, app imported: build the workflow and load the heavy modules and data the workers will share
+    import deploy_api
+    deploy_api.services().workflow.warm_up()
+
+
+def post_fork(server, worker):
+    # Worker process: open its own clients and connections
+    import deploy_api
+    deploy_api.services().workflow.after_fork()
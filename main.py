@@ -1,5 +1,11 @@
+import time
+import argparse
 from colorama import Fore, Style
 from src.graph import Workflow
+from src.usage import usage_tracker
+from src.latency import draft_latency
+from src.cassette import cassette
+from src.profiling import RunProfiler, print_summary
 from dotenv import load_dotenv
 from pydantic import TypeAdapter
 from typing import Annotated
@@ -9,6 +15,11 @@ import langserve.validation
 # Load all env variables
 load_dotenv()
 
+parser = argparse.ArgumentParser(description="Runs the email workflow over the inbox once")
+parser.add_argument("--profile", action="store_true",
+                    help="Sample the stacks and track the allocations of this run, per graph node")
+args = parser.parse_args()
+
 
 # config 
 config = {'recursion_limit': 100}
@@ -17,16 +28,9 @@ workflow = Workflow()
 app = workflow.app
 
 initial_state = {
-    "emails": [],
-    "current_email": {
-      "id": "",
-      "threadId": "",
-      "messageId": "",
-      "references": "",
-      "sender": "",
-      "subject": "",
-      "body": ""
-    },
+    "queue_key": "",
+    "pending_emails": 0,
+    "current_email_id": "",
     "email_category": "",
     "signatories_count": 0,
     "generated_email": "",
@@ -39,6 +43,28 @@ initial_state = {
 
 # Run the automation
 print(Fore.GREEN + "Starting workflow..." + Style.RESET_ALL)
-for output in app.stream(initial_state, config):
+# Resumes the previous run if it was interrupted
+run = workflow.stream(initial_state, config=config)
+if args.profile:
+    profiler = RunProfiler(workflow.node_names, f"main-{time.strftime('%Y%m%d-%H%M%S')}")
+    run = profiler.profile(run)
+for output in run:
     for key, value in output.items():
         print(Fore.CYAN + f"Finished running: {key}:" + Style.RESET_ALL)
+if args.profile:
+    print_summary(profiler.summary)
+
+# Report token usage and prompt-cache hit ratio per chain
+for chain, usage in usage_tracker.summary().items():
+    print(Fore.CYAN + f"{chain}: {usage['calls']} calls, {usage['input_tokens']} input tokens, "
+          f"{usage['cache_hit_ratio']:.0%} cached" + Style.RESET_ALL)
+
+# Report the latency from Gmail receipt to draft per priority class
+for priority_class, latency in draft_latency.summary().items():
+    print(Fore.CYAN + f"{priority_class} emails: {latency['count']} drafted, p50 {latency['p50_seconds']:.0f}s, "
+          f"p95 {latency['p95_seconds']:.0f}s, max {latency['max_seconds']:.0f}s after receipt" + Style.RESET_ALL)
+
+# Report the requests recorded to or replayed from the cassette
+if cassette.mode:
+    print(Fore.CYAN + f"Cassette {cassette.path} ({cassette.mode}): "
+          + ", ".join(f"{name} {value:g}" for name, value in sorted(cassette.summary().items())) + Style.RESET_ALL)
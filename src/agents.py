@@ -1,59 +1,155 @@
+import os
+import threading
 from langchain_core.prompts import PromptTemplate, ChatPromptTemplate, MessagesPlaceholder
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-
-from langchain_chroma import Chroma
+from langchain_core.globals import set_llm_cache
 from langchain_core.runnables import RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from .structure_outputs import *
 from .prompts import *
+from .usage import usage_tracker
+from .routing import ModelRouter, HedgedRunnable, HEDGE_REQUESTS
+from .limiter import GuardedRunnable, LLMGuard, llm_guard
+from .cassette import cassette
+from .tokens import count_tokens
+from .indexing import create_embeddings, check_index
+from .retriever import create_vector_store, load_index, RETRIEVER_BACKEND, VECTOR_INDEX_DIR, VECTOR_INDEX_MMAP
 
 class Agents():
-    def __init__(self):
-        # Initialize OpenAI GPT-4o for chat and embeddings
-        llm = ChatOpenAI(model_name="gpt-4o", temperature=0.1)
-        
+    def __init__(self, llm=None, embeddings=None, router=None, guard=None):
+        if cassette.mode:
+            # Chat model generations are recorded to, or replayed from, the cassette
+            set_llm_cache(cassette.llm_cache())
+        if cassette.replaying:
+            # Replayed generations need no provider credentials, only live misses do
+            os.environ.setdefault("OPENAI_API_KEY", "cassette-replay")
+        # Pick the chat model of each chain, a given llm is used for all of them
+        self.router = router or ModelRouter(llm=llm)
+        self.usage = usage_tracker
+        # Rate limits and circuit breaker shared by all chains, replays run at full speed
+        self.guard = guard or (LLMGuard(requests_per_minute=10 ** 9, tokens_per_minute=10 ** 12)
+                               if cassette.replaying else llm_guard)
+
+        self._embeddings = embeddings
+        # Chains and retriever are built on first use: importing or forking the app opens no client
+        self._components = {}
+        self._lock = threading.RLock()
+
+    def _component(self, name, build):
+        """Returns a component built once, on first use, by build()."""
+        with self._lock:
+            if name not in self._components:
+                self._components[name] = build()
+            return self._components[name]
+
+    @property
+    def retriever(self):
         # QA assistant chat
-        embeddings = OpenAIEmbeddings()
-        vectorstore = Chroma(persist_directory="db", embedding_function=embeddings)
-        retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
+        def build():
+            embeddings = self._embeddings
+            if embeddings is None:
+                # Same model as the indexed chunks, repeated questions are embedded once
+                check_index()
+                embeddings = create_embeddings()
+            vectorstore = create_vector_store(embeddings)
+            return vectorstore.as_retriever(search_kwargs={"k": 3})
+        return self._component("retriever", build)
 
+    @property
+    def categorize_email(self):
         # Categorize email chain
-        email_category_prompt = PromptTemplate(
-            template=CATEGORIZE_EMAIL_PROMPT, 
-            input_variables=["email"]
-        )
-        self.categorize_email = email_category_prompt | llm.with_structured_output(CategorizeEmailOutput)
+        return self._component("categorize_email", lambda: self._build_chain(
+            "categorize_email",
+            self._chat_prompt(CATEGORIZE_EMAIL_PROMPT, CATEGORIZE_EMAIL_INPUT),
+            CategorizeEmailOutput
+        ))
 
+    @property
+    def design_rag_queries(self):
         # Used to design queries for RAG retrieval
-        generate_query_prompt = PromptTemplate(
-            template=GENERATE_RAG_QUERIES_PROMPT, 
-            input_variables=["email"]
-        )
-        self.design_rag_queries = generate_query_prompt | llm.with_structured_output(RAGQueriesOutput)
-        
+        return self._component("design_rag_queries", lambda: self._build_chain(
+            "design_rag_queries",
+            self._chat_prompt(GENERATE_RAG_QUERIES_PROMPT, GENERATE_RAG_QUERIES_INPUT),
+            RAGQueriesOutput
+        ))
+
+    @property
+    def generate_rag_answer(self):
         # Generate answer to queries using RAG
-        qa_prompt = ChatPromptTemplate.from_template(GENERATE_RAG_ANSWER_PROMPT)
-        self.generate_rag_answer = (
-            {"context": retriever, "question": RunnablePassthrough()}
-            | qa_prompt
-            | llm
-            | StrOutputParser()
-        )
+        return self._component("generate_rag_answer", lambda: (
+            {"context": self.retriever, "question": RunnablePassthrough()}
+            | self._build_chain(
+                "generate_rag_answer",
+                self._chat_prompt(GENERATE_RAG_ANSWER_PROMPT, GENERATE_RAG_ANSWER_INPUT)
+            )
+        ))
 
+    @property
+    def email_writer(self):
         # Used to write a draft email based on category and related informations
-        writer_prompt = ChatPromptTemplate.from_messages(
-            [
-                ("system", EMAIL_WRITER_PROMPT),
-                MessagesPlaceholder("history"),
-                ("human", "{email_information}")
-            ]
-        )
-        self.email_writer = writer_prompt | llm.with_structured_output(WriterOutput)
+        return self._component("email_writer", lambda: self._build_chain(
+            "email_writer",
+            self._chat_prompt(EMAIL_WRITER_PROMPT, EMAIL_WRITER_INPUT, history=True),
+            WriterOutput
+        ))
 
+    @property
+    def email_proofreader(self):
         # Verify the generated email
-        proofreader_prompt = PromptTemplate(
-            template=EMAIL_PROOFREADER_PROMPT, 
-            input_variables=["initial_email", "generated_email"]
-        )
-        self.email_proofreader = proofreader_prompt | llm.with_structured_output(ProofReaderOutput)
\ No newline at end of file
+        return self._component("email_proofreader", lambda: self._build_chain(
+            "email_proofreader",
+            self._chat_prompt(EMAIL_PROOFREADER_PROMPT, EMAIL_PROOFREADER_INPUT),
+            ProofReaderOutput
+        ))
+
+    def warm_up(self):
+        """
+        Loads what the chains need without opening any client: the vector store and
+        embedding modules, the tokenizer and the numpy index. Safe to call before forking workers.
+        """
+        import langchain_chroma, langchain_openai
+        count_tokens("warm up")
+        if RETRIEVER_BACKEND == "numpy" and os.path.exists(os.path.join(VECTOR_INDEX_DIR, "embeddings.npy")):
+            # Mapped once, the forked workers share the pages of the index
+            load_index(VECTOR_INDEX_DIR, VECTOR_INDEX_MMAP)
+
+    def reset(self):
+        """Drops the built chains, retriever and LLM clients, rebuilt on next use (e.g. in a forked worker)."""
+        with self._lock:
+            self._components.clear()
+        self.router.reset()
+
+    def _chat_prompt(self, system_prompt, input_template, history=False):
+        """
+        Builds a chat prompt whose static system prompt comes first and variable input last,
+        so consecutive calls of a chain share the longest possible cacheable prefix.
+        """
+        variables = PromptTemplate.from_template(system_prompt).input_variables
+        if variables:
+            raise ValueError(f"System prompts must be static, found variables: {variables}")
+        messages = [("system", system_prompt)]
+        if history:
+            # Writer history grows per email, it goes after the static part
+            messages.append(MessagesPlaceholder("history"))
+        messages.append(("human", input_template))
+        return ChatPromptTemplate.from_messages(messages)
+
+    def _build_chain(self, name, prompt, output=None):
+        """
+        Assembles a named chain on the models routed to it and records the token usage of its LLM calls.
+        Fallback models are tried in order when the primary one fails, slow calls are hedged if enabled.
+        Every model call, including fallbacks and hedges, goes through the shared LLM guard.
+        """
+        chains = [
+            prompt | GuardedRunnable(self._model_output(llm, output), self.guard)
+            for llm in self.router.get_llms(name)
+        ]
+        chain = chains[0].with_fallbacks(chains[1:]) if len(chains) > 1 else chains[0]
+        if HEDGE_REQUESTS:
+            chain = HedgedRunnable(chain, name)
+        return chain.with_config(run_name=name, callbacks=[self.usage.callback(name)])
+
+    def _model_output(self, llm, output):
+        """Structured output if a schema is given, plain text otherwise."""
+        if output is None:
+            return llm | StrOutputParser()
+        return llm.with_structured_output(output)
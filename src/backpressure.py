@@ -0,0 +1,124 @@
+import os
+import threading
+from colorama import Fore, Style
+from .routing import LatencyWindow
+from .prompts import REPLY_TEMPLATES
+
+# Degrade the workflow when the backlog or the LLM latency grows
+BACKPRESSURE = os.getenv("BACKPRESSURE", "true").lower() == "true"
+# Emails waiting in the queues at which each degradation level starts (comma separated, levels 1 to 3)
+BACKPRESSURE_DEPTH_LEVELS = os.getenv("BACKPRESSURE_DEPTH_LEVELS", "50,150,400")
+# p95 LLM call latency, in seconds, at which each degradation level starts
+BACKPRESSURE_LATENCY_LEVELS = os.getenv("BACKPRESSURE_LATENCY_LEVELS", "20,40,90")
+# A level is left once the signals fall below this share of its thresholds, so levels do not flap
+BACKPRESSURE_HYSTERESIS = float(os.getenv("BACKPRESSURE_HYSTERESIS", "0.8"))
+# Gmail label of degraded emails, nested per level (e.g. FinPower/Degraded/deferred)
+DEGRADED_LABEL = os.getenv("DEGRADED_LABEL", "FinPower/Degraded")
+
+# Degradation levels, recorded on the emails they were applied to
+LEVELS = [
+    "",                  # full categorize -> writer -> proofreader loop
+    "skip_proofreader",  # drafts are created without review
+    "template_reply",    # drafts are the category's template, no writer call
+    "deferred",          # emails are categorized and labeled only, drafted by a later run
+]
+
+
+def template_reply(category, email_fields):
+    """
+    Renders the response template of a category, as the writer would.
+
+    @param category: Email category
+    @param email_fields: EmailFields of the email (sender name, signatories)
+    @return: Reply text, None if the category has no template
+    """
+    templates = REPLY_TEMPLATES.get(category)
+    if templates is None:
+        return None
+    body = templates[1] if email_fields.signatories_count >= 2 else templates[0]
+    name = email_fields.sender_name or "Customer"
+    return f"Dear {name},\n\n{body}\n\nBest regards,\nThe Agentia Team"
+
+
+def _thresholds(spec):
+    return [float(value) for value in spec.split(",")]
+
+
+class BackpressureController:
+    """
+    Picks the degradation level of each email from the backlog and the LLM latency.
+
+    The level rises as soon as the queue depth or the p95 latency of the
+    recent LLM calls crosses one of its thresholds, and falls back only once
+    both are below BACKPRESSURE_HYSTERESIS of them.
+    """
+
+    def __init__(self, depth_levels=BACKPRESSURE_DEPTH_LEVELS, latency_levels=BACKPRESSURE_LATENCY_LEVELS,
+                 hysteresis=BACKPRESSURE_HYSTERESIS, enabled=BACKPRESSURE):
+        self.depth_levels = _thresholds(depth_levels) if isinstance(depth_levels, str) else depth_levels
+        self.latency_levels = _thresholds(latency_levels) if isinstance(latency_levels, str) else latency_levels
+        self.hysteresis = hysteresis
+        self.enabled = enabled
+        self.latencies = LatencyWindow(size=50)
+        self.stats = {level or "full": 0 for level in LEVELS}
+        self._level = 0
+        self._depth = 0
+        self._lock = threading.Lock()
+
+    def record_latency(self, seconds):
+        """Records the duration of an LLM call."""
+        self.latencies.record(seconds)
+
+    def _target(self, depth, latency, scale=1.0):
+        level = 0
+        for index, (max_depth, max_latency) in enumerate(zip(self.depth_levels, self.latency_levels)):
+            if depth >= max_depth * scale or latency >= max_latency * scale:
+                level = index + 1
+        return level
+
+    def level(self, depth):
+        """
+        Updates the level with the current backlog and returns the degradation of the next email.
+
+        @param depth: Emails waiting in the queues
+        @return: Name of the degradation level, "" for the full workflow
+        """
+        if not self.enabled:
+            return LEVELS[0]
+        latency = self.latencies.percentile(95) or 0.0
+        with self._lock:
+            previous = self._level
+            self._depth = depth
+            rising, falling = self._target(depth, latency), self._target(depth, latency, self.hysteresis)
+            if rising > previous:
+                self._level = rising
+            elif falling < previous:
+                self._level = falling
+            current = self._level
+            level = LEVELS[current]
+            self.stats[level or "full"] += 1
+        if current != previous:
+            color = Fore.RED if current > previous else Fore.GREEN
+            print(color + f"Backpressure level {LEVELS[previous] or 'full'} -> {level or 'full'} "
+                  f"({depth} queued, p95 LLM latency {latency:.1f}s)" + Style.RESET_ALL)
+        return level
+
+    @property
+    def current(self):
+        """Index of the current level in LEVELS, 0 for the full workflow."""
+        return self._level
+
+    @property
+    def deferring(self):
+        """True while emails are only categorized and labeled."""
+        return LEVELS[self._level] == "deferred"
+
+    def status(self):
+        """Current level, its signals and the number of emails handled at each level."""
+        with self._lock:
+            return {
+                "level": LEVELS[self._level] or "full",
+                "queued": self._depth,
+                "p95_llm_seconds": self.latencies.percentile(95),
+                "emails": dict(self.stats),
+            }
@@ -0,0 +1,107 @@
+import os
+import time
+from langchain_core.callbacks import BaseCallbackHandler
+from .state import EmailBudget
+from .usage import extract_usage
+
+# Budget of one email across the graph: wall-clock seconds from categorization,
+# tokens and LLM calls (writer retries included). Once spent, the email takes
+# the fallback path: the category's template reply, or no draft.
+EMAIL_BUDGET_SECONDS = float(os.getenv("EMAIL_BUDGET_SECONDS", "180"))
+EMAIL_BUDGET_TOKENS = int(os.getenv("EMAIL_BUDGET_TOKENS", "30000"))
+EMAIL_BUDGET_LLM_CALLS = int(os.getenv("EMAIL_BUDGET_LLM_CALLS", "10"))
+
+
+def new_budget(seconds=EMAIL_BUDGET_SECONDS, tokens=EMAIL_BUDGET_TOKENS, llm_calls=EMAIL_BUDGET_LLM_CALLS):
+    """Returns a fresh budget for an email whose processing starts now."""
+    now = time.time()
+    return EmailBudget(started_at=now, deadline=now + seconds, max_tokens=tokens, max_llm_calls=llm_calls)
+
+
+def charge(budget, tokens, llm_calls):
+    """Returns a copy of the budget with the given spend added, the state is never mutated in place."""
+    return budget.model_copy(update={"tokens": budget.tokens + tokens, "llm_calls": budget.llm_calls + llm_calls})
+
+
+def resume_budget(budget, stopped_at, now=None):
+    """
+    Rebases the budget of an email whose run is resumed after a crash.
+
+    Only the time spent processing the email counts against its deadline: the
+    downtime between the last checkpoint and the resume is added back.
+
+    @param budget: EmailBudget saved in the last checkpoint
+    @param stopped_at: Epoch seconds of the last checkpoint
+    @param now: Epoch seconds of the resume, defaults to now
+    @return: Copy of the budget with started_at and deadline shifted by the downtime
+    """
+    paused = max(0.0, (now or time.time()) - stopped_at)
+    return budget.model_copy(update={"started_at": budget.started_at + paused, "deadline": budget.deadline + paused})
+
+
+def exhausted(budget, now=None):
+    """
+    Checks whether an email spent its budget.
+
+    @param budget: EmailBudget of the email, None if it has none
+    @param now: Epoch seconds to check the deadline against, defaults to now
+    @return: "time", "tokens" or "llm_calls" for the exhausted part, None within budget
+    """
+    if budget is None:
+        return None
+    if (now or time.time()) >= budget.deadline:
+        return "time"
+    if budget.tokens >= budget.max_tokens:
+        return "tokens"
+    if budget.llm_calls >= budget.max_llm_calls:
+        return "llm_calls"
+    return None
+
+
+def can_afford_round(budget, trials, now=None):
+    """
+    Checks whether another writer and proofreader round fits in the budget.
+
+    A round is assumed to cost what the previous ones cost on average.
+    """
+    if budget is None or trials == 0:
+        return exhausted(budget, now) is None
+    now = now or time.time()
+    rounds = trials + 1
+    return (
+        exhausted(budget, now) is None
+        and budget.tokens * rounds / trials <= budget.max_tokens
+        and budget.llm_calls * rounds / trials <= budget.max_llm_calls
+        and now + (now - budget.started_at) / trials <= budget.deadline
+    )
+
+
+def spend(budget, now=None):
+    """Spend of an email as a dict (seconds, tokens, llm_calls)."""
+    return {
+        "seconds": round((now or time.time()) - budget.started_at, 3),
+        "tokens": budget.tokens,
+        "llm_calls": budget.llm_calls,
+    }
+
+
+class BudgetMeter(BaseCallbackHandler):
+    """Counts the LLM calls and tokens of one chain invocation, passed in its config callbacks."""
+
+    def __init__(self):
+        self.tokens = 0
+        self.llm_calls = 0
+        # Failed calls, each followed by a fallback model or reported to the caller
+        self.retries = 0
+
+    def on_llm_error(self, error, **kwargs):
+        self.llm_calls += 1
+        self.retries += 1
+
+    def on_llm_end(self, response, **kwargs):
+        self.llm_calls += 1
+        for generations in response.generations:
+            for generation in generations:
+                usage = extract_usage(generation, response.llm_output)
+                if usage:
+                    self.tokens += usage[0] + usage[1]
@@ -0,0 +1,328 @@
+import os
+import json
+import gzip
+import time
+import atexit
+import hashlib
+import threading
+from collections import defaultdict
+import httplib2
+from colorama import Fore, Style
+from googleapiclient.errors import HttpError
+from langchain_core.caches import BaseCache
+from langchain_core.outputs import ChatGeneration
+from langchain_core.messages import message_to_dict, messages_from_dict
+from .tokens import count_tokens
+
+# Record the Gmail and LLM traffic to a cassette ("record"), serve it back ("replay"), or neither ("")
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "").lower()
+# Directory of the cassettes, one gzipped JSON lines file per cassette
+CASSETTE_DIR = os.getenv("CASSETTE_DIR", "cassettes")
+# Name of the cassette, defaults to the day it is recorded (e.g. CASSETTE_NAME=2025-05-01 replays that day)
+CASSETTE_NAME = os.getenv("CASSETTE_NAME", "") or time.strftime("%Y-%m-%d")
+# LLM requests the replayed cassette does not hold: "error" fails them, "live" calls the provider
+CASSETTE_ON_MISS = os.getenv("CASSETTE_ON_MISS", "error").lower()
+
+# Gmail request arguments left out of the replay match: time-based queries and generated bodies
+VOLATILE_ARGUMENTS = ("q", "body")
+# Gmail requests writing to the mailbox: replayed without a recording if the run makes more of them
+WRITE_METHODS = ("users.drafts.create", "users.messages.send", "users.messages.modify", "users.labels.create")
+
+
+class CassetteMissError(LookupError):
+    """Raised in replay for a request the cassette has no recording of."""
+
+
+def _digest(text):
+    return hashlib.sha256(text.encode()).hexdigest()[:32]
+
+
+def _gmail_key(method, kwargs):
+    arguments = {name: value for name, value in kwargs.items() if name not in VOLATILE_ARGUMENTS}
+    return method + " " + json.dumps(arguments, sort_keys=True, default=str)
+
+
+def _prompt_contents(prompt):
+    """Contents of the messages of a serialized chat prompt."""
+    try:
+        return [str(message.get("kwargs", {}).get("content", "")) for message in json.loads(prompt)]
+    except (ValueError, AttributeError):
+        return [prompt]
+
+
+class Cassette:
+    """
+    Recording of the Gmail API responses and LLM generations of runs.
+
+    Gmail requests are replayed by method and arguments, except the
+    time-based search queries and the generated message bodies. Each
+    recording of a request is served in order, the last one once they run
+    out. LLM calls are replayed by exact prompt and model parameters, or else
+    by model parameters and last message (the email, for a changed system
+    prompt), with the input tokens adjusted to the new prompt.
+
+    Replayed runs skip what their progress store already drafted: replay
+    against fresh RUNTIME_DB and CHECKPOINT_DB files.
+    """
+
+    def __init__(self, mode=CASSETTE_MODE, path=None, on_miss=CASSETTE_ON_MISS):
+        self.mode = mode
+        self.path = path or os.path.join(CASSETTE_DIR, f"{CASSETTE_NAME}.jsonl.gz")
+        self.on_miss = on_miss
+        self.stats = defaultdict(int)
+        self._file = None
+        self._records = None
+        self._served = defaultdict(int)
+        self._lock = threading.Lock()
+
+    @property
+    def recording(self):
+        return self.mode == "record"
+
+    @property
+    def replaying(self):
+        return self.mode == "replay"
+
+    def _write(self, record):
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                # Appended as a new gzip member, a cassette can be recorded over several runs
+                self._file = gzip.open(self.path, "at")
+                atexit.register(self.close)
+            self._file.write(json.dumps(record, default=str) + "\n")
+            self.stats[f"{record['kind']}_recorded"] += 1
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _load(self):
+        with self._lock:
+            if self._records is None:
+                records = defaultdict(list)
+                with gzip.open(self.path, "rt") as f:
+                    for line in f:
+                        record = json.loads(line)
+                        records[record["key"]].append(record)
+                        if record["kind"] == "llm":
+                            records[record["relaxed_key"]].append(record)
+                        self.stats["recorded_seconds"] += record.get("seconds", 0.0)
+                print(Fore.CYAN + f"Replaying cassette {self.path}" + Style.RESET_ALL)
+                self._records = records
+            return self._records
+
+    def _next(self, key):
+        """Returns the next recording of a request, the last one once all were served, None if there is none."""
+        recordings = self._load().get(key)
+        if not recordings:
+            return None
+        with self._lock:
+            index = self._served[key]
+            self._served[key] += 1
+        return recordings[min(index, len(recordings) - 1)]
+
+    def gmail_service(self, connect):
+        """
+        Returns the Gmail service to use in the current mode.
+
+        @param connect: Callable building the live Gmail service, not called in replay
+        @return: Live service, recording proxy of it, or replaying stand-in
+        """
+        if self.replaying:
+            return _ReplayResource(self, "users")
+        service = connect()
+        return _RecordingResource(service, self, "") if self.recording else service
+
+    def record_gmail(self, method, kwargs, response=None, error=None, seconds=0.0):
+        record = {"kind": "gmail", "key": _gmail_key(method, kwargs), "seconds": seconds, "response": response}
+        if error is not None:
+            record["error"] = {"status": error.resp.status, "content": error.content.decode("utf-8", "replace")}
+        self._write(record)
+
+    def replay_gmail(self, method, kwargs):
+        """Returns the recorded response of a Gmail request, raises its recorded HttpError."""
+        record = self._next(_gmail_key(method, kwargs))
+        if record is None:
+            if method not in WRITE_METHODS:
+                self.stats["gmail_missed"] += 1
+                raise CassetteMissError(f"No recording of Gmail request {method} {kwargs}")
+            # A write the recorded run did not make, answered like Gmail would
+            self.stats["gmail_synthesized"] += 1
+            body = kwargs.get("body") or {}
+            thread_id = body.get("threadId") or body.get("message", {}).get("threadId")
+            replay_id = f"replay-{self.stats['gmail_synthesized']}"
+            return {"id": replay_id, "threadId": thread_id, "message": {"id": replay_id, "threadId": thread_id}}
+        self.stats["gmail_replayed"] += 1
+        if "error" in record:
+            raise HttpError(httplib2.Response({"status": record["error"]["status"]}), record["error"]["content"].encode())
+        return record["response"]
+
+    def llm_cache(self):
+        """Returns the LangChain LLM cache recording or replaying the chat model generations."""
+        return CassetteLLMCache(self)
+
+    def summary(self):
+        """Recorded or replayed requests, misses, and in replay the live time the cassette took."""
+        with self._lock:
+            return dict(self.stats)
+
+
+class _RecordingRequest:
+    """Gmail HttpRequest proxy recording the response, or error, of execute()."""
+
+    def __init__(self, request, cassette, method, kwargs):
+        self.request = request
+        self.cassette = cassette
+        self.method = method
+        self.kwargs = kwargs
+
+    def execute(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.request.execute(*args, **kwargs)
+        except HttpError as error:
+            self.cassette.record_gmail(self.method, self.kwargs, error=error, seconds=time.perf_counter() - start)
+            raise
+        self.cassette.record_gmail(self.method, self.kwargs, response, seconds=time.perf_counter() - start)
+        return response
+
+
+class _RecordingResource:
+    """Proxy of a Gmail API resource (service, users(), messages()...) recording its requests."""
+
+    def __init__(self, resource, cassette, path):
+        self._resource = resource
+        self._cassette = cassette
+        self._path = path
+
+    def __getattr__(self, name):
+        attribute = getattr(self._resource, name)
+        if not callable(attribute):
+            return attribute
+        method = f"{self._path}.{name}".lstrip(".")
+
+        def call(*args, **kwargs):
+            # list_next() takes the previous request, unwrapped for the client library
+            args = [arg.request if isinstance(arg, _RecordingRequest) else arg for arg in args]
+            result = attribute(*args, **kwargs)
+            if result is None:
+                return None
+            if hasattr(result, "execute"):
+                return _RecordingRequest(result, self._cassette, method, kwargs)
+            return _RecordingResource(result, self._cassette, method)
+
+        return call
+
+
+class _ReplayRequest:
+    def __init__(self, cassette, method, kwargs):
+        self.cassette = cassette
+        self.method = method
+        self.kwargs = kwargs
+
+    def execute(self, *args, **kwargs):
+        return self.cassette.replay_gmail(self.method, self.kwargs)
+
+
+class _ReplayResource:
+    """Stand-in of the Gmail service serving the recorded responses, no credentials needed."""
+
+    # Methods returning a resource rather than a request
+    RESOURCES = ("messages", "drafts", "history", "labels", "threads")
+
+    def __init__(self, cassette, path):
+        self._cassette = cassette
+        self._path = path
+
+    def __getattr__(self, name):
+        method = f"{self._path}.{name}"
+
+        def call(*args, **kwargs):
+            if self._path == "users" and name in self.RESOURCES:
+                return _ReplayResource(self._cassette, method)
+            if name.endswith("_next"):
+                # Next page only if the recorded previous page had one
+                previous_response = args[1] if len(args) > 1 else kwargs.get("previous_response")
+                return _ReplayRequest(self._cassette, method, {}) if (previous_response or {}).get("nextPageToken") else None
+            return _ReplayRequest(self._cassette, method, kwargs)
+
+        return call
+
+    def users(self):
+        return self
+
+
+class CassetteLLMCache(BaseCache):
+    """
+    LangChain LLM cache backed by a cassette.
+
+    In record mode every lookup misses, so the provider is called, and the
+    generation is recorded on update. In replay mode lookups are served from
+    the cassette; a miss fails the call or, with CASSETTE_ON_MISS=live, lets
+    it through to the provider.
+    """
+
+    def __init__(self, cassette):
+        self.cassette = cassette
+        # Start of the pending calls, to record their latency
+        self._started = {}
+
+    def _keys(self, prompt, llm_string):
+        contents = _prompt_contents(prompt)
+        model = _digest(llm_string)
+        return model + " " + _digest(prompt), model + " last " + _digest(contents[-1]), count_tokens(" ".join(contents))
+
+    def lookup(self, prompt, llm_string):
+        key, relaxed_key, prompt_tokens = self._keys(prompt, llm_string)
+        cassette = self.cassette
+        if cassette.recording:
+            self._started[key] = time.perf_counter()
+            return None
+        record = cassette._next(key)
+        if record is not None:
+            cassette.stats["llm_replayed"] += 1
+        else:
+            record = cassette._next(relaxed_key)
+            if record is None:
+                cassette.stats["llm_missed"] += 1
+                if cassette.on_miss == "live":
+                    return None
+                raise CassetteMissError(f"No recording of this LLM request ({relaxed_key}), "
+                                        f"set CASSETTE_ON_MISS=live to call the provider")
+            cassette.stats["llm_replayed_relaxed"] += 1
+        generations = []
+        for generation in record["generations"]:
+            message = messages_from_dict([generation["message"]])[0]
+            usage = getattr(message, "usage_metadata", None)
+            if usage and record["prompt_tokens"] != prompt_tokens:
+                # Same answer to a changed prompt: count the input tokens the new prompt would cost
+                input_tokens = max(0, usage["input_tokens"] + prompt_tokens - record["prompt_tokens"])
+                message.usage_metadata = {**usage, "input_tokens": input_tokens,
+                                          "total_tokens": input_tokens + usage["output_tokens"]}
+            generations.append(ChatGeneration(message=message, generation_info=generation.get("generation_info")))
+        return generations
+
+    def update(self, prompt, llm_string, return_val):
+        if not self.cassette.recording:
+            return
+        key, relaxed_key, prompt_tokens = self._keys(prompt, llm_string)
+        started = self._started.pop(key, None)
+        self.cassette._write({
+            "kind": "llm",
+            "key": key,
+            "relaxed_key": relaxed_key,
+            "prompt_tokens": prompt_tokens,
+            "seconds": time.perf_counter() - started if started else 0.0,
+            "generations": [{"message": message_to_dict(generation.message),
+                             "generation_info": generation.generation_info} for generation in return_val],
+        })
+
+    def clear(self, **kwargs):
+        pass
+
+
+# Shared by the Gmail tools and agents of the process, per CASSETTE_MODE
+cassette = Cassette()
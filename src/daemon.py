@@ -0,0 +1,132 @@
+import os
+import time
+import threading
+import traceback
+from colorama import Fore, Style
+
+# Polling interval: back to the minimum when mail arrives, multiplied by the
+# backoff after every empty poll up to the maximum
+DAEMON_MIN_POLL_SECONDS = float(os.getenv("DAEMON_MIN_POLL_SECONDS", "10"))
+DAEMON_MAX_POLL_SECONDS = float(os.getenv("DAEMON_MAX_POLL_SECONDS", "300"))
+DAEMON_POLL_BACKOFF = float(os.getenv("DAEMON_POLL_BACKOFF", "2"))
+# Gmail watches expire after 7 days, Google recommends renewing them daily
+WATCH_RENEW_SECONDS = float(os.getenv("WATCH_RENEW_SECONDS", "86400"))
+# Polling stays off while pushes keep arriving, and resumes after this much silence
+PUSH_SILENCE_SECONDS = float(os.getenv("PUSH_SILENCE_SECONDS", "900"))
+
+
+class AdaptiveInterval:
+    """Polling interval shrinking to the minimum on activity and growing while idle."""
+
+    def __init__(self, minimum=DAEMON_MIN_POLL_SECONDS, maximum=DAEMON_MAX_POLL_SECONDS, backoff=DAEMON_POLL_BACKOFF):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.current = minimum
+
+    def record(self, active):
+        """Records the outcome of a poll and returns the seconds to wait before the next one."""
+        if active:
+            self.current = self.minimum
+        else:
+            self.current = min(self.maximum, self.current * self.backoff)
+        return self.current
+
+
+def watch_mailbox(gmail_tools, progress, topic, mailbox=None):
+    """
+    Registers (or renews) the Gmail watch of the inbox.
+
+    Incremental syncs start from the watch's historyId unless the mailbox
+    already has a sync cursor.
+
+    @return: Expiration of the watch, in epoch seconds
+    """
+    watch = gmail_tools.watch_inbox(topic)
+    mailbox = mailbox or gmail_tools.get_email_address()
+    if progress.history_cursor(mailbox) is None:
+        progress.save_history_cursor(mailbox, watch["historyId"])
+    return int(watch.get("expiration", 0)) / 1000
+
+
+class InboxDaemon:
+    """
+    Keeps an inbox drafted with low latency without wasting quota.
+
+    Renews the Gmail watch on schedule when a Pub/Sub topic is set. While
+    pushes arrive (notify_push) it does not poll; without a topic, or once
+    pushes stop for PUSH_SILENCE_SECONDS, it polls the mailbox through
+    sync(mailbox) at an adaptive interval.
+    """
+
+    def __init__(self, sync, gmail_tools, progress, topic=None, interval=None,
+                 renew_seconds=WATCH_RENEW_SECONDS, push_silence=PUSH_SILENCE_SECONDS):
+        self.sync = sync
+        self.gmail_tools = gmail_tools
+        self.progress = progress
+        self.topic = topic
+        self.interval = interval or AdaptiveInterval()
+        self.renew_seconds = renew_seconds
+        self.push_silence = push_silence
+        self.mailbox = None
+        self.stats = {"polls": 0, "active_polls": 0, "pushes": 0, "watch_renewals": 0, "errors": 0}
+        self._last_push = None
+        self._renew_at = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Starts the daemon loop in a background thread, once."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name="inbox-daemon", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def notify_push(self):
+        """Records that a Gmail push notification arrived."""
+        self._last_push = time.monotonic()
+        self.stats["pushes"] += 1
+
+    def push_active(self):
+        return (self.topic is not None and self._last_push is not None
+                and time.monotonic() - self._last_push < self.push_silence)
+
+    def run(self):
+        while not self._stop.is_set():
+            self._stop.wait(self.tick())
+
+    def tick(self):
+        """Runs one round (watch renewal, poll if needed), returns the seconds until the next one."""
+        try:
+            if self.mailbox is None:
+                self.mailbox = self.gmail_tools.get_email_address()
+            if self.topic and time.time() >= self._renew_at:
+                self.renew_watch()
+            if self.push_active():
+                # Check again when the pushes would be considered silent
+                return max(self.interval.minimum, self.push_silence - (time.monotonic() - self._last_push))
+            return self.poll()
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(Fore.RED + f"Inbox daemon error: {e}" + Style.RESET_ALL)
+            traceback.print_exc()
+            return self.interval.record(False)
+
+    def renew_watch(self):
+        expiration = watch_mailbox(self.gmail_tools, self.progress, self.topic, self.mailbox)
+        self.stats["watch_renewals"] += 1
+        # Renew on schedule, and in any case an hour before the watch expires
+        renew_at = time.time() + self.renew_seconds
+        if expiration:
+            renew_at = min(renew_at, expiration - 3600)
+        self._renew_at = renew_at
+        print(Fore.GREEN + f"Gmail watch renewed for {self.mailbox}" + Style.RESET_ALL)
+
+    def poll(self):
+        self.stats["polls"] += 1
+        active = self.sync(self.mailbox) is not None
+        if active:
+            self.stats["active_polls"] += 1
+        return self.interval.record(active)
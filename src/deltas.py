@@ -0,0 +1,73 @@
+import json
+import time
+import hashlib
+from datetime import date
+from pydantic import BaseModel
+from langchain_core.messages import BaseMessage
+
+# Small state fields copied into a delta, under a shorter name
+DELTA_FIELDS = {
+    "email_category": "category",
+    "trials": "trials",
+    "sendable": "sendable",
+    "pending_emails": "pending",
+    "parked_emails": "parked",
+    "degradation": "degradation",
+}
+
+
+def draft_hash(text):
+    """Short stable hash identifying a draft without sending its text."""
+    return hashlib.sha256(text.encode()).hexdigest()[:12]
+
+
+def node_delta(node, update, email_id="", elapsed=0.0, full=False):
+    """
+    Builds the compact event of one node run.
+
+    @param node: Name of the node that ran
+    @param update: State update returned by the node
+    @param email_id: Id of the email being processed
+    @param elapsed: Seconds the step took
+    @param full: Also include the node's whole update under "output"
+    @return: JSON-serializable dict
+    """
+    delta = {"node": node, "email_id": email_id, "ms": round(elapsed * 1000, 1)}
+    for field, key in DELTA_FIELDS.items():
+        if field in update:
+            delta[key] = update[field]
+    draft = update.get("generated_email")
+    if draft:
+        delta["draft_hash"] = draft_hash(draft)
+        delta["draft_chars"] = len(draft)
+    if full:
+        delta["output"] = update
+    return delta
+
+
+def stream_deltas(events, full=False):
+    """Turns the {node: update} events of a workflow stream into node deltas."""
+    email_id = ""
+    last = time.perf_counter()
+    for event in events:
+        now = time.perf_counter()
+        for node, update in event.items():
+            update = update or {}
+            email_id = update.get("current_email_id") or email_id
+            yield node_delta(node, update, email_id, now - last, full)
+        last = now
+
+
+def _default(value):
+    if isinstance(value, BaseMessage):
+        return {"type": value.type, "content": value.content}
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_delta(value):
+    """Compact JSON of a delta, or of a full state payload."""
+    return json.dumps(value, separators=(",", ":"), default=_default)
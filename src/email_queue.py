@@ -0,0 +1,254 @@
+import os
+import time
+import itertools
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from .storage import connect, reconnect, transaction, RUNTIME_DB
+from .serialization import encode_email, decode_email
+from .priority import priority_key
+
+# Where the emails of a run wait to be processed: "sqlite" survives crashes
+# (required to resume a checkpointed run), "memory" is process local
+EMAIL_QUEUE = os.getenv("EMAIL_QUEUE", "sqlite")
+# A queue no email was added to or removed from for this long belongs to an abandoned
+# run (failed API run, killed worker): its emails no longer count in the backlog
+EMAIL_QUEUE_LIVE_SECONDS = float(os.getenv("EMAIL_QUEUE_LIVE_SECONDS", "1800"))
+
+
+class EmailQueue(ABC):
+    """
+    Holds the emails of each run outside the graph state.
+
+    The state only carries the run's queue key and the current email id,
+    bodies are loaded when a node needs them. Emails of a queue are served
+    by decreasing scorer(email), computed once when they are queued (see
+    priority.priority_key); ties, and every email when PRIORITY_SCHEDULING
+    is off, are served last-in first-out.
+    """
+
+    @abstractmethod
+    def put_many(self, queue_key, emails):
+        """Appends emails to a queue."""
+
+    @abstractmethod
+    def peek(self, queue_key):
+        """Returns the id of the next email of a queue, or None if it is empty."""
+
+    @abstractmethod
+    def remove(self, queue_key, email_id):
+        """Removes an email from a queue once it is handled, and drops it if no queue holds it anymore."""
+
+    @abstractmethod
+    def size(self, queue_key):
+        """Returns the number of emails left in a queue."""
+
+    @abstractmethod
+    def backlog(self, exclude=None):
+        """
+        Returns the number of distinct emails waiting in the live queues.
+
+        @param exclude: Queue key left out, the caller's own queue
+        @return: Emails waiting in the other queues active within EMAIL_QUEUE_LIVE_SECONDS
+        """
+
+    @abstractmethod
+    def drop(self, queue_key):
+        """Deletes a queue and the emails no other queue holds, once its run ended."""
+
+    @abstractmethod
+    def get(self, email_id):
+        """Returns the Email with the given id."""
+
+    def reopen(self):
+        """Reopens the connections inherited from a parent process, in a forked worker."""
+        pass
+
+
+class InMemoryEmailQueue(EmailQueue):
+    def __init__(self, scorer=priority_key):
+        self.scorer = scorer
+        # Queue key -> {email id: (priority, position)}
+        self._queues = {}
+        # Queue key -> time an email was last added to or removed from it
+        self._touched = {}
+        self._positions = itertools.count()
+        self._emails = {}
+        self._lock = threading.Lock()
+
+    def put_many(self, queue_key, emails):
+        with self._lock:
+            queue = self._queues.setdefault(queue_key, {})
+            self._touched[queue_key] = time.time()
+            for email in emails:
+                self._emails[email.id] = email
+                if email.id not in queue:
+                    queue[email.id] = (self.scorer(email), next(self._positions))
+
+    def peek(self, queue_key):
+        with self._lock:
+            queue = self._queues.get(queue_key)
+            return max(queue, key=queue.get) if queue else None
+
+    def remove(self, queue_key, email_id):
+        with self._lock:
+            queue = self._queues.get(queue_key, {})
+            queue.pop(email_id, None)
+            self._touched[queue_key] = time.time()
+            if not queue:
+                self._queues.pop(queue_key, None)
+                self._touched.pop(queue_key, None)
+            if not any(email_id in other for other in self._queues.values()):
+                self._emails.pop(email_id, None)
+
+    def drop(self, queue_key):
+        with self._lock:
+            queue = self._queues.pop(queue_key, {})
+            self._touched.pop(queue_key, None)
+            for email_id in queue:
+                if not any(email_id in other for other in self._queues.values()):
+                    self._emails.pop(email_id, None)
+
+    def size(self, queue_key):
+        with self._lock:
+            return len(self._queues.get(queue_key, []))
+
+    def backlog(self, exclude=None):
+        live_after = time.time() - EMAIL_QUEUE_LIVE_SECONDS
+        with self._lock:
+            waiting = set()
+            for queue_key, queue in self._queues.items():
+                if queue_key != exclude and self._touched.get(queue_key, 0) > live_after:
+                    waiting.update(queue)
+            return len(waiting)
+
+    def get(self, email_id):
+        with self._lock:
+            return self._emails[email_id]
+
+
+class SqliteEmailQueue(EmailQueue):
+    def __init__(self, path=RUNTIME_DB, cache_size=64, scorer=priority_key):
+        self.conn = connect(path)
+        self.scorer = scorer
+        self._lock = threading.Lock()
+        # Recently loaded emails, a node usually reads the current email several times
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS emails (
+                email_id TEXT PRIMARY KEY,
+                data BLOB NOT NULL
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS email_queue (
+                queue_key TEXT NOT NULL,
+                email_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                priority REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (queue_key, email_id)
+            )
+        """)
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS email_queue_order ON email_queue (queue_key, priority, position)"
+        )
+        # Time an email was last added to or removed from each queue
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS queues (
+                queue_key TEXT PRIMARY KEY,
+                updated_at REAL NOT NULL
+            )
+        """)
+
+    def reopen(self):
+        """Replaces the connection inherited from a parent process, in a forked worker."""
+        self.conn = reconnect(self.conn)
+        self._lock = threading.Lock()
+
+    def put_many(self, queue_key, emails):
+        with self._lock, transaction(self.conn):
+            start = self.conn.execute(
+                "SELECT COALESCE(MAX(position), -1) + 1 FROM email_queue WHERE queue_key = ?", (queue_key,)
+            ).fetchone()[0]
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO emails (email_id, data) VALUES (?, ?)",
+                [(email.id, encode_email(email)) for email in emails],
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO email_queue (queue_key, email_id, position, priority) VALUES (?, ?, ?, ?)",
+                [(queue_key, email.id, start + index, self.scorer(email)) for index, email in enumerate(emails)],
+            )
+            self._touch(queue_key)
+
+    def _touch(self, queue_key):
+        # Called with the lock held, in a transaction
+        self.conn.execute(
+            "INSERT INTO queues (queue_key, updated_at) VALUES (?, ?) "
+            "ON CONFLICT(queue_key) DO UPDATE SET updated_at = excluded.updated_at",
+            (queue_key, time.time()),
+        )
+
+    def peek(self, queue_key):
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT email_id FROM email_queue WHERE queue_key = ? ORDER BY priority DESC, position DESC LIMIT 1",
+                (queue_key,),
+            ).fetchone()
+        return row[0] if row else None
+
+    def remove(self, queue_key, email_id):
+        with self._lock, transaction(self.conn):
+            self.conn.execute("DELETE FROM email_queue WHERE queue_key = ? AND email_id = ?", (queue_key, email_id))
+            self.conn.execute(
+                "DELETE FROM emails WHERE email_id = ? AND NOT EXISTS (SELECT 1 FROM email_queue WHERE email_id = ?)",
+                (email_id, email_id),
+            )
+            self._cache.pop(email_id, None)
+            if self.conn.execute("SELECT 1 FROM email_queue WHERE queue_key = ? LIMIT 1", (queue_key,)).fetchone():
+                self._touch(queue_key)
+            else:
+                self.conn.execute("DELETE FROM queues WHERE queue_key = ?", (queue_key,))
+
+    def drop(self, queue_key):
+        with self._lock, transaction(self.conn):
+            self.conn.execute("DELETE FROM email_queue WHERE queue_key = ?", (queue_key,))
+            self.conn.execute("DELETE FROM queues WHERE queue_key = ?", (queue_key,))
+            self.conn.execute(
+                "DELETE FROM emails WHERE NOT EXISTS (SELECT 1 FROM email_queue WHERE email_queue.email_id = emails.email_id)"
+            )
+            self._cache.clear()
+
+    def size(self, queue_key):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM email_queue WHERE queue_key = ?", (queue_key,)).fetchone()[0]
+
+    def backlog(self, exclude=None):
+        with self._lock:
+            return self.conn.execute(
+                "SELECT COUNT(DISTINCT email_queue.email_id) FROM email_queue "
+                "JOIN queues ON queues.queue_key = email_queue.queue_key "
+                "WHERE queues.updated_at > ? AND email_queue.queue_key != ?",
+                (time.time() - EMAIL_QUEUE_LIVE_SECONDS, exclude or ""),
+            ).fetchone()[0]
+
+    def get(self, email_id):
+        with self._lock:
+            if email_id in self._cache:
+                self._cache.move_to_end(email_id)
+                return self._cache[email_id]
+            row = self.conn.execute("SELECT data FROM emails WHERE email_id = ?", (email_id,)).fetchone()
+            if row is None:
+                raise KeyError(email_id)
+            email = decode_email(row[0])
+            self._cache[email_id] = email
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+            return email
+
+
+def create_email_queue(kind=EMAIL_QUEUE):
+    """Returns the email queue backend selected by EMAIL_QUEUE."""
+    if kind == "memory":
+        return InMemoryEmailQueue()
+    return SqliteEmailQueue()
@@ -0,0 +1,159 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from .storage import connect, transaction
+
+# Cache the query and chunk embeddings of the RAG retriever and of create_index.py
+EMBEDDING_CACHE = os.getenv("EMBEDDING_CACHE", "true").lower() == "true"
+# SQLite file of the cached embeddings, shared by every process
+EMBEDDING_CACHE_DB = os.getenv("EMBEDDING_CACHE_DB", "db/embeddings.sqlite3")
+# Embeddings kept in memory in front of the file, most recently used first
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "1024"))
+# Keys per SQLite lookup, below its limit of bound parameters
+LOOKUP_BATCH = 500
+
+
+def model_namespace(embeddings):
+    """Names the model of an embeddings client: vectors of different models never share a key."""
+    model = getattr(embeddings, "model", None) or getattr(embeddings, "model_name", None) or ""
+    dimensions = getattr(embeddings, "dimensions", None) or getattr(embeddings, "size", None) or ""
+    return f"{type(embeddings).__name__}:{model}:{dimensions}"
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings client caching the vectors of another by content hash.
+
+    A text's key hashes the model namespace, whether it is embedded as a
+    query or a document (some models embed them differently) and the text
+    itself. Lookups go to an in-memory LRU, then to the SQLite file in
+    batches; the misses of a call are embedded in one batched request and
+    written back. A text another thread is already embedding is waited for,
+    not embedded twice. Vectors are stored as float32, and returned as
+    stored even on a miss so a text always gets the same vector.
+    """
+
+    def __init__(self, embeddings, path=EMBEDDING_CACHE_DB, namespace=None, memory_size=EMBEDDING_CACHE_SIZE):
+        """
+        @param embeddings: Embeddings client called for the misses
+        @param path: SQLite file of the cache
+        @param namespace: Model namespace of the keys, derived from the client by default
+        @param memory_size: Embeddings kept in the in-memory LRU
+        """
+        self.embeddings = embeddings
+        self.namespace = namespace or model_namespace(embeddings)
+        self.conn = connect(path)
+        self.memory_size = memory_size
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "embedding_calls": 0}
+        self._memory = OrderedDict()
+        # Keys being embedded by a thread -> event set once they are stored
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+
+    def _key(self, kind, text):
+        return hashlib.sha256(f"{self.namespace}\0{kind}\0{text}".encode()).hexdigest()
+
+    def _remember(self, key, vector):
+        # Called with the lock held
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _lookup(self, keys):
+        """Returns the cached vectors of the keys found, from memory then from the file."""
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+            self.stats["memory_hits"] += len(found)
+            missing = [key for key in keys if key not in found]
+            for start in range(0, len(missing), LOOKUP_BATCH):
+                batch = missing[start:start + LOOKUP_BATCH]
+                rows = self.conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({', '.join('?' * len(batch))})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+                    self._remember(key, found[key])
+                self.stats["disk_hits"] += len(rows)
+        return found
+
+    def _fill(self, kind, texts, keys):
+        """Embeds the texts of the missing keys in one request and stores them."""
+        if kind == "query":
+            vectors = [self.embeddings.embed_query(texts[0])]
+        else:
+            vectors = self.embeddings.embed_documents(texts)
+        arrays = [np.asarray(vector, dtype=np.float32) for vector in vectors]
+        now = time.time()
+        with self._lock, transaction(self.conn):
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, created_at) VALUES (?, ?, ?)",
+                [(key, array.tobytes(), now) for key, array in zip(keys, arrays)],
+            )
+            self.stats["misses"] += len(keys)
+            self.stats["embedding_calls"] += 1
+            for key, array in zip(keys, arrays):
+                self._remember(key, array.tolist())
+        return {key: array.tolist() for key, array in zip(keys, arrays)}
+
+    def _embed(self, kind, texts):
+        keys = [self._key(kind, text) for text in texts]
+        # Each distinct text is looked up and embedded once per call
+        unique = dict(zip(keys, texts))
+        found = self._lookup(list(unique))
+        with self._lock:
+            waiting = {key: self._pending[key] for key in unique if key not in found and key in self._pending}
+            owned = [key for key in unique if key not in found and key not in waiting]
+            for key in owned:
+                self._pending[key] = threading.Event()
+        try:
+            if owned:
+                found.update(self._fill(kind, [unique[key] for key in owned], owned))
+        finally:
+            with self._lock:
+                for key in owned:
+                    self._pending.pop(key).set()
+        for event in waiting.values():
+            event.wait()
+        if waiting:
+            found.update(self._lookup(list(waiting)))
+            # The other thread's request failed: embed them here
+            failed = [key for key in waiting if key not in found]
+            if failed:
+                found.update(self._fill(kind, [unique[key] for key in failed], failed))
+        return [found[key] for key in keys]
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        return self._embed("document", texts) if texts else []
+
+    def embed_query(self, text):
+        return self._embed("query", [text])[0]
+
+    def summary(self):
+        """Hits from memory and disk, embedded texts and embedding requests, and the hit rate."""
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((lookups - stats["misses"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+def cached_embeddings(embeddings, enabled=EMBEDDING_CACHE):
+    """Returns the embeddings client wrapped in the persistent cache, unless EMBEDDING_CACHE=false."""
+    return CachedEmbeddings(embeddings) if enabled else embeddings
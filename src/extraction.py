@@ -0,0 +1,172 @@
+import os
+import re
+from datetime import date, datetime
+from .state import Email, EmailFields, Amount
+
+# How much email context the writer and proofreader receive:
+#   "both"   -> extracted fields plus the full email body (default)
+#   "fields" -> extracted fields only, the body is left out of the prompts
+EMAIL_CONTEXT_MODE = os.getenv("EMAIL_CONTEXT_MODE", "both")
+
+MONTHS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+CURRENCY_SYMBOLS = {"$": "USD", "€": "EUR", "£": "GBP"}
+MULTIPLIERS = {"k": 1_000, "thousand": 1_000, "m": 1_000_000, "million": 1_000_000}
+
+# All patterns are compiled once at import time, extraction runs on every email
+_NUMBER = r"(\d{1,3}(?:,\d{3})+|\d+)(?:\.(\d{1,2}))?"
+_MULTIPLIER = r"(?:\s?(k|m|thousand|million)\b)?"
+AMOUNT_PREFIX_RE = re.compile(
+    r"(?:\b(USD|NZD|AUD|EUR|GBP|CAD)\s?|([$€£])\s?)" + _NUMBER + _MULTIPLIER,
+    re.IGNORECASE,
+)
+AMOUNT_SUFFIX_RE = re.compile(
+    _NUMBER + _MULTIPLIER + r"\s?(USD|NZD|AUD|EUR|GBP|CAD|dollars)\b",
+    re.IGNORECASE,
+)
+_MONTH = (
+    r"(jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?"
+    r"|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)\b\.?"
+)
+_DAY = r"(\d{1,2})(?:st|nd|rd|th)?"
+DATE_MONTH_FIRST_RE = re.compile(
+    r"\b" + _MONTH + r"\s+" + _DAY + r"\b(?:,?\s+(\d{4}))?", re.IGNORECASE
+)
+DATE_DAY_FIRST_RE = re.compile(
+    r"\b" + _DAY + r"\s+(?:of\s+)?" + _MONTH + r"(?:,?\s+(\d{4}))?", re.IGNORECASE
+)
+DATE_ISO_RE = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b")
+# Numeric dates follow the day/month/year convention, "/" or "-" separated: dotted
+# numbers are version or section numbers more often than dates
+DATE_NUMERIC_RE = re.compile(
+    r"(?<![\w/.-])(0?[1-9]|[12]\d|3[01])([/-])(0?[1-9]|1[0-2])\2(\d{2}|\d{4})(?![\w/-]|\.\d)"
+)
+RATE_RE = re.compile(r"\b(\d{1,2}(?:\.\d{1,3})?)\s?(?:%|per\s?cent\b|percent\b)", re.IGNORECASE)
+ACCOUNT_RE = re.compile(
+    r"\b(?:ending|ends)\s+(?:in|with)\s+[#xX*.\-\s]*(\d{3,6})\b"
+    r"|\b(?:account|acct|a/c)\s*(?:no\.?|number|#)?\s*[:#]?\s*(?:[xX*]+[\s\-]*)+(\d{3,6})\b",
+    re.IGNORECASE,
+)
+SIGNATORIES_RE = re.compile(r"\b(two|2)\s+signatories?")
+SENDER_NAME_RE = re.compile(r'^\s*"?([^"<]+?)"?\s*<[^>]+>\s*$')
+
+
+def _parse_number(integer, decimals, multiplier):
+    value = float(integer.replace(",", "") + ("." + decimals if decimals else ""))
+    if multiplier:
+        value *= MULTIPLIERS[multiplier.lower()]
+    return value
+
+
+def _extract_amounts(text):
+    amounts = []
+    spans = []
+    for match in AMOUNT_PREFIX_RE.finditer(text):
+        code, symbol, integer, decimals, multiplier = match.groups()
+        currency = code.upper() if code else CURRENCY_SYMBOLS[symbol]
+        amounts.append(Amount(currency=currency, value=_parse_number(integer, decimals, multiplier)))
+        spans.append(match.span())
+    for match in AMOUNT_SUFFIX_RE.finditer(text):
+        # Skip amounts already captured with a leading currency
+        if any(start <= match.start() < end for start, end in spans):
+            continue
+        integer, decimals, multiplier, currency = match.groups()
+        currency = "USD" if currency.lower() == "dollars" else currency.upper()
+        amounts.append(Amount(currency=currency, value=_parse_number(integer, decimals, multiplier)))
+    # The subject often repeats an amount from the body
+    unique = {(a.currency, a.value): a for a in amounts}
+    return list(unique.values())
+
+
+def _resolve_date(year, month, day, reference):
+    """Build a date, rolling year-less dates forward to their next occurrence."""
+    try:
+        if year:
+            year = int(year)
+            return date(year + 2000 if year < 100 else year, month, day)
+        resolved = date(reference.year, month, day)
+        if resolved < reference:
+            resolved = date(reference.year + 1, month, day)
+        return resolved
+    except ValueError:
+        return None
+
+
+def _extract_dates(text, reference):
+    dates = []
+    for match in DATE_MONTH_FIRST_RE.finditer(text):
+        month, day, year = match.groups()
+        dates.append(_resolve_date(year, MONTHS[month[:3].lower()], int(day), reference))
+    for match in DATE_DAY_FIRST_RE.finditer(text):
+        day, month, year = match.groups()
+        dates.append(_resolve_date(year, MONTHS[month[:3].lower()], int(day), reference))
+    for match in DATE_ISO_RE.finditer(text):
+        year, month, day = match.groups()
+        dates.append(_resolve_date(year, int(month), int(day), reference))
+    for match in DATE_NUMERIC_RE.finditer(text):
+        day, _, month, year = match.groups()
+        dates.append(_resolve_date(year, int(month), int(day), reference))
+    return sorted({d for d in dates if d is not None})
+
+
+def _extract_rates(text):
+    rates = []
+    for match in RATE_RE.finditer(text):
+        rate = float(match.group(1))
+        if rate not in rates:
+            rates.append(rate)
+    return rates
+
+
+def _extract_account_suffixes(text):
+    suffixes = []
+    for match in ACCOUNT_RE.finditer(text):
+        suffix = match.group(1) or match.group(2)
+        if suffix not in suffixes:
+            suffixes.append(suffix)
+    return suffixes
+
+
+def extract_sender_name(sender):
+    """Return the display name of a 'Name <address>' sender header, or an empty string."""
+    match = SENDER_NAME_RE.match(sender or "")
+    return match.group(1).strip() if match else ""
+
+
+def extract_fields(email: Email, reference: date = None) -> EmailFields:
+    """
+    Extracts the structured fields of an email with precompiled regexes.
+
+    @param email: Email to scan (subject and body)
+    @param reference: Date used to resolve dates without a year, defaults to today
+    @return: EmailFields record
+    """
+    reference = reference or datetime.now().date()
+    text = f"{email.subject}\n{email.body}"
+    return EmailFields(
+        sender_name=extract_sender_name(email.sender),
+        amounts=_extract_amounts(text),
+        dates=_extract_dates(text, reference),
+        rates=_extract_rates(text),
+        account_suffixes=_extract_account_suffixes(text),
+        signatories_count=2 if SIGNATORIES_RE.search(email.body.lower()) else 1,
+    )
+
+
+def format_fields(fields: EmailFields) -> str:
+    """Render the extracted fields as a compact, prompt-friendly record."""
+    lines = []
+    if fields.sender_name:
+        lines.append(f"- sender name: {fields.sender_name}")
+    if fields.amounts:
+        lines.append("- amounts: " + ", ".join(f"{a.currency} {a.value:,.2f}" for a in fields.amounts))
+    if fields.dates:
+        lines.append("- dates: " + ", ".join(d.isoformat() for d in fields.dates))
+    if fields.rates:
+        lines.append("- rates: " + ", ".join(f"{r:g}%" for r in fields.rates))
+    if fields.account_suffixes:
+        lines.append("- accounts ending in: " + ", ".join(fields.account_suffixes))
+    lines.append(f"- authorized signatories: {fields.signatories_count}")
+    return "\n".join(lines)
@@ -1,23 +1,47 @@
+import os
+import threading
+from datetime import datetime
+from colorama import Fore, Style
 from langgraph.graph import END, StateGraph
+from langgraph.checkpoint.sqlite import SqliteSaver
 from .state import GraphState
+from .budget import resume_budget
 from .nodes import Nodes
+from .storage import create_checkpointer, reconnect
+from .progress import ProgressStore
+from .tracing import tracer
+
+# Name of the inbox run, an unfinished run of the same name is resumed
+RUN_NAME = os.getenv("RUN_NAME", "inbox")
 
 class Workflow():
-    def __init__(self):
+    def __init__(self, checkpointer=None, progress=None, nodes=None):
         # initiate graph state & nodes
         workflow = StateGraph(GraphState)
-        nodes = Nodes()
+        nodes = nodes or Nodes(progress=progress or ProgressStore())
+        self.nodes = nodes
+        self.progress = nodes.progress
 
-        # define all graph nodes
-        workflow.add_node("load_inbox_emails", nodes.load_new_emails)
-        workflow.add_node("is_email_inbox_empty", nodes.is_email_inbox_empty)
-        workflow.add_node("categorize_email", nodes.categorize_email)
-        workflow.add_node("construct_rag_queries", nodes.construct_rag_queries)
-        workflow.add_node("retrieve_from_rag", nodes.retrieve_from_rag)
-        workflow.add_node("email_writer", nodes.write_draft_email)
-        workflow.add_node("email_proofreader", nodes.verify_generated_email)
-        workflow.add_node("send_email", nodes.create_draft_response)
-        workflow.add_node("skip_unrelated_email", nodes.skip_unrelated_email)
+        # define all graph nodes, each traced in a span
+        graph_nodes = {
+            "load_inbox_emails": nodes.load_new_emails,
+            "is_email_inbox_empty": nodes.is_email_inbox_empty,
+            "categorize_email": nodes.categorize_email,
+            "construct_rag_queries": nodes.construct_rag_queries,
+            "retrieve_from_rag": nodes.retrieve_from_rag,
+            "email_writer": nodes.write_draft_email,
+            "email_proofreader": nodes.verify_generated_email,
+            "send_email": nodes.create_draft_response,
+            "skip_unrelated_email": nodes.skip_unrelated_email,
+            "park_email": nodes.park_email,
+            "write_template_reply": nodes.write_template_reply,
+            "defer_email": nodes.defer_email,
+            "budget_fallback": nodes.budget_fallback,
+        }
+        for name, node in graph_nodes.items():
+            workflow.add_node(name, tracer.wrap_node(name, node))
+        # Graph node name of each Nodes method, to attribute profiles to nodes
+        self.node_names = {node.__name__: name for name, node in graph_nodes.items()}
 
         # load inbox emails
         workflow.set_entry_point("load_inbox_emails")
@@ -39,7 +63,17 @@ class Workflow():
             nodes.route_email_based_on_category,
             {
                 "unrelated": "skip_unrelated_email",
-                "not related": "email_writer"
+                # Every FinPower category is answered without RAG, construct_rag_queries
+                # and the retriever are only reached by a route sending emails to them
+                "not related": "email_writer",
+                "approved": "send_email",
+                "parked": "park_email",
+                # Thread claimed by another worker: leave it to that worker
+                "leased": "skip_unrelated_email",
+                # Under backpressure: template reply, or categorize and label only
+                "template": "write_template_reply",
+                "deferred": "defer_email",
+                "over_budget": "budget_fallback"
             }
         )
 
@@ -47,8 +81,20 @@ class Workflow():
         workflow.add_edge("construct_rag_queries", "retrieve_from_rag")
         # give information to writer agent to create draft email
         workflow.add_edge("retrieve_from_rag", "email_writer")
-        # proofread the generated draft email
-        workflow.add_edge("email_writer", "email_proofreader")
+        # proofread the generated draft email, unless the LLM provider is down or under backpressure
+        workflow.add_conditional_edges(
+            "email_writer",
+            nodes.check_parked,
+            {
+                "continue": "email_proofreader",
+                "parked": "park_email",
+                # Thread lease taken over by another worker while retrying
+                "leased": "skip_unrelated_email",
+                # Under backpressure the draft is created without review
+                "unreviewed": "send_email",
+                "over_budget": "budget_fallback"
+            }
+        )
         # check if email is sendable or not, if not rewrite the email
         workflow.add_conditional_edges(
             "email_proofreader",
@@ -57,13 +103,80 @@ class Workflow():
                 "send": "send_email",
                 "rewrite": "email_writer",
                 # On max trials stop: skip this email and continue
-                "stop": "skip_unrelated_email"
+                "stop": "skip_unrelated_email",
+                "parked": "park_email",
+                # Out of time, tokens or LLM calls: template reply or no draft
+                "over_budget": "budget_fallback"
+            }
+        )
+        workflow.add_conditional_edges(
+            "budget_fallback",
+            nodes.check_fallback_draft,
+            {
+                "send": "send_email",
+                "skip": "skip_unrelated_email"
             }
         )
 
         # check if there are still emails to be processed
         workflow.add_edge("send_email", "is_email_inbox_empty")
         workflow.add_edge("skip_unrelated_email", "is_email_inbox_empty" )
+        workflow.add_edge("park_email", "is_email_inbox_empty")
+        workflow.add_edge("write_template_reply", "send_email")
+        workflow.add_edge("defer_email", "is_email_inbox_empty")
+
+        # Compile, persisting the state after every step so crashed runs can resume
+        self.checkpointer = checkpointer or create_checkpointer()
+        self.app = workflow.compile(checkpointer=self.checkpointer)
+
+    def warm_up(self):
+        """
+        Loads the heavy modules and data of the workflow without opening any client,
+        e.g. in a server process before it forks its workers (gunicorn --preload).
+        """
+        self.nodes.agents.warm_up()
+
+    def after_fork(self):
+        """
+        Makes a forked worker open its own clients and connections: the LLM and Gmail
+        clients are rebuilt on first use, the SQLite connections are reopened.
+        """
+        nodes = self.nodes
+        nodes.agents.reset()
+        nodes.gmail_tools.reset()
+        for store in (nodes.progress, nodes.queue, nodes.leases):
+            store.reopen()
+        if isinstance(self.checkpointer, SqliteSaver):
+            self.checkpointer.conn = reconnect(self.checkpointer.conn)
+            self.checkpointer.lock = threading.Lock()
+
+    def stream(self, initial_state, run_name=RUN_NAME, config=None, thread_id=None):
+        """
+        Streams a run of the workflow, checkpointed under its own thread id.
+
+        If the last run of that name stopped before reaching the end (crash,
+        kill, error), it is resumed from its last checkpoint and initial_state
+        is ignored. Otherwise a new run starts from initial_state.
+        """
+        thread_id = thread_id or self.progress.unfinished_run(run_name) or self.progress.start_run(run_name)
+        self.progress.start_run(run_name, thread_id)
+        config = {**(config or {}), "configurable": {"thread_id": thread_id}}
+        snapshot = self.app.get_state(config)
+        if snapshot.next:
+            print(Fore.YELLOW + f"Resuming unfinished run {thread_id} at {', '.join(snapshot.next)}" + Style.RESET_ALL)
+            # The current email is charged for its processing time, not for the downtime
+            budget = snapshot.values.get("budget")
+            if budget is not None:
+                stopped_at = datetime.fromisoformat(snapshot.created_at).timestamp()
+                self.app.update_state(config, {"budget": resume_budget(budget, stopped_at)})
+        run_input = None if snapshot.next else initial_state
+        yield from self.app.stream(run_input, config)
+        self.progress.finish_run(thread_id)
+        # A failed run keeps its queue to be resumed, a finished one leaves none behind
+        self.drop_queue(thread_id)
 
-        # Compile
-        self.app = workflow.compile()
\ No newline at end of file
+    def drop_queue(self, thread_id):
+        """Deletes the email queue of a run that finished, or failed and will not be resumed."""
+        queue_key = self.app.get_state({"configurable": {"thread_id": thread_id}}).values.get("queue_key")
+        if queue_key:
+            self.nodes.queue.drop(queue_key)
\ No newline at end of file
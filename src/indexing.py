@@ -0,0 +1,218 @@
+import os
+import re
+import json
+import time
+import hashlib
+from datetime import datetime, timezone
+from colorama import Fore, Style
+from .embedding_cache import cached_embeddings
+from .retriever import NumpyVectorStore, CHROMA_DIR, VECTOR_INDEX_DIR
+
+# Embedding model of the knowledge base chunks and of the RAG queries, they must match
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+# Dimensions of the embeddings, the model's own if empty
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "0")) or None
+# Files of the knowledge base, comma separated
+KNOWLEDGE_BASE = [path.strip() for path in os.getenv("KNOWLEDGE_BASE", "data/agency.txt").split(",") if path.strip()]
+# Characters per chunk, and shared by two consecutive chunks of a long section
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "300"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "50"))
+# Metadata of the built index, checked by the runtime before it queries the index
+INDEX_MANIFEST = os.getenv("INDEX_MANIFEST", "db/index.json")
+# Chunks embedded and added per request, below Chroma's maximum batch size
+ADD_BATCH = 1000
+
+
+def embedding_config():
+    """Embedding settings shared by the indexer and the runtime, recorded in the index manifest."""
+    return {"provider": "openai", "model": EMBEDDING_MODEL, "dimensions": EMBEDDING_DIMENSIONS}
+
+
+def create_embeddings():
+    """Returns the embeddings client of the configured model, behind the persistent embedding cache."""
+    from langchain_openai import OpenAIEmbeddings
+    kwargs = {"dimensions": EMBEDDING_DIMENSIONS} if EMBEDDING_DIMENSIONS else {}
+    return cached_embeddings(OpenAIEmbeddings(model=EMBEDDING_MODEL, **kwargs))
+
+
+def read_manifest(path=INDEX_MANIFEST):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def check_index(path=INDEX_MANIFEST):
+    """
+    Checks that the index was built with the runtime's embedding model.
+
+    @param path: Index manifest written by the indexer
+    @return: The manifest, or None (after a warning) for an index built without one
+    @raise ValueError: The chunks were embedded with another model or dimensions
+    """
+    manifest = read_manifest(path)
+    if manifest is None:
+        print(Fore.YELLOW + f"No index manifest at {path}, the vector index may not match {EMBEDDING_MODEL}: "
+              f"run python create_index.py" + Style.RESET_ALL)
+        return None
+    if manifest["embedding"] != embedding_config():
+        raise ValueError(f"The vector index was embedded with {manifest['embedding']}, the runtime embeds queries "
+                         f"with {embedding_config()}: run python create_index.py")
+    return manifest
+
+
+def _digest(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def split_source(path, text, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    """
+    Splits a knowledge base file into chunks keyed by their content.
+
+    Each section (block between blank lines) is split on its own, so an edit
+    only changes the chunks of its section. A chunk's id hashes its source,
+    text and occurrence: unchanged chunks keep their id wherever they move.
+
+    @return: List of (chunk id, text, metadata)
+    """
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    chunks, occurrences, section = [], {}, ""
+    for block in re.split(r"\n\s*\n", text):
+        block = block.strip()
+        if not block:
+            continue
+        if block.startswith("#"):
+            section = block.splitlines()[0].lstrip("#").strip()
+        for chunk in splitter.split_text(block):
+            content_hash = _digest(chunk)
+            occurrence = occurrences.get(content_hash, 0)
+            occurrences[content_hash] = occurrence + 1
+            chunk_id = _digest(f"{path}\0{occurrence}\0{chunk}")[:32]
+            chunks.append((chunk_id, chunk, {"source": path, "section": section, "content_hash": content_hash}))
+    return chunks
+
+
+class KnowledgeBaseIndexer:
+    """
+    Keeps the Chroma store, and the numpy index exported from it, in sync with the knowledge base files.
+
+    Files whose hash is unchanged since the last run are skipped. Chunks of a
+    changed file are diffed by id against the store: only the added chunks
+    are embedded, the ones gone are deleted. A change of the embedding model
+    or of the chunking rebuilds the whole index. The manifest records the
+    embedding settings, the chunking and the hash and chunks of each file.
+    """
+
+    def __init__(self, store=None, manifest_path=INDEX_MANIFEST, numpy_dir=VECTOR_INDEX_DIR,
+                 chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, embedding=None):
+        """
+        @param store: Chroma store of the chunks, the persisted one in db/ with the configured embeddings by default
+        @param manifest_path: Index manifest written after each run
+        @param numpy_dir: Directory of the numpy index exported from the store, None to skip the export
+        @param embedding: Embedding settings recorded in the manifest, embedding_config() by default
+        """
+        if store is None:
+            from langchain_chroma import Chroma
+            store = Chroma(persist_directory=CHROMA_DIR, embedding_function=create_embeddings())
+        self.store = store
+        self.manifest_path = manifest_path
+        self.numpy_dir = numpy_dir
+        self.chunking = {"chunk_size": chunk_size, "chunk_overlap": chunk_overlap}
+        self.embedding = embedding or embedding_config()
+
+    def _source_ids(self, path):
+        return self.store.get(where={"source": path}, include=[])["ids"]
+
+    def sync(self, sources=None, full=False):
+        """
+        Indexes the knowledge base files, embedding only what changed since the last run.
+
+        @param sources: Files of the knowledge base, KNOWLEDGE_BASE by default
+        @param full: Rebuild the whole index
+        @return: Dict of the run's counts: files indexed and skipped, chunks added, deleted and kept, seconds
+        """
+        start = time.perf_counter()
+        sources = list(sources or KNOWLEDGE_BASE)
+        manifest = read_manifest(self.manifest_path) or {}
+        stats = {"files_indexed": 0, "files_skipped": 0, "added": 0, "deleted": 0, "kept": 0}
+        added_ids, deleted_ids, rebuilt = [], [], False
+        if full or manifest.get("embedding") != self.embedding or manifest.get("chunking") != self.chunking:
+            # Vectors of another model, or chunks cut differently: nothing can be kept
+            existing = self.store.get(include=[])["ids"]
+            if existing:
+                self.store.delete(ids=existing)
+                stats["deleted"] += len(existing)
+            manifest, rebuilt = {}, True
+        # Store changed outside the indexer: diff every file against it instead of trusting their hashes
+        trust_hashes = manifest.get("chunks") == self.store._collection.count()
+        indexed = {}
+        for path in sources:
+            with open(path, encoding="utf-8") as f:
+                text = f.read()
+            file_hash = _digest(text)
+            previous = manifest.get("sources", {}).get(path)
+            if trust_hashes and previous and previous["sha256"] == file_hash:
+                indexed[path] = previous
+                stats["files_skipped"] += 1
+                stats["kept"] += previous["chunks"]
+                continue
+            chunks = split_source(path, text, **self.chunking)
+            existing = set(self._source_ids(path))
+            wanted = {chunk_id for chunk_id, _, _ in chunks}
+            stale = sorted(existing - wanted)
+            added = [chunk for chunk in chunks if chunk[0] not in existing]
+            if stale:
+                self.store.delete(ids=stale)
+                deleted_ids.extend(stale)
+            added_ids.extend(chunk_id for chunk_id, _, _ in added)
+            for batch in range(0, len(added), ADD_BATCH):
+                chunk_batch = added[batch:batch + ADD_BATCH]
+                self.store.add_texts([text for _, text, _ in chunk_batch], [metadata for _, _, metadata in chunk_batch],
+                                     ids=[chunk_id for chunk_id, _, _ in chunk_batch])
+            indexed[path] = {"sha256": file_hash, "chunks": len(chunks)}
+            stats["files_indexed"] += 1
+            stats["added"] += len(added)
+            stats["deleted"] += len(stale)
+            stats["kept"] += len(chunks) - len(added)
+        # Files dropped from the knowledge base
+        for path in set(manifest.get("sources", {})) - set(sources):
+            stale = self._source_ids(path)
+            if stale:
+                self.store.delete(ids=stale)
+                deleted_ids.extend(stale)
+                stats["deleted"] += len(stale)
+        self._update_numpy_index(added_ids, deleted_ids, rebuilt or not trust_hashes)
+        self._write_manifest(indexed)
+        stats["seconds"] = round(time.perf_counter() - start, 3)
+        return stats
+
+    def _update_numpy_index(self, added_ids, deleted_ids, rebuilt):
+        """Applies the run's changes to the numpy index, exported whole from the store after a rebuild or if missing."""
+        if not self.numpy_dir:
+            return
+        if rebuilt or not os.path.exists(os.path.join(self.numpy_dir, "embeddings.npy")):
+            NumpyVectorStore.from_chroma(self.store).save(self.numpy_dir)
+            return
+        if not added_ids and not deleted_ids:
+            return
+        index = NumpyVectorStore.load(self.numpy_dir, self.store.embeddings, mmap=False)
+        index.delete(deleted_ids)
+        index.add_from_chroma(self.store, added_ids)
+        index.save(self.numpy_dir)
+
+    def _write_manifest(self, sources):
+        manifest = {
+            "embedding": self.embedding,
+            "chunking": self.chunking,
+            "sources": sources,
+            "chunks": sum(source["chunks"] for source in sources.values()),
+            "updated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        }
+        directory = os.path.dirname(self.manifest_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(temporary, self.manifest_path)
@@ -0,0 +1,230 @@
+import os
+import uuid
+import threading
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from colorama import Fore, Style
+from .deltas import stream_deltas
+from .profiling import RunProfiler
+
+# Workflow runs executed at the same time by the API
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+# Finished runs kept in memory for GET /runs/{id}
+JOB_HISTORY = int(os.getenv("JOB_HISTORY", "100"))
+
+# Status of an email after each node ran on it
+EMAIL_STATUS = {
+    "categorize_email": "categorized",
+    "construct_rag_queries": "researching",
+    "retrieve_from_rag": "researching",
+    "email_writer": "drafting",
+    "email_proofreader": "reviewing",
+    "send_email": "drafted",
+    "skip_unrelated_email": "skipped",
+    "park_email": "parked",
+    "write_template_reply": "drafting",
+    "defer_email": "deferred",
+    "budget_fallback": "over_budget",
+}
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+class Job:
+    """A workflow run submitted through the API, with its per-email progress."""
+
+    def __init__(self, initial_state, config=None, profile=False):
+        self.id = uuid.uuid4().hex
+        self.thread_id = f"api-{self.id}"
+        self.initial_state = initial_state
+        self.config = config or {}
+        # Profiled runs keep the summary of their profile
+        self.profile = profile
+        self.profile_summary = None
+        self.status = "queued"
+        self.error = None
+        self.created_at = _now()
+        self.started_at = None
+        self.finished_at = None
+        self.pending_emails = None
+        self.emails = OrderedDict()
+        # Events of the run, numbered from 1 so SSE clients can resume after any id
+        self.events = []
+
+    @property
+    def done(self):
+        return self.status in ("succeeded", "failed")
+
+    def add_event(self, event):
+        event["id"] = len(self.events) + 1
+        self.events.append(event)
+
+    def record_delta(self, delta):
+        """Updates the progress of the delta's email and appends the delta to the events."""
+        if "pending" in delta:
+            self.pending_emails = delta["pending"]
+        email_id = delta.get("email_id")
+        if email_id and delta["node"] in EMAIL_STATUS:
+            email = self.emails.setdefault(email_id, {"email_id": email_id})
+            email["status"] = EMAIL_STATUS[delta["node"]]
+            email["updated_at"] = _now()
+            for key in ("category", "draft_hash", "degradation"):
+                if key in delta:
+                    email[key] = delta[key]
+            # The nodes finishing an email reset trials to 0
+            if delta["node"] == "email_writer":
+                email["trials"] = delta["trials"]
+        self.add_event({"event": "delta", **delta})
+
+    def summary(self):
+        """Counts of the run's emails per status."""
+        counts = {}
+        for email in self.emails.values():
+            counts[email["status"]] = counts.get(email["status"], 0) + 1
+        return counts
+
+    def to_dict(self, emails=True):
+        job = {
+            "run_id": self.id,
+            "thread_id": self.thread_id,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "pending_emails": self.pending_emails,
+            "summary": self.summary(),
+            "events": len(self.events),
+            "profiled": self.profile,
+        }
+        if emails:
+            job["emails"] = list(self.emails.values())
+        return job
+
+
+class JobManager:
+    """
+    Runs workflow jobs on a background worker pool.
+
+    Submitting returns at once; progress is read with get() or followed with
+    wait_events(), which blocks until the job has new events. A profiled job
+    runs alone: it is only accepted when no other job is queued or running,
+    and the jobs submitted after it wait for it to finish.
+    """
+
+    def __init__(self, workflow, max_workers=JOB_WORKERS, history=JOB_HISTORY):
+        self.workflow = workflow
+        self.history = history
+        self._jobs = OrderedDict()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="workflow-job")
+        self._max_workers = max_workers
+        self._changed = threading.Condition()
+        # Id of the profiled job running alone, its allocations are traced process-wide
+        self._exclusive = None
+
+    def submit(self, initial_state, config=None, profile=False):
+        """
+        Queues a workflow run, profiled if asked, and returns its Job.
+
+        @raise RuntimeError: A profiled run was asked while other jobs are queued or running
+        """
+        job = Job(initial_state, config, profile)
+        with self._changed:
+            if profile:
+                if self._exclusive or any(not other.done for other in self._jobs.values()):
+                    raise RuntimeError("Other runs are in progress, a profiled run must run alone")
+                self._exclusive = job.id
+            self._jobs[job.id] = job
+            self._evict()
+            job.add_event({"event": "status", "status": job.status})
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        with self._changed:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        with self._changed:
+            return list(self._jobs.values())
+
+    def wait_events(self, job_id, after=0, timeout=15.0):
+        """
+        Returns the events of a job after the given event id.
+
+        @param job_id: Id of the job
+        @param after: Id of the last event already received
+        @param timeout: Seconds to wait for new events when there are none yet
+        @return: List of events, empty on timeout or once the job is done (or forgotten, see JOB_HISTORY)
+        """
+        with self._changed:
+            job = self._jobs.get(job_id)
+            if job is None:
+                # Finished and evicted while a client was following it
+                return []
+            if len(job.events) <= after and not job.done:
+                self._changed.wait_for(lambda: len(job.events) > after or job.done, timeout)
+            return job.events[after:]
+
+    def status(self):
+        """Worker pool usage and the latest runs."""
+        jobs = self.jobs()
+        return {
+            "workers": self._max_workers,
+            "running": sum(job.status == "running" for job in jobs),
+            "queued": sum(job.status == "queued" for job in jobs),
+            "runs": [job.to_dict(emails=False) for job in reversed(jobs[-10:])],
+        }
+
+    def _run(self, job):
+        if not job.profile:
+            with self._changed:
+                self._changed.wait_for(lambda: self._exclusive is None)
+        self._update(job, status="running", started_at=_now())
+        try:
+            run = self.workflow.stream(job.initial_state, run_name="api", config=job.config, thread_id=job.thread_id)
+            profiler = RunProfiler(self.workflow.node_names, f"api-{job.id}") if job.profile else None
+            if profiler:
+                run = profiler.profile(run)
+            try:
+                for delta in stream_deltas(run):
+                    with self._changed:
+                        job.record_delta(delta)
+                        self._changed.notify_all()
+            finally:
+                if profiler:
+                    # Written when the run ends, failed runs included
+                    run.close()
+                    job.profile_summary = profiler.summary
+            self._update(job, status="succeeded", finished_at=_now())
+        except Exception as e:
+            print(Fore.RED + f"Workflow run {job.id} failed: {e}" + Style.RESET_ALL)
+            traceback.print_exc()
+            self._update(job, status="failed", error=str(e), finished_at=_now())
+            # API runs are never resumed: their emails would count in the backlog until the queue expires
+            try:
+                self.workflow.drop_queue(job.thread_id)
+            except Exception as e:
+                print(Fore.RED + f"Error dropping the queue of run {job.id}: {e}" + Style.RESET_ALL)
+        finally:
+            if job.profile:
+                with self._changed:
+                    self._exclusive = None
+                    self._changed.notify_all()
+
+    def _update(self, job, **fields):
+        with self._changed:
+            for name, value in fields.items():
+                setattr(job, name, value)
+            job.add_event({"event": "status", "status": job.status, "error": job.error})
+            self._changed.notify_all()
+
+    def _evict(self):
+        # Forget the oldest finished runs beyond the history size
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(0, len(self._jobs) - self.history)]:
+            del self._jobs[job_id]
@@ -0,0 +1,61 @@
+import threading
+from collections import defaultdict
+from .routing import LatencyWindow
+
+
+class LatencyTracker:
+    """
+    Latencies grouped by class (priority class, email category...).
+
+    Percentiles are computed over the latest samples of each class, the
+    count and the maximum over every sample since the last reset.
+    """
+
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self._windows = defaultdict(lambda: LatencyWindow(size=window))
+        self._counts = defaultdict(int)
+        self._max = defaultdict(float)
+
+    def record(self, group, seconds):
+        with self._lock:
+            window = self._windows[group]
+            self._counts[group] += 1
+            self._max[group] = max(self._max[group], seconds)
+        window.record(seconds)
+
+    def percentile(self, group, p):
+        """Returns the p-th percentile latency of a class, None without samples."""
+        with self._lock:
+            window = self._windows.get(group)
+        return window.percentile(p) if window is not None else None
+
+    def count(self, group):
+        with self._lock:
+            return self._counts.get(group, 0)
+
+    def summary(self):
+        """Returns the count, p50, p95 and maximum latency in seconds of each class."""
+        with self._lock:
+            groups = list(self._windows.items())
+            counts, maxima = dict(self._counts), dict(self._max)
+        return {
+            group: {
+                "count": counts[group],
+                "p50_seconds": window.percentile(50),
+                "p95_seconds": window.percentile(95),
+                "max_seconds": maxima[group],
+            }
+            for group, window in groups
+        }
+
+    def reset(self):
+        with self._lock:
+            self._windows.clear()
+            self._counts.clear()
+            self._max.clear()
+
+
+# Receipt to draft latency per priority class, shared by every workflow of the
+# process and reported by main.py and GET /latency
+draft_latency = LatencyTracker()
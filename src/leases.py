@@ -0,0 +1,117 @@
+import os
+import time
+import threading
+from abc import ABC, abstractmethod
+from .storage import connect, reconnect, transaction, RUNTIME_DB
+
+# Store of the per-thread leases: "sqlite" is shared by every process using the
+# same RUNTIME_DB (API workers, cron runs), "memory" only within one process
+LEASE_BACKEND = os.getenv("LEASE_BACKEND", "sqlite")
+# A lease left by a crashed worker can be claimed by another one after this delay
+LEASE_TTL_SECONDS = float(os.getenv("LEASE_TTL_SECONDS", "600"))
+
+
+class LeaseManager(ABC):
+    """
+    Exclusive, expiring claims on Gmail threads.
+
+    A worker acquires the lease of an email's thread before processing it and
+    releases it once the draft is created, so concurrent workers never draft
+    the same thread twice. Subclass it to back leases by another store.
+    """
+
+    @abstractmethod
+    def acquire(self, key, owner, ttl=LEASE_TTL_SECONDS):
+        """
+        Claims a lease, or extends it when the owner already holds it.
+
+        @param key: Leased resource, a Gmail threadId
+        @param owner: Id of the claiming worker run
+        @param ttl: Seconds after which the lease expires if not released
+        @return: True if the owner holds the lease
+        """
+
+    @abstractmethod
+    def release(self, key, owner):
+        """Releases a lease, if the owner still holds it."""
+
+    @abstractmethod
+    def holder(self, key):
+        """Returns the owner of an unexpired lease, or None."""
+
+    def reopen(self):
+        """Reopens the connections inherited from a parent process, in a forked worker."""
+        pass
+
+
+class InMemoryLeaseManager(LeaseManager):
+    def __init__(self):
+        self._leases = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key, owner, ttl=LEASE_TTL_SECONDS):
+        now = time.time()
+        with self._lock:
+            current = self._leases.get(key)
+            if current and current[0] != owner and current[1] > now:
+                return False
+            self._leases[key] = (owner, now + ttl)
+            return True
+
+    def release(self, key, owner):
+        with self._lock:
+            if self._leases.get(key, (None,))[0] == owner:
+                del self._leases[key]
+
+    def holder(self, key):
+        with self._lock:
+            current = self._leases.get(key)
+        return current[0] if current and current[1] > time.time() else None
+
+
+class SqliteLeaseManager(LeaseManager):
+    def __init__(self, path=RUNTIME_DB):
+        self.conn = connect(path)
+        self._lock = threading.Lock()
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS leases (
+                lease_key TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+
+    def reopen(self):
+        """Replaces the connection inherited from a parent process, in a forked worker."""
+        self.conn = reconnect(self.conn)
+        self._lock = threading.Lock()
+
+    def acquire(self, key, owner, ttl=LEASE_TTL_SECONDS):
+        now = time.time()
+        # The upsert only takes over a lease that expired or that the owner holds
+        with self._lock, transaction(self.conn):
+            self.conn.execute(
+                "INSERT INTO leases (lease_key, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(lease_key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE leases.owner = excluded.owner OR leases.expires_at <= ?",
+                (key, owner, now + ttl, now),
+            )
+            return self.conn.execute("SELECT changes()").fetchone()[0] == 1
+
+    def release(self, key, owner):
+        with self._lock:
+            self.conn.execute("DELETE FROM leases WHERE lease_key = ? AND owner = ?", (key, owner))
+
+    def holder(self, key):
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT owner FROM leases WHERE lease_key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+
+def create_lease_manager(kind=LEASE_BACKEND):
+    """Returns the lease store selected by LEASE_BACKEND."""
+    if kind == "memory":
+        return InMemoryLeaseManager()
+    return SqliteLeaseManager()
@@ -0,0 +1,211 @@
+import os
+import time
+import threading
+import openai
+from langchain_core.runnables import Runnable
+from .tokens import count_tokens
+
+# Client-side limits shared by every agent chain of the process
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "500"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "30000"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# Tokens reserved for the completion when estimating the cost of a call
+LLM_EXPECTED_OUTPUT_TOKENS = int(os.getenv("LLM_EXPECTED_OUTPUT_TOKENS", "300"))
+# Circuit breaker: open after N consecutive provider failures, retry after a cool-down
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling the LLM provider while it is considered down."""
+
+
+def is_rate_limit_error(error):
+    return isinstance(error, openai.RateLimitError)
+
+
+def is_provider_error(error):
+    """Errors meaning the provider is degraded: timeouts, connection errors and 5xx."""
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+def is_llm_unavailable(error):
+    """Errors after which an email should be parked and retried later rather than failed."""
+    return isinstance(error, CircuitOpenError) or is_rate_limit_error(error) or is_provider_error(error)
+
+
+class TokenBucket:
+    """Refills `per_minute` units per minute, callers block until enough units are available."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.available = float(per_minute)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        # A single call larger than the whole budget only waits for a full bucket
+        amount = min(float(amount), self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.available >= amount:
+                    self.available -= amount
+                    return
+                wait = (amount - self.available) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveConcurrency:
+    """
+    Limits in-flight calls with additive increase / multiplicative decrease:
+    the limit halves on every rate-limit error and grows back slowly on success.
+    """
+
+    def __init__(self, max_limit):
+        self.max_limit = max_limit
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= max(1, int(self.limit)):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, throttled=False):
+        with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(1.0, self.limit / 2)
+            else:
+                self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+
+class CircuitBreaker:
+    """Closed -> open after repeated failures -> half-open after a cool-down -> closed on success."""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_seconds=CIRCUIT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Fails fast while open, lets a single trial call through once the cool-down is over."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = self.HALF_OPEN
+                self._trial_running = False
+            if self.state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return
+            raise CircuitOpenError("LLM provider circuit is open, failing fast")
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def release_trial(self):
+        """Frees the half-open trial slot when the trial ended without a verdict."""
+        with self._lock:
+            self._trial_running = False
+
+
+class LLMGuard:
+    """Rate limits, adaptive concurrency and circuit breaking around every LLM call."""
+
+    def __init__(self, requests_per_minute=LLM_REQUESTS_PER_MINUTE, tokens_per_minute=LLM_TOKENS_PER_MINUTE,
+                 max_concurrency=LLM_MAX_CONCURRENCY, breaker=None):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.concurrency = AdaptiveConcurrency(max_concurrency)
+        self.breaker = breaker or CircuitBreaker()
+        self.stats = {"calls": 0, "rate_limited": 0, "provider_errors": 0, "rejected": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, stat):
+        with self._stats_lock:
+            self.stats[stat] += 1
+
+    def call(self, fn, estimated_tokens):
+        """
+        Runs fn once the limits allow it.
+
+        @param fn: Callable performing the LLM call
+        @param estimated_tokens: Prompt plus expected completion tokens of the call
+        @return: Result of fn
+        @raise CircuitOpenError: If the provider circuit is open
+        """
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            self._count("rejected")
+            raise
+        self.requests.acquire(1)
+        self.tokens.acquire(estimated_tokens)
+        self.concurrency.acquire()
+        self._count("calls")
+        try:
+            result = fn()
+        except Exception as e:
+            throttled = is_rate_limit_error(e)
+            self.concurrency.release(throttled=throttled)
+            if throttled:
+                self._count("rate_limited")
+                self.breaker.release_trial()
+            elif is_provider_error(e):
+                self._count("provider_errors")
+                self.breaker.record_failure()
+            else:
+                # Errors of our own (e.g. output parsing) say nothing about the provider
+                self.breaker.release_trial()
+            raise
+        self.concurrency.release()
+        self.breaker.record_success()
+        return result
+
+
+class GuardedRunnable(Runnable):
+    """Routes every call of a runnable through an LLMGuard."""
+
+    def __init__(self, runnable, guard):
+        self.runnable = runnable
+        self.guard = guard
+
+    def invoke(self, input, config=None, **kwargs):
+        estimated_tokens = count_tokens(_input_text(input)) + LLM_EXPECTED_OUTPUT_TOKENS
+        return self.guard.call(lambda: self.runnable.invoke(input, config, **kwargs), estimated_tokens)
+
+
+def _input_text(input):
+    """Text of a prompt value, message list or plain input, for token estimation."""
+    if hasattr(input, "to_string"):
+        return input.to_string()
+    return str(input)
+
+
+# Shared by every Agents instance of the process
+llm_guard = LLMGuard()
@@ -1,26 +1,134 @@
+import time
+import uuid
 from colorama import Fore, Style
+from langchain_core.messages import RemoveMessage
+from langgraph.graph.message import REMOVE_ALL_MESSAGES
 from .agents import Agents
 from .tools.GmailTools import GmailToolsClass
 from .state import GraphState, Email
-import re
+from .extraction import extract_fields, format_fields, EMAIL_CONTEXT_MODE
+from .limiter import is_llm_unavailable
+from .progress import ProgressStore
+from .email_queue import create_email_queue
+from .leases import create_lease_manager
+from .priority import priority_class, received_at
+from .latency import draft_latency
+from .sla import sla_tracker, stage_latencies
+from .backpressure import BackpressureController, template_reply, DEGRADED_LABEL
+from .tracing import tracer
+from .budget import BudgetMeter, new_budget, charge, exhausted, can_afford_round, spend
 import traceback
 
 
 class Nodes:
-    def __init__(self):
-        self.agents = Agents()
-        self.gmail_tools = GmailToolsClass()
+    def __init__(self, progress=None, queue=None, agents=None, gmail_tools=None, leases=None, backpressure=None):
+        self.agents = agents or Agents()
+        # Gmail calls are traced like the nodes and LLM calls
+        self.gmail_tools = tracer.traced(gmail_tools or GmailToolsClass(), "gmail")
+        # Per-email outputs persisted across crashes and restarts
+        self.progress = progress or ProgressStore()
+        # Emails waiting to be processed, kept out of the checkpointed state
+        self.queue = queue or create_email_queue()
+        # Per-thread claims shared with the other workers processing the same inbox
+        self.leases = leases or create_lease_manager()
+        # Degrades the workflow when the backlog or the LLM latency grows
+        self.backpressure = backpressure or BackpressureController()
+
+    def _current_email(self, state):
+        """Loads the email being processed from the queue."""
+        return self.queue.get(state["current_email_id"])
+
+    def _invoke(self, state, chain, inputs, budget=None):
+        """
+        Invokes an agent chain in a span, metering its LLM calls against the email's budget.
+
+        @param state: Graph state of the current email
+        @param chain: Name of the Agents chain to invoke
+        @param inputs: Input of the chain
+        @param budget: Budget to charge, defaults to the state's
+        @return: Tuple (chain result, charged budget)
+        """
+        meter = BudgetMeter()
+        with tracer.span("llm", chain) as span:
+            start = time.perf_counter()
+            try:
+                result = getattr(self.agents, chain).invoke(inputs, config={"callbacks": [meter]})
+            finally:
+                span.set(tokens=meter.tokens, llm_calls=meter.llm_calls, retries=meter.retries)
+            self.backpressure.record_latency(time.perf_counter() - start)
+        budget = budget or state.get("budget")
+        if budget is not None:
+            budget = charge(budget, meter.tokens, meter.llm_calls)
+        return result, budget
+
+    def _over_budget(self, state):
+        """Returns True, after logging it, if the current email spent its budget."""
+        reason = exhausted(state.get("budget"))
+        if reason is None:
+            return False
+        print(Fore.RED + f"Email {state['current_email_id']} is over its {reason} budget" + Style.RESET_ALL)
+        return True
+
+    def _done_with_email(self, state, retried=False):
+        """
+        Removes the current email from the queue, releases its thread and resets the per-email fields.
+
+        @param retried: The email is left for a later run to retry (parked), a deferred one stays deferred
+        """
+        email = self._current_email(state)
+        if state.get("budget") is not None:
+            self.progress.save_spend(email, spend(state["budget"]))
+        progress = self.progress.get(email.id)
+        if (progress.get("degradation") == "deferred" and not progress.get("drafted")
+                and state.get("degradation") != "deferred" and not retried):
+            # Reprocessed and finished without a draft (skipped, unrelated...): no longer waiting to be drafted
+            self._record_degradation(email, "")
+        self.leases.release(email.threadId, state.get("lease_owner", ""))
+        self.queue.remove(state["queue_key"], email.id)
+        return {
+            "pending_emails": self.queue.size(state["queue_key"]),
+            "leased": False,
+            "degradation": "",
+            "budget": None,
+            "retrieved_documents": "",
+            "trials": 0,
+            "writer_messages": [RemoveMessage(id=REMOVE_ALL_MESSAGES)]
+        }
 
     def load_new_emails(self, state: GraphState) -> GraphState:
         """Loads new emails from Gmail and updates the state."""
         print(Fore.YELLOW + "Loading new emails...\n" + Style.RESET_ALL)
+        # Emails preloaded in the queue (e.g. by the Gmail webhook) are processed as is
+        queue_key = state.get("queue_key")
+        # Leases of this run are claimed under its own owner id, kept across resumes
+        lease_owner = state.get("lease_owner") or uuid.uuid4().hex
+        if queue_key and self.queue.size(queue_key):
+            return {"queue_key": queue_key, "pending_emails": self.queue.size(queue_key), "lease_owner": lease_owner}
         recent_emails = self.gmail_tools.fetch_unanswered_emails()
-        emails = [Email(**email) for email in recent_emails]
-        return {"emails": emails}
+        # Skip emails drafted by a previous run whose draft Gmail does not list yet
+        drafted = self.progress.drafted_ids(email["id"] for email in recent_emails)
+        emails = [Email(**email) for email in recent_emails if email["id"] not in drafted]
+        emails += self._deferred_emails({email.id for email in emails})
+        queue_key = state.get("queue_key") or uuid.uuid4().hex
+        self.queue.put_many(queue_key, emails)
+        return {"queue_key": queue_key, "pending_emails": self.queue.size(queue_key), "lease_owner": lease_owner}
+
+    def _deferred_emails(self, fetched_ids):
+        """Emails deferred under backpressure and not drafted since, once the workflow no longer defers."""
+        if self.backpressure.deferring:
+            return []
+        emails = []
+        for record in self.progress.degraded("deferred", drafted=False):
+            if record["email_id"] not in fetched_ids:
+                try:
+                    emails.append(Email(**self.gmail_tools.get_email(record["email_id"])))
+                except Exception as e:
+                    print(Fore.RED + f"Error fetching deferred email {record['email_id']}: {e}" + Style.RESET_ALL)
+        return emails
 
     def check_new_emails(self, state: GraphState) -> str:
         """Checks if there are new emails to process."""
-        if len(state['emails']) == 0:
+        if state.get("pending_emails", 0) == 0:
             print(Fore.RED + "No new emails" + Style.RESET_ALL)
             return "empty"
         else:
@@ -28,126 +136,207 @@ class Nodes:
             return "process"
         
     def is_email_inbox_empty(self, state: GraphState) -> GraphState:
-        return state
+        # No update: returning the state would re-add parked_emails to itself through its reducer
+        return {}
 
     def categorize_email(self, state: GraphState) -> GraphState:
         """Categorizes the current email using the categorize_email agent."""
         print(Fore.YELLOW + "Checking email category...\n" + Style.RESET_ALL)
-        print(state["emails"][-1])
-        # Get the last email
-        try:
-            current_email = state["emails"][-1]
-        except (KeyError, IndexError) as e:
+        # Get the next email of the queue
+        email_id = self.queue.peek(state["queue_key"])
+        if email_id is None:
             print(Fore.RED + "Error in categorize_email: No emails to categorize. Retrying..." + Style.RESET_ALL)
-            raise RuntimeError("No emails to categorize") from e
-        try:
-            result = self.agents.categorize_email.invoke({"email": current_email.body})
-        except Exception as e:
-            print(Fore.RED + f"Error invoking categorize_email agent: {e}" + Style.RESET_ALL)
-            traceback.print_exc()
-            raise
-        print(Fore.MAGENTA + f"Email category: {result.category.value}" + Style.RESET_ALL)
+            raise RuntimeError("No emails to categorize")
+        tracer.annotate(email_id=email_id)
+        current_email = self.queue.get(email_id)
+        print(current_email)
+        # Claim the thread so no other worker processes it at the same time
+        if not self.leases.acquire(current_email.threadId, state.get("lease_owner", "")):
+            print(Fore.RED + f"Thread {current_email.threadId} is being processed by another worker" + Style.RESET_ALL)
+            return {"current_email_id": email_id, "leased": True}
+        # Reuse the outputs of a previous, interrupted run of this email
+        progress = self.progress.get(current_email.id)
+        if progress.get("drafted"):
+            # Drafted by another worker since this one fetched the inbox
+            print(Fore.RED + f"Email {email_id} was already drafted" + Style.RESET_ALL)
+            return {"current_email_id": email_id, "leased": True}
+        # The email's time, token and LLM call budget starts with its processing
+        budget = new_budget()
+        if progress.get("category"):
+            category = progress["category"]
+        else:
+            try:
+                result, budget = self._invoke(state, "categorize_email", {"email": current_email.body}, budget)
+            except Exception as e:
+                if self._llm_unavailable(e):
+                    return {"current_email_id": email_id, "parked": True}
+                print(Fore.RED + f"Error invoking categorize_email agent: {e}" + Style.RESET_ALL)
+                traceback.print_exc()
+                raise
+            category = result.category.value
+            self.progress.save_category(current_email, category)
+        print(Fore.MAGENTA + f"Email category: {category}" + Style.RESET_ALL)
+
+        # Extract amounts, dates, rates... once, they are reused on every writer retry
+        email_fields = extract_fields(current_email)
+        # Unrelated emails are skipped and approved drafts created at every level
+        degradation = ""
+        if category != "unrelated" and not progress.get("approved_draft"):
+            # Emails waiting for the other runs, this run's own fetch is not a backlog
+            degradation = self.backpressure.level(self.queue.backlog(exclude=state["queue_key"]))
         
         return {
-            "email_category": result.category.value,
-            "current_email": current_email
+            "email_category": category,
+            "degradation": degradation,
+            "budget": budget,
+            "current_email_id": email_id,
+            "email_fields": email_fields,
+            "signatories_count": email_fields.signatories_count,
+            # Set when a previous run already approved a draft for this email
+            "generated_email": progress.get("approved_draft") or ""
         }
 
     def route_email_based_on_category(self, state: GraphState) -> str:
         """Routes the email based on its category."""
         print(Fore.YELLOW + "Routing email based on category...\n" + Style.RESET_ALL)
+        if state.get("parked"):
+            return "parked"
+        if state.get("leased"):
+            return "leased"
+        # Draft approved by an interrupted run: go straight to draft creation
+        if self.progress.get(state["current_email_id"]).get("approved_draft"):
+            return "approved"
         category = state["email_category"]
         # Skip unrelated emails; process all FinPower categories directly
         if category == "unrelated":
             return "unrelated"
+        if exhausted(state.get("budget")):
+            return "over_budget"
+        # Degraded under backpressure: label only, or reply with the category's template
+        if state.get("degradation") == "deferred":
+            return "deferred"
+        if state.get("degradation") == "template_reply":
+            return "template"
         return "not related"
 
     def construct_rag_queries(self, state: GraphState) -> GraphState:
         """Constructs RAG queries based on the email content."""
         print(Fore.YELLOW + "Designing RAG query...\n" + Style.RESET_ALL)
-        email_content = state["current_email"].body
-        query_result = self.agents.design_rag_queries.invoke({"email": email_content})
+        if self._over_budget(state):
+            return {"rag_queries": []}
+        email_content = self._current_email(state).body
+        query_result, budget = self._invoke(state, "design_rag_queries", {"email": email_content})
         
-        return {"rag_queries": query_result.queries}
+        return {"rag_queries": query_result.queries, "budget": budget}
 
     def retrieve_from_rag(self, state: GraphState) -> GraphState:
         """Retrieves information from internal knowledge based on RAG questions."""
         print(Fore.YELLOW + "Retrieving information from internal knowledge...\n" + Style.RESET_ALL)
+        documents = self.progress.get(state["current_email_id"]).get("retrieved_documents")
+        if documents:
+            return {"retrieved_documents": documents}
         final_answer = ""
+        budget = state.get("budget")
         for query in state["rag_queries"]:
-            rag_result = self.agents.generate_rag_answer.invoke(query)
+            if self._over_budget({**state, "budget": budget}):
+                break
+            rag_result, budget = self._invoke(state, "generate_rag_answer", query, budget)
             final_answer += query + "\n" + rag_result + "\n\n"
+        self.progress.save_retrieved_documents(self._current_email(state), final_answer)
         
-        return {"retrieved_documents": final_answer}
+        return {"retrieved_documents": final_answer, "budget": budget}
 
     def write_draft_email(self, state: GraphState) -> GraphState:
         """Writes a draft email based on the current email and retrieved information."""
         print(Fore.YELLOW + "Writing draft email...\n" + Style.RESET_ALL)
         
-        # Determine number of authorized signatories
-        body_text = state["current_email"].body.lower()
-        if re.search(r'\b(two|2)\s+signatories?', body_text):
-            state["signatories_count"] = 2
-        else:
-            state["signatories_count"] = 1
+        # Left for check_parked to route the email to the budget fallback
+        if self._over_budget(state):
+            return {}
+        current_email = self._current_email(state)
+        # Extend the thread lease on every attempt, retries can outlast it
+        if not self.leases.acquire(current_email.threadId, state.get("lease_owner", "")):
+            # Expired and claimed by another worker: leave the thread to that worker
+            print(Fore.RED + f"Thread {current_email.threadId} was taken over by another worker" + Style.RESET_ALL)
+            return {"leased": True}
+        # Fields are extracted at categorization, fall back for states built elsewhere
+        email_fields = state.get("email_fields") or extract_fields(current_email)
         
         # Format input to the writer agent
         inputs = (
             f'# **EMAIL CATEGORY:** {state["email_category"]}\n\n'
-            f'# **AUTHORIZED SIGNATORIES:** {state["signatories_count"]}\n\n'
-            f'# **EMAIL CONTENT:**\n{state["current_email"].body}\n\n'
-            f'# **INFORMATION:**\n{state["retrieved_documents"]}' # Empty for feedback or complaint
+            f'# **AUTHORIZED SIGNATORIES:** {email_fields.signatories_count}\n\n'
+            f'# **EXTRACTED FIELDS:**\n{format_fields(email_fields)}\n\n'
+            f'{self._email_context(current_email)}\n\n'
+            f'# **INFORMATION:**\n{state.get("retrieved_documents", "")}' # Empty for feedback or complaint
         )
         
         # Get messages history for current email
         writer_messages = state.get('writer_messages', [])
         
         # Write email
-        draft_result = self.agents.email_writer.invoke({
-            "email_information": inputs,
-            "history": writer_messages
-        })
+        try:
+            draft_result, budget = self._invoke(state, "email_writer", {
+                "email_information": inputs,
+                "history": writer_messages
+            })
+        except Exception as e:
+            if self._llm_unavailable(e):
+                return {"parked": True}
+            raise
         email = draft_result.email
         trials = state.get('trials', 0) + 1
 
-        # Append writer's draft to the message list
-        writer_messages.append(f"**Draft {trials}:**\n{email}")
-
         return {
             "generated_email": email, 
             "trials": trials,
-            "writer_messages": writer_messages
+            "budget": budget,
+            # Appended to the message list by the add_messages reducer
+            "writer_messages": [f"**Draft {trials}:**\n{email}"]
         }
 
     def verify_generated_email(self, state: GraphState) -> GraphState:
         """Verifies the generated email using the proofreader agent."""
         print(Fore.YELLOW + "Verifying generated email...\n" + Style.RESET_ALL)
-        review = self.agents.email_proofreader.invoke({
-            "initial_email": state["current_email"].body,
-            "generated_email": state["generated_email"],
-        })
+        # An unreviewed draft is never sent, must_rewrite takes the budget fallback
+        if self._over_budget(state):
+            return {"sendable": False}
+        current_email = self._current_email(state)
+        email_fields = state.get("email_fields") or extract_fields(current_email)
+        try:
+            review, budget = self._invoke(state, "email_proofreader", {
+                "initial_email": self._email_context(current_email),
+                "email_fields": format_fields(email_fields),
+                "generated_email": state["generated_email"],
+            })
+        except Exception as e:
+            if self._llm_unavailable(e):
+                return {"parked": True}
+            raise
 
-        writer_messages = state.get('writer_messages', [])
-        writer_messages.append(f"**Proofreader Feedback:**\n{review.feedback}")
+        if review.send:
+            self.progress.save_approved_draft(current_email, state["generated_email"])
 
         return {
             "sendable": review.send,
-            "writer_messages": writer_messages
+            "budget": budget,
+            "writer_messages": [f"**Proofreader Feedback:**\n{review.feedback}"]
         }
 
     def must_rewrite(self, state: GraphState) -> str:
-        """Determines if the email needs to be rewritten based on the review and trial count."""
+        """Determines if the email needs to be rewritten based on the review, trial count and budget."""
+        if state.get("parked"):
+            return "parked"
         email_sendable = state["sendable"]
         if email_sendable:
             print(Fore.GREEN + "Email is good, ready to be sent!!!" + Style.RESET_ALL)
-            state["emails"].pop()
-            state["writer_messages"] = []
             return "send"
         elif state["trials"] >= 3:
             print(Fore.RED + "Email is not good, we reached max trials must stop!!!" + Style.RESET_ALL)
-            state["emails"].pop()
-            state["writer_messages"] = []
             return "stop"
+        elif not can_afford_round(state.get("budget"), state["trials"]):
+            print(Fore.RED + "Email is not good, no budget left to rewrite it..." + Style.RESET_ALL)
+            return "over_budget"
         else:
             print(Fore.RED + "Email is not good, must rewrite it..." + Style.RESET_ALL)
             return "rewrite"
@@ -155,10 +344,13 @@ class Nodes:
     def create_draft_response(self, state: GraphState) -> GraphState:
         """Creates a draft response in Gmail."""
         print(Fore.YELLOW + "Creating draft email...\n" + Style.RESET_ALL)
-        initial_email = state.get("current_email")
-        # Ensure initial_email is an Email model instance
-        if isinstance(initial_email, dict):
-            initial_email = Email(**initial_email)
+        initial_email = self._current_email(state)
+        write_started_at = time.time()
+        # The lease may have expired and been taken over since the draft was written
+        if not self.leases.acquire(initial_email.threadId, state.get("lease_owner", "")):
+            print(Fore.RED + f"Thread {initial_email.threadId} was taken over by another worker, "
+                  f"no draft created" + Style.RESET_ALL)
+            return self._done_with_email(state)
         try:
             draft = self.gmail_tools.create_draft_reply(initial_email, state.get("generated_email"))
             if draft is None:
@@ -167,17 +359,108 @@ class Nodes:
             print(Fore.RED + f"Error creating draft response: {e}" + Style.RESET_ALL)
             traceback.print_exc()
             raise
-        return {"retrieved_documents": "", "trials": 0}
+        drafted_at = time.time()
+        self.progress.mark_drafted(initial_email)
+        # A reprocessed email drafted by the full workflow clears its previous degradation
+        self._record_degradation(initial_email, state.get("degradation", ""))
+        self._record_latency(state, initial_email, write_started_at, drafted_at)
+        return self._done_with_email(state)
+
+    def _record_latency(self, state, email, write_started_at, drafted_at):
+        """Records the inbox-to-draft latency of an email per priority class, and per stage against the SLA."""
+        received = received_at(email)
+        if received:
+            draft_latency.record(priority_class(email), drafted_at - received)
+        budget = state.get("budget")
+        started_at = budget.started_at if budget is not None else write_started_at
+        sla_tracker.record(state.get("email_category") or "unknown",
+                           stage_latencies(email, started_at, write_started_at, drafted_at))
 
     def send_email_response(self, state: GraphState) -> GraphState:
         """Sends the email response directly using Gmail."""
         print(Fore.YELLOW + "Sending email...\n" + Style.RESET_ALL)
-        self.gmail_tools.send_reply(state["current_email"], state["generated_email"])
+        self.gmail_tools.send_reply(self._current_email(state), state["generated_email"])
         
-        return {"retrieved_documents": "", "trials": 0}
+        return self._done_with_email(state)
     
+    def _llm_unavailable(self, error):
+        """Returns True, after logging it, if the error means the LLM provider is unavailable."""
+        if not is_llm_unavailable(error):
+            return False
+        print(Fore.RED + f"LLM provider unavailable, parking email: {error}" + Style.RESET_ALL)
+        return True
+
+    def check_parked(self, state: GraphState) -> str:
+        """Checks if the current email was parked because the LLM provider is unavailable, lost its lease, or skips review."""
+        if state.get("parked"):
+            return "parked"
+        if state.get("leased"):
+            return "leased"
+        if exhausted(state.get("budget")):
+            return "over_budget"
+        if state.get("degradation") == "skip_proofreader":
+            return "unreviewed"
+        return "continue"
+
+    def park_email(self, state: GraphState) -> GraphState:
+        """Parks the current email: it is left undrafted so the next run retries it."""
+        email_id = state["current_email_id"]
+        print(Fore.RED + f"Parked email {email_id} for retry" + Style.RESET_ALL)
+        return {
+            **self._done_with_email(state, retried=True),
+            "parked": False,
+            "parked_emails": [email_id]
+        }
+
+    def write_template_reply(self, state: GraphState) -> GraphState:
+        """Replies with the category's response template instead of calling the writer."""
+        print(Fore.YELLOW + "Writing template reply...\n" + Style.RESET_ALL)
+        current_email = self._current_email(state)
+        email_fields = state.get("email_fields") or extract_fields(current_email)
+        return {"generated_email": template_reply(state["email_category"], email_fields), "sendable": True}
+
+    def defer_email(self, state: GraphState) -> GraphState:
+        """Labels the categorized email and leaves it undrafted, a later run drafts it."""
+        current_email = self._current_email(state)
+        print(Fore.RED + f"Deferred email {current_email.id} under backpressure" + Style.RESET_ALL)
+        self._record_degradation(current_email, "deferred")
+        return self._done_with_email(state)
+
+    def budget_fallback(self, state: GraphState) -> GraphState:
+        """Falls back to the category's template reply once the email spent its budget, or drafts nothing."""
+        current_email = self._current_email(state)
+        budget = state["budget"]
+        reason = exhausted(budget) or "forecast"
+        print(Fore.RED + f"Budget fallback for email {current_email.id} ({reason})" + Style.RESET_ALL)
+        self.progress.save_spend(current_email, spend(budget), exceeded=reason)
+        email_fields = state.get("email_fields") or extract_fields(current_email)
+        draft = template_reply(state["email_category"], email_fields)
+        if draft is None:
+            self._record_degradation(current_email, "over_budget")
+        return {"degradation": "over_budget", "generated_email": draft or "", "sendable": draft is not None}
+
+    def check_fallback_draft(self, state: GraphState) -> str:
+        """Checks if the budget fallback produced a draft."""
+        return "send" if state.get("sendable") else "skip"
+
+    def _record_degradation(self, email, degradation):
+        """Records the degradation of an email in the progress store and labels it in Gmail."""
+        if not degradation and not self.progress.get(email.id).get("degradation"):
+            return
+        self.progress.save_degradation(email, degradation)
+        if degradation:
+            try:
+                self.gmail_tools.label_email(email, f"{DEGRADED_LABEL}/{degradation}")
+            except Exception as e:
+                print(Fore.RED + f"Error labeling degraded email {email.id}: {e}" + Style.RESET_ALL)
+
+    def _email_context(self, email):
+        """Returns the email text given to the writer and proofreader, per EMAIL_CONTEXT_MODE."""
+        if EMAIL_CONTEXT_MODE == "fields":
+            return f'# **EMAIL SUBJECT:** {email.subject}'
+        return f'# **EMAIL CONTENT:**\n{email.body}'
+
     def skip_unrelated_email(self, state):
         """Skip unrelated email and remove from emails list."""
         print("Skipping unrelated email...\n")
-        state["emails"].pop()
-        return state
\ No newline at end of file
+        return self._done_with_email(state)
\ No newline at end of file
@@ -0,0 +1,109 @@
+import os
+import re
+from .tokens import truncate_to_tokens
+
+# Token cap applied to the normalized body, 0 disables it
+EMAIL_BODY_MAX_TOKENS = int(os.getenv("EMAIL_BODY_MAX_TOKENS", "1500"))
+
+# Lines that introduce quoted history: everything from there on is dropped
+QUOTE_HEADER_RES = [
+    re.compile(r"^\s*On\b.{0,300}\bwrote:\s*$", re.IGNORECASE),
+    re.compile(r"^\s*-{2,}\s*(?:Original|Forwarded)\s+Message\s*-{2,}", re.IGNORECASE),
+    re.compile(r"^\s*_{10,}\s*$"),
+    re.compile(r"^\s*Begin forwarded message:", re.IGNORECASE),
+]
+# Outlook style header block: "From: ..." followed, within the block, by "Sent:"/"Date:"
+# and "Subject:" lines. "From:"/"To:" alone is how customers write transfer instructions
+OUTLOOK_FROM_RE = re.compile(r"^\s*\*?From:\*?\s", re.IGNORECASE)
+OUTLOOK_SENT_RE = re.compile(r"^\s*\*?(?:Sent|Date):\*?\s", re.IGNORECASE)
+OUTLOOK_SUBJECT_RE = re.compile(r"^\s*\*?Subject:\*?\s", re.IGNORECASE)
+# Lines after "From:" searched for the rest of the block (Sent, To, Cc, Subject)
+OUTLOOK_HEADER_LINES = 5
+QUOTED_LINE_RE = re.compile(r"^\s*>")
+# Signature delimiters: everything from there on is dropped
+SIGNATURE_RES = [
+    re.compile(r"^--\s*$"),
+    re.compile(r"^\s*Sent from my \w+", re.IGNORECASE),
+    re.compile(r"^\s*Get Outlook for \w+", re.IGNORECASE),
+]
+# Paragraphs of legal boilerplate, dropped wherever they appear. Anchored to the
+# phrasing of disclaimers: a customer calling an instruction confidential is kept
+DISCLAIMER_RE = re.compile(
+    r"\bnot the intended recipient"
+    r"|\bif you (?:have )?received this (?:e-?mail|message|communication) in error"
+    r"|\bintended (?:solely|only|exclusively) for the (?:use of the )?(?:addressee|individual|named recipient|person or entity)"
+    r"|\bthis (?:e-?mail|message|communication)(?: and any (?:files|attachments)[^.]*)? (?:is|are|may be) (?:strictly )?(?:confidential|privileged)"
+    r"|\bplease consider the environment before printing",
+    re.IGNORECASE,
+)
+PARAGRAPH_SPLIT_RE = re.compile(r"\n\s*\n")
+
+
+def _is_quote_header(lines, index):
+    line = lines[index]
+    if any(regex.match(line) for regex in QUOTE_HEADER_RES):
+        return True
+    # Gmail wraps long "On <date>, <name> wrote:" headers over two lines
+    if index + 1 < len(lines) and re.match(r"^\s*On\b", line, re.IGNORECASE):
+        if QUOTE_HEADER_RES[0].match(f"{line} {lines[index + 1]}"):
+            return True
+    if OUTLOOK_FROM_RE.match(line):
+        block = []
+        for next_line in lines[index + 1:index + 1 + OUTLOOK_HEADER_LINES]:
+            if not next_line.strip():
+                break
+            block.append(next_line)
+        return (any(OUTLOOK_SENT_RE.match(next_line) for next_line in block)
+                and any(OUTLOOK_SUBJECT_RE.match(next_line) for next_line in block))
+    return False
+
+
+def strip_quoted_history(text):
+    """Drop quoted earlier messages and everything after a reply/forward header."""
+    lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    kept = []
+    for index, line in enumerate(lines):
+        if _is_quote_header(lines, index):
+            break
+        if QUOTED_LINE_RE.match(line):
+            continue
+        kept.append(line)
+    return "\n".join(kept)
+
+
+def strip_signature(text):
+    """Drop the signature block and mobile client footers."""
+    lines = text.split("\n")
+    for index, line in enumerate(lines):
+        if any(regex.match(line) for regex in SIGNATURE_RES):
+            return "\n".join(lines[:index])
+    return text
+
+
+def strip_disclaimers(text):
+    """Drop paragraphs of legal boilerplate."""
+    paragraphs = PARAGRAPH_SPLIT_RE.split(text)
+    return "\n\n".join(p for p in paragraphs if not DISCLAIMER_RE.search(p))
+
+
+def normalize_body(text, max_tokens=None):
+    """
+    Reduces an email body to the text written by the sender.
+
+    Quoted history, signatures and legal disclaimers are stripped, then the
+    result is capped to max_tokens tokens. If stripping leaves nothing (e.g.
+    a bare forward), the original text is used instead.
+
+    @param text: Raw email body, with its original line breaks
+    @param max_tokens: Token cap, defaults to EMAIL_BODY_MAX_TOKENS (0 disables it)
+    @return: Normalized body
+    """
+    if not text:
+        return ""
+    max_tokens = EMAIL_BODY_MAX_TOKENS if max_tokens is None else max_tokens
+    body = strip_disclaimers(strip_signature(strip_quoted_history(text))).strip()
+    if not body:
+        body = text.strip()
+    if max_tokens:
+        body = truncate_to_tokens(body, max_tokens)
+    return body
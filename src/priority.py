@@ -0,0 +1,110 @@
+import os
+import re
+import time
+from datetime import date, datetime
+from .state import Email
+from .extraction import extract_fields
+
+# Order queued emails by urgency instead of last-in first-out
+PRIORITY_SCHEDULING = os.getenv("PRIORITY_SCHEDULING", "true").lower() == "true"
+# Priority points an email gains per hour of waiting, so low priority emails are never starved
+PRIORITY_AGING_PER_HOUR = float(os.getenv("PRIORITY_AGING_PER_HOUR", "1"))
+# Dates mentioned in an email raise its priority from this many days ahead
+PRIORITY_DEADLINE_DAYS = float(os.getenv("PRIORITY_DEADLINE_DAYS", "14"))
+# Emails with a date at most this many days ahead are in the "urgent" class
+PRIORITY_URGENT_DAYS = float(os.getenv("PRIORITY_URGENT_DAYS", "3"))
+
+# Keyword guess of the email category, checked in order, before any LLM call
+PRE_CATEGORY_PATTERNS = [
+    ("maturity_repayment", re.compile(r"\b(repay|repayment|withdraw|pay\s?out|close)\w*", re.IGNORECASE)),
+    ("maturity_reinvestment", re.compile(r"\b(matur|reinvest|roll\s?over|renew)\w*", re.IGNORECASE)),
+    ("refix_interest_rate", re.compile(r"\b(refix|re-fix|fix(ed)?\s+(the\s+)?rate|rate\s+fix)\w*", re.IGNORECASE)),
+    ("floating_interest_rate", re.compile(r"\bfloat\w*", re.IGNORECASE)),
+    ("change_contact_details", re.compile(r"\b(address|phone|contact details|e-?mail address)\b", re.IGNORECASE)),
+]
+
+# Priority of each pre-category, in hours of waiting it is worth
+CATEGORY_PRIORITY = {
+    "maturity_repayment": 24.0,
+    "maturity_reinvestment": 24.0,
+    "refix_interest_rate": 24.0,
+    "floating_interest_rate": 12.0,
+    "change_contact_details": 4.0,
+    "unrelated": 0.0,
+}
+# Priority of a date due today, decreasing linearly to 0 at PRIORITY_DEADLINE_DAYS
+DEADLINE_PRIORITY = 48.0
+
+
+def pre_categorize(email: Email) -> str:
+    """Guesses the category of an email from keywords of its subject and body."""
+    text = f"{email.subject}\n{email.body}"
+    for category, pattern in PRE_CATEGORY_PATTERNS:
+        if pattern.search(text):
+            return category
+    return "unrelated"
+
+
+def received_at(email: Email) -> float:
+    """Epoch seconds at which Gmail received the email, None if unknown."""
+    return email.internalDate / 1000 if email.internalDate else None
+
+
+def days_to_deadline(email: Email, today: date = None):
+    """Days until the nearest upcoming date mentioned in the email, None if it mentions none."""
+    today = today or datetime.now().date()
+    received = received_at(email)
+    # Dates without a year are resolved from the day the email was received
+    reference = datetime.fromtimestamp(received).date() if received else today
+    upcoming = [(d - today).days for d in extract_fields(email, reference).dates if d >= today]
+    return min(upcoming) if upcoming else None
+
+
+def base_priority(email: Email, today: date = None) -> float:
+    """Priority of an email from its pre-category and deadline, before aging."""
+    priority = CATEGORY_PRIORITY[pre_categorize(email)]
+    days = days_to_deadline(email, today)
+    if days is not None and days < PRIORITY_DEADLINE_DAYS:
+        priority += DEADLINE_PRIORITY * (1 - days / PRIORITY_DEADLINE_DAYS)
+    return priority
+
+
+def priority_score(email: Email, now: float = None) -> float:
+    """
+    Current priority of an email: its base priority plus the aging of its wait.
+
+    @param email: Email to score
+    @param now: Epoch seconds to age the email to, defaults to now
+    @return: Score, higher is served first
+    """
+    now = now or time.time()
+    received = received_at(email) or now
+    return base_priority(email) + PRIORITY_AGING_PER_HOUR * max(0.0, now - received) / 3600
+
+
+def priority_key(email: Email, now: float = None) -> float:
+    """
+    Static sort key of an email in a queue, the higher the sooner.
+
+    Aging grows every score at the same rate, so the order of two emails
+    never changes while they wait: the key is the score minus the aging
+    of a wait started at the epoch, computed once when the email is queued.
+    Emails without a receipt time are aged from the moment they are queued.
+    """
+    if not PRIORITY_SCHEDULING:
+        return 0.0
+    received = received_at(email) or now or time.time()
+    return base_priority(email) - PRIORITY_AGING_PER_HOUR * received / 3600
+
+
+def priority_class(email: Email, today: date = None) -> str:
+    """
+    Latency class of an email.
+
+    @return: "urgent" if it mentions a date in the next PRIORITY_URGENT_DAYS days,
+             "normal" for the other FinPower instructions, "low" otherwise
+    """
+    days = days_to_deadline(email, today)
+    if days is not None and days <= PRIORITY_URGENT_DAYS:
+        return "urgent"
+    return "low" if pre_categorize(email) == "unrelated" else "normal"
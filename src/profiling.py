@@ -0,0 +1,209 @@
+import os
+import sys
+import json
+import time
+import threading
+import tracemalloc
+from collections import Counter, defaultdict
+from colorama import Fore, Style
+
+# Profiles of the runs started with --profile or {"profile": true} are written here
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+# Seconds between two stack samples of the profiled run
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+# Functions listed per node in the summary
+PROFILE_TOP_FUNCTIONS = int(os.getenv("PROFILE_TOP_FUNCTIONS", "10"))
+
+# Kind of work of a sample, from its innermost frame matching one of the path fragments
+CATEGORIES = [
+    ("html_parsing", ("/bs4/", "/html/parser.py", "_extract_main_content_from_html", "_get_email_body")),
+    ("pydantic", ("/pydantic/", "/pydantic_core/")),
+    ("serialization", ("src/serialization.py", "/checkpoint/serde/", "/ormsgpack", "/msgspec/", "/json/")),
+    ("sqlite", ("/sqlite3/", "/checkpoint/sqlite/", "src/storage.py", "src/progress.py", "src/email_queue.py",
+                "src/leases.py")),
+    ("llm", ("/openai/", "/httpx/", "/httpcore/", "/langchain_openai/", "fake_llm.py")),
+    ("gmail", ("/googleapiclient/", "/httplib2/", "GmailTools.py", "fake_gmail.py")),
+    ("tokens", ("/tiktoken/", "src/tokens.py")),
+]
+# Root of the samples taken between nodes: channel updates, checkpointing
+GRAPH_ROOT = "(langgraph)"
+# Root of the samples taken while the caller handles an output of the run
+CALLER_ROOT = "(caller)"
+# Held by the profiled run: tracemalloc and the switch interval are process-wide
+_profiling = threading.Lock()
+
+
+def _frame_name(code):
+    path = code.co_filename
+    for marker in ("site-packages/", "/src/", "/benchmarks/"):
+        if marker in path:
+            path = path.rsplit(marker, 1)[-1]
+            break
+    return f"{code.co_name} ({os.path.basename(path) if path.startswith('/') else path})".replace(";", ":")
+
+
+def _category(codes):
+    for code in reversed(codes):
+        location = f"{code.co_filename}:{code.co_name}"
+        for category, fragments in CATEGORIES:
+            if any(fragment in location for fragment in fragments):
+                return category
+    return "other"
+
+
+class RunProfiler:
+    """
+    Samples the stack of one workflow run and tracks its allocations per node.
+
+    The thread consuming the run is sampled every PROFILE_INTERVAL seconds
+    (wall clock: time waiting on the LLM or Gmail is sampled too). Samples
+    are rooted at the graph node they were taken in, found from its Nodes
+    method in the stack, and categorized by the innermost frame of a known
+    kind of work (HTML parsing, pydantic, serialization, SQLite, LLM, Gmail).
+    tracemalloc runs for the length of the run only, the peak and retained
+    allocations of each node step are read between the steps of the stream.
+    It traces the whole process: one run is profiled at a time, and runs
+    started meanwhile outside the JobManager (e.g. /stream_deltas) are counted.
+    """
+
+    def __init__(self, node_names, run_id, interval=PROFILE_INTERVAL, directory=PROFILE_DIR):
+        """
+        @param node_names: Graph node name of each Nodes method, Workflow.node_names
+        @param run_id: Id of the run, names the profile files
+        @param interval: Seconds between two samples
+        @param directory: Directory of the profile files
+        """
+        self.node_names = node_names
+        self.run_id = run_id
+        self.interval = interval
+        self.directory = directory
+        self.stacks = Counter()
+        self.functions = defaultdict(Counter)
+        self.categories = defaultdict(Counter)
+        self.steps = defaultdict(lambda: {"calls": 0, "seconds": 0.0, "peak_kb": 0.0, "retained_kb": 0.0})
+        self.summary = None
+        self._thread_id = None
+        self._stop = threading.Event()
+
+    def _sample(self):
+        frames = sys._current_frames()
+        frame = frames.get(self._thread_id)
+        codes = []
+        while frame is not None:
+            codes.append(frame.f_code)
+            frame = frame.f_back
+        codes.reverse()
+        # Outermost Nodes method of the stack, if the run is inside a node
+        root, start = GRAPH_ROOT, None
+        for index, code in enumerate(codes):
+            if code.co_filename.endswith("nodes.py") and code.co_name in self.node_names:
+                root, start = self.node_names[code.co_name], index
+                break
+        if start is None:
+            # Between nodes: keep the frames below Workflow.stream, or the caller's while it handles an output
+            start = next((index + 1 for index, code in enumerate(codes)
+                          if code.co_filename.endswith("graph.py") and code.co_name == "stream"), None)
+            if start is None:
+                root, start = CALLER_ROOT, 0
+        codes = codes[start:]
+        self.stacks[";".join([root] + [_frame_name(code) for code in codes])] += 1
+        if codes:
+            self.functions[root][_frame_name(codes[-1])] += 1
+        self.categories[root][_category(codes)] += 1
+
+    def _sampler(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self._sample()
+            except Exception:
+                # A stack changing while it is walked, the next sample is taken anyway
+                pass
+
+    def profile(self, run):
+        """
+        Profiles a workflow run while it is consumed.
+
+        @param run: Stream of a Workflow run, the items are passed through
+        @return: Generator of the run's items; the profile is written once it is exhausted or closed
+        @raise RuntimeError: Another run of the process is being profiled
+        """
+        if not _profiling.acquire(blocking=False):
+            raise RuntimeError("Another run is being profiled, profile one run at a time")
+        self._thread_id = threading.get_ident()
+        sampler = threading.Thread(target=self._sampler, name=f"profiler-{self.run_id}", daemon=True)
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        # The sampler waits for the GIL: a short switch interval keeps samples from piling up where the run
+        # releases it (I/O, system calls) instead of where it spends its time
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(switch_interval, self.interval / 10))
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            while True:
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                step_started = time.perf_counter()
+                try:
+                    output = next(run)
+                except StopIteration:
+                    break
+                current, peak = tracemalloc.get_traced_memory()
+                for node in output if isinstance(output, dict) else ():
+                    step = self.steps[node]
+                    step["calls"] += 1
+                    step["seconds"] += time.perf_counter() - step_started
+                    step["peak_kb"] = max(step["peak_kb"], (peak - before) / 1024)
+                    step["retained_kb"] += (current - before) / 1024
+                yield output
+        finally:
+            self._stop.set()
+            sampler.join()
+            sys.setswitchinterval(switch_interval)
+            if not tracing:
+                tracemalloc.stop()
+            _profiling.release()
+            self._write(time.perf_counter() - started)
+
+    def _write(self, seconds):
+        os.makedirs(self.directory, exist_ok=True)
+        folded_path = os.path.join(self.directory, f"{self.run_id}.folded")
+        with open(folded_path, "w") as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{stack} {count}\n")
+        samples = sum(self.stacks.values())
+        nodes = {}
+        for node in sorted(set(self.steps) | set(self.categories)):
+            node_samples = sum(self.categories[node].values())
+            nodes[node] = {
+                **{key: round(value, 3) for key, value in self.steps.get(node, {}).items()},
+                "samples": node_samples,
+                "share": round(node_samples / samples, 4) if samples else 0.0,
+                "categories": {category: round(count / node_samples, 4)
+                               for category, count in self.categories[node].most_common()},
+                "top_functions": self.functions[node].most_common(PROFILE_TOP_FUNCTIONS),
+            }
+        self.summary = {
+            "run_id": self.run_id,
+            "seconds": round(seconds, 3),
+            "interval": self.interval,
+            "samples": samples,
+            "folded": folded_path,
+            "categories": dict(sum(self.categories.values(), Counter()).most_common()),
+            "nodes": nodes,
+        }
+        summary_path = os.path.join(self.directory, f"{self.run_id}.json")
+        with open(summary_path, "w") as f:
+            json.dump(self.summary, f, indent=2)
+        print(Fore.CYAN + f"Profile of run {self.run_id}: {folded_path} (flame graph), {summary_path}" + Style.RESET_ALL)
+
+
+def print_summary(summary):
+    """Prints the per-node summary of a profile, slowest nodes first."""
+    print(f"{'node':<24} {'calls':>6} {'seconds':>8} {'samples':>8} {'peak KB':>9} {'kept KB':>9}  top categories")
+    nodes = sorted(summary["nodes"].items(), key=lambda item: item[1]["samples"], reverse=True)
+    for node, stats in nodes:
+        categories = ", ".join(f"{category} {share:.0%}" for category, share in list(stats["categories"].items())[:3])
+        print(f"{node:<24} {stats.get('calls', 0):>6} {stats.get('seconds', 0.0):>8.2f} {stats['samples']:>8} "
+              f"{stats.get('peak_kb', 0.0):>9.0f} {stats.get('retained_kb', 0.0):>9.0f}  {categories}")
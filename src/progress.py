@@ -0,0 +1,187 @@
+import time
+import uuid
+import threading
+from .storage import connect, reconnect, RUNTIME_DB
+
+
+class ProgressStore:
+    """
+    Persists the expensive outputs of each email (category, retrieved documents,
+    approved draft) so they are never recomputed after a crash or a restart.
+    Records are keyed by Gmail message id and carry the thread id.
+    """
+
+    def __init__(self, path=RUNTIME_DB):
+        self.conn = connect(path)
+        self._lock = threading.Lock()
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS email_progress (
+                email_id TEXT PRIMARY KEY,
+                thread_id TEXT NOT NULL,
+                category TEXT,
+                retrieved_documents TEXT,
+                approved_draft TEXT,
+                drafted INTEGER NOT NULL DEFAULT 0,
+                degradation TEXT,
+                spent_seconds REAL,
+                spent_tokens INTEGER,
+                spent_llm_calls INTEGER,
+                budget_exceeded TEXT,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS runs (
+                thread_id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                started_at REAL NOT NULL,
+                finished_at REAL
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS mailbox_sync (
+                mailbox TEXT PRIMARY KEY,
+                history_id INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+
+    def reopen(self):
+        """Replaces the connection inherited from a parent process, in a forked worker."""
+        self.conn = reconnect(self.conn)
+        self._lock = threading.Lock()
+
+    def _save(self, email, **fields):
+        columns = ", ".join(fields)
+        updates = ", ".join(f"{column} = excluded.{column}" for column in fields)
+        with self._lock:
+            self.conn.execute(
+                f"INSERT INTO email_progress (email_id, thread_id, {columns}, updated_at) "
+                f"VALUES (?, ?, {', '.join('?' for _ in fields)}, ?) "
+                f"ON CONFLICT(email_id) DO UPDATE SET {updates}, updated_at = excluded.updated_at",
+                (email.id, email.threadId, *fields.values(), time.time()),
+            )
+
+    def get(self, email_id):
+        """Returns the stored progress of an email as a dict, or an empty dict."""
+        with self._lock:
+            cursor = self.conn.execute("SELECT * FROM email_progress WHERE email_id = ?", (email_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return {}
+            return dict(zip([column[0] for column in cursor.description], row))
+
+    def save_category(self, email, category):
+        self._save(email, category=category)
+
+    def save_retrieved_documents(self, email, documents):
+        self._save(email, retrieved_documents=documents)
+
+    def save_approved_draft(self, email, draft):
+        self._save(email, approved_draft=draft)
+
+    def mark_drafted(self, email):
+        self._save(email, drafted=1)
+
+    def save_degradation(self, email, degradation):
+        """Records the degradation level applied to an email, "" (full workflow) clears it."""
+        self._save(email, degradation=degradation or None)
+
+    def degraded(self, degradation=None, drafted=None):
+        """
+        Returns the progress records of the emails handled in a degraded mode.
+
+        @param degradation: Only this level (e.g. "deferred"), default all levels
+        @param drafted: Only drafted (True) or undrafted (False) emails, default both
+        @return: List of dicts (email_id, thread_id, category, degradation, drafted, updated_at)
+        """
+        query = ("SELECT email_id, thread_id, category, degradation, drafted, updated_at "
+                 "FROM email_progress WHERE degradation IS NOT NULL")
+        params = []
+        if degradation:
+            query += " AND degradation = ?"
+            params.append(degradation)
+        if drafted is not None:
+            query += " AND drafted = ?"
+            params.append(int(drafted))
+        with self._lock:
+            cursor = self.conn.execute(query + " ORDER BY updated_at", params)
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def save_spend(self, email, spend, exceeded=None):
+        """
+        Records what the latest processing of an email consumed.
+
+        @param email: Email processed
+        @param spend: Dict with the seconds, tokens and llm_calls of the latest run
+        @param exceeded: Exhausted part of the budget ("time", "tokens", "llm_calls", "forecast"), if any.
+                         It is kept until another run exhausts the budget.
+        """
+        fields = {"spent_seconds": spend["seconds"], "spent_tokens": spend["tokens"], "spent_llm_calls": spend["llm_calls"]}
+        if exceeded:
+            fields["budget_exceeded"] = exceeded
+        self._save(email, **fields)
+
+    def spend(self, limit=100):
+        """Returns the spend of the latest processed emails, newest first."""
+        with self._lock:
+            cursor = self.conn.execute(
+                "SELECT email_id, thread_id, category, degradation, drafted, spent_seconds, spent_tokens, "
+                "spent_llm_calls, budget_exceeded, updated_at FROM email_progress "
+                "WHERE spent_seconds IS NOT NULL ORDER BY updated_at DESC LIMIT ?",
+                (limit,),
+            )
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def drafted_ids(self, email_ids):
+        """Returns the subset of the given email ids whose draft was already created."""
+        email_ids = list(email_ids)
+        if not email_ids:
+            return set()
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT email_id FROM email_progress WHERE drafted = 1 AND email_id IN ({', '.join('?' for _ in email_ids)})",
+                email_ids,
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def unfinished_run(self, name):
+        """Returns the checkpoint thread of the named run if it did not finish, else None."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT thread_id FROM runs WHERE name = ? AND finished_at IS NULL ORDER BY started_at DESC LIMIT 1",
+                (name,),
+            ).fetchone()
+        return row[0] if row else None
+
+    def start_run(self, name, thread_id=None):
+        """Registers a new run and returns its checkpoint thread id."""
+        thread_id = thread_id or f"{name}-{uuid.uuid4().hex}"
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO runs (thread_id, name, started_at) VALUES (?, ?, ?)",
+                (thread_id, name, time.time()),
+            )
+        return thread_id
+
+    def finish_run(self, thread_id):
+        with self._lock:
+            self.conn.execute("UPDATE runs SET finished_at = ? WHERE thread_id = ?", (time.time(), thread_id))
+
+    def history_cursor(self, mailbox):
+        """Returns the Gmail historyId the mailbox was last synced up to, or None."""
+        with self._lock:
+            row = self.conn.execute("SELECT history_id FROM mailbox_sync WHERE mailbox = ?", (mailbox,)).fetchone()
+        return row[0] if row else None
+
+    def save_history_cursor(self, mailbox, history_id):
+        """Advances the mailbox sync cursor, it never moves backwards."""
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO mailbox_sync (mailbox, history_id, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(mailbox) DO UPDATE SET history_id = MAX(history_id, excluded.history_id), "
+                "updated_at = excluded.updated_at",
+                (mailbox, int(history_id), time.time()),
+            )
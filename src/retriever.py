@@ -0,0 +1,192 @@
+import os
+import json
+import uuid
+import threading
+from functools import lru_cache
+import numpy as np
+from colorama import Fore, Style
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+# Vector store of the RAG retriever: "chroma" (db/chroma.sqlite3) or "numpy", an in-process
+# matrix of the same chunks searched exactly with one matrix-vector product
+RETRIEVER_BACKEND = os.getenv("RETRIEVER_BACKEND", "chroma").lower()
+# Directory of the numpy index: embeddings.npy (float32, one normalized row per chunk) and chunks.json
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", "db/vectors")
+# Memory-map embeddings.npy read-only: the page cache holds one copy shared by every worker process
+VECTOR_INDEX_MMAP = os.getenv("VECTOR_INDEX_MMAP", "true").lower() == "true"
+# Persisted Chroma store, exported to the numpy index when the index is missing
+CHROMA_DIR = "db"
+
+
+def _normalize(matrix):
+    """Scales the rows to unit length, so dot products are cosine similarities."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return np.ascontiguousarray(matrix / np.where(norms == 0, 1, norms), dtype=np.float32)
+
+
+@lru_cache(maxsize=4)
+def load_index(directory, mmap=VECTOR_INDEX_MMAP):
+    """
+    Loads a saved numpy index once per process, kept across forks (e.g. loaded by the gunicorn master).
+
+    @param directory: Directory written by NumpyVectorStore.save
+    @param mmap: Memory-map the embeddings read-only instead of reading them in memory
+    @return: Tuple (embeddings matrix, chunk ids, texts, metadatas)
+    """
+    matrix = np.load(os.path.join(directory, "embeddings.npy"), mmap_mode="r" if mmap else None)
+    with open(os.path.join(directory, "chunks.json")) as f:
+        chunks = json.load(f)
+    return matrix, chunks["ids"], chunks["texts"], chunks["metadatas"]
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Vector store holding every chunk embedding in one contiguous float32 matrix.
+
+    Rows are normalized when added, a search is one matrix-vector product
+    followed by a partial sort of the scores: an exact top-k, scored by
+    cosine similarity (higher is closer, unlike Chroma's distances). Adding
+    chunks builds a new matrix, searches in progress keep the previous one.
+    """
+
+    def __init__(self, embedding, matrix=None, ids=None, texts=None, metadatas=None):
+        self.embedding = embedding
+        if matrix is None:
+            matrix = np.empty((0, 0), dtype=np.float32)
+        # Swapped as a whole, a search reads one consistent snapshot without locking
+        self._index = (matrix, list(ids or []), list(texts or []), list(metadatas or []))
+        self._lock = threading.Lock()
+
+    @property
+    def embeddings(self):
+        return self.embedding
+
+    def __len__(self):
+        return len(self._index[1])
+
+    def add_embeddings(self, texts, embeddings, metadatas=None, ids=None):
+        """Adds chunks whose embeddings are already computed, returns their ids."""
+        texts = list(texts)
+        ids = list(ids) if ids else [uuid.uuid4().hex for _ in texts]
+        metadatas = list(metadatas) if metadatas else [{} for _ in texts]
+        rows = _normalize(embeddings)
+        with self._lock:
+            matrix, old_ids, old_texts, old_metadatas = self._index
+            matrix = np.concatenate([matrix, rows]) if len(old_ids) else rows
+            self._index = (matrix, old_ids + ids, old_texts + texts, old_metadatas + metadatas)
+        return ids
+
+    def delete(self, ids=None, **kwargs):
+        """Removes chunks by id, returns True if any was removed."""
+        removed = set(ids or [])
+        with self._lock:
+            matrix, old_ids, texts, metadatas = self._index
+            keep = [row for row, chunk_id in enumerate(old_ids) if chunk_id not in removed]
+            if len(keep) == len(old_ids):
+                return False
+            self._index = (np.ascontiguousarray(matrix[keep]), [old_ids[row] for row in keep],
+                           [texts[row] for row in keep], [metadatas[row] for row in keep])
+        return True
+
+    def add_texts(self, texts, metadatas=None, *, ids=None, **kwargs):
+        texts = list(texts)
+        return self.add_embeddings(texts, self.embedding.embed_documents(texts), metadatas, ids)
+
+    def search_by_vector(self, vector, k=4):
+        """
+        Exact top-k of the chunks closest to an embedding.
+
+        @param vector: Query embedding, normalized here
+        @param k: Number of chunks to return
+        @return: List of (row, cosine similarity), best first
+        """
+        matrix, ids = self._index[0], self._index[1]
+        if not ids or k <= 0:
+            return []
+        scores = matrix @ _normalize(vector)
+        k = min(k, len(scores))
+        # Partial sort: only the k best scores are ordered
+        top = np.argpartition(scores, -k)[-k:] if k < len(scores) else np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        return [(int(row), float(scores[row])) for row in top]
+
+    def _documents(self, rows):
+        _, ids, texts, metadatas = self._index
+        return [(Document(id=ids[row], page_content=texts[row], metadata=metadatas[row] or {}), score)
+                for row, score in rows]
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, **kwargs):
+        return self._documents(self.search_by_vector(embedding, k))
+
+    def similarity_search_by_vector(self, embedding, k=4, **kwargs):
+        return [document for document, _ in self.similarity_search_with_score_by_vector(embedding, k)]
+
+    def similarity_search_with_score(self, query, k=4, **kwargs):
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k)
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return [document for document, _ in self.similarity_search_with_score(query, k)]
+
+    def _select_relevance_score_fn(self):
+        # Scores already are cosine similarities, kept within [0, 1] against rounding and opposite vectors
+        return lambda score: min(1.0, max(0.0, score))
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, *, ids=None, **kwargs):
+        store = cls(embedding)
+        store.add_texts(texts, metadatas, ids=ids)
+        return store
+
+    @classmethod
+    def from_chroma(cls, chroma):
+        """Copies the chunks and embeddings of a Chroma store, nothing is embedded again."""
+        store = cls(chroma.embeddings)
+        store.add_from_chroma(chroma)
+        return store
+
+    def add_from_chroma(self, chroma, ids=None):
+        """Copies chunks of a Chroma store, all of them or the given ids, with their stored embeddings."""
+        if ids is not None and not ids:
+            return
+        data = chroma.get(ids=ids, include=["embeddings", "documents", "metadatas"])
+        if len(data["ids"]):
+            self.add_embeddings(data["documents"], data["embeddings"], data["metadatas"], data["ids"])
+
+    @classmethod
+    def load(cls, directory, embedding, mmap=VECTOR_INDEX_MMAP):
+        """Opens a saved index, shared with the other stores of the process loading the same directory."""
+        return cls(embedding, *load_index(directory, mmap))
+
+    def save(self, directory):
+        """Writes the index to a directory, replacing any previous index atomically file by file."""
+        matrix, ids, texts, metadatas = self._index
+        os.makedirs(directory, exist_ok=True)
+        suffix = f".{os.getpid()}.tmp"
+        with open(os.path.join(directory, "embeddings.npy" + suffix), "wb") as f:
+            np.save(f, np.ascontiguousarray(matrix, dtype=np.float32))
+        with open(os.path.join(directory, "chunks.json" + suffix), "w") as f:
+            json.dump({"ids": ids, "texts": texts, "metadatas": metadatas}, f)
+        for name in ("embeddings.npy", "chunks.json"):
+            os.replace(os.path.join(directory, name + suffix), os.path.join(directory, name))
+        load_index.cache_clear()
+
+
+def create_vector_store(embeddings, backend=RETRIEVER_BACKEND, directory=VECTOR_INDEX_DIR):
+    """
+    Opens the vector store of the RAG retriever.
+
+    @param embeddings: Embedding model of the queries, the one the chunks were embedded with
+    @param backend: "chroma" or "numpy"
+    @param directory: Directory of the numpy index, exported from the Chroma store if missing
+    @return: LangChain VectorStore
+    """
+    if backend == "numpy":
+        if not os.path.exists(os.path.join(directory, "embeddings.npy")):
+            from langchain_chroma import Chroma
+            print(Fore.YELLOW + f"Exporting the Chroma store to the numpy index {directory}" + Style.RESET_ALL)
+            NumpyVectorStore.from_chroma(Chroma(persist_directory=CHROMA_DIR, embedding_function=embeddings)).save(directory)
+        return NumpyVectorStore.load(directory, embeddings)
+    from langchain_chroma import Chroma
+    return Chroma(persist_directory=CHROMA_DIR, embedding_function=embeddings)
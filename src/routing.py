@@ -0,0 +1,145 @@
+import os
+import time
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from langchain_core.runnables import Runnable
+from langchain_openai import ChatOpenAI
+
+# Default model per chain: cheap, fast models for the simple classification steps,
+# the MODEL env variable (gpt-4o by default) for everything else.
+# Override with MODEL_<CHAIN> (e.g. MODEL_EMAIL_WRITER) and add fallbacks with
+# MODEL_FALLBACKS or MODEL_<CHAIN>_FALLBACKS (comma separated model names).
+DEFAULT_CHAIN_MODELS = {
+    "categorize_email": "gpt-4o-mini",
+    "design_rag_queries": "gpt-4o-mini",
+}
+
+# Hedged requests: fire a duplicate call once a call runs longer than the chain's
+# HEDGE_PERCENTILE latency, the first answer wins
+HEDGE_REQUESTS = os.getenv("HEDGE_REQUESTS", "false").lower() == "true"
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+# Delay used until enough latencies are observed, and lower bound of the delay
+HEDGE_INITIAL_DELAY = float(os.getenv("HEDGE_INITIAL_DELAY", "10"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "1"))
+
+
+class ModelRouter:
+    """Picks the chat model (and its fallbacks) used by each agent chain."""
+
+    def __init__(self, llm=None, temperature=0.1):
+        # A fixed llm (e.g. a local stand-in) bypasses routing entirely
+        self.llm = llm
+        self.temperature = temperature
+        self.default_model = os.getenv("MODEL", "gpt-4o")
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def model_name(self, chain):
+        """Returns the primary model name for a chain."""
+        return os.getenv(f"MODEL_{chain.upper()}", DEFAULT_CHAIN_MODELS.get(chain, self.default_model))
+
+    def fallback_names(self, chain):
+        """Returns the fallback model names for a chain, in order."""
+        names = os.getenv(f"MODEL_{chain.upper()}_FALLBACKS", os.getenv("MODEL_FALLBACKS", ""))
+        primary = self.model_name(chain)
+        return [name.strip() for name in names.split(",") if name.strip() and name.strip() != primary]
+
+    def get_llms(self, chain):
+        """Returns the chat models for a chain: primary model first, then its fallbacks."""
+        if self.llm is not None:
+            return [self.llm]
+        return [self._get_model(name) for name in [self.model_name(chain)] + self.fallback_names(chain)]
+
+    def _get_model(self, name):
+        # One client per model name, shared by every chain routed to it
+        with self._lock:
+            if name not in self._models:
+                self._models[name] = ChatOpenAI(model_name=name, temperature=self.temperature)
+            return self._models[name]
+
+    def reset(self):
+        """Drops the model clients, created again on next use (e.g. in a forked worker)."""
+        with self._lock:
+            self._models.clear()
+
+
+class LatencyWindow:
+    """Sliding window of the latest call latencies of a chain."""
+
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, p):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))
+        return samples[index]
+
+
+# Hedged calls run on a shared pool, the losing call finishes in the background
+_hedge_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="hedge")
+
+
+class HedgedRunnable(Runnable):
+    """
+    Wraps a chain so a slow call is duplicated after the chain's p95 latency.
+
+    Whichever call answers first wins; if it fails the other one is awaited.
+    """
+
+    def __init__(self, runnable, name, percentile=HEDGE_PERCENTILE, min_delay=HEDGE_MIN_DELAY, min_samples=20):
+        self.runnable = runnable
+        self.name = name
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.latencies = LatencyWindow()
+        self.hedged_calls = 0
+        # Invoked from several workflow threads at once
+        self._lock = threading.Lock()
+
+    def hedge_delay(self):
+        """Seconds to wait on the first call before firing the duplicate."""
+        if len(self.latencies) < self.min_samples:
+            return HEDGE_INITIAL_DELAY
+        return max(self.min_delay, self.latencies.percentile(self.percentile))
+
+    def _submit(self, input, config, **kwargs):
+        context = contextvars.copy_context()
+        return _hedge_executor.submit(context.run, self._timed_invoke, input, config, **kwargs)
+
+    def _timed_invoke(self, input, config, **kwargs):
+        start = time.perf_counter()
+        result = self.runnable.invoke(input, config, **kwargs)
+        self.latencies.record(time.perf_counter() - start)
+        return result
+
+    def invoke(self, input, config=None, **kwargs):
+        first = self._submit(input, config, **kwargs)
+        done, _ = wait([first], timeout=self.hedge_delay())
+        if done:
+            return first.result()
+
+        with self._lock:
+            self.hedged_calls += 1
+        pending = {first, self._submit(input, config, **kwargs)}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
@@ -0,0 +1,106 @@
+import datetime
+from typing import List
+import msgspec
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from .state import Email, EmailFields, Amount, EmailBudget
+
+# Compact internal representation of the state models.
+# The pydantic models stay the public schema (API, LLM structured output),
+# these structs are only used for storage and in-process transport: they are
+# encoded as msgpack arrays (no field names) and the models are validated
+# straight from the decoded struct, without an intermediate dict or JSON.
+
+
+class EmailRecord(msgspec.Struct, array_like=True):
+    id: str
+    threadId: str
+    messageId: str
+    references: str
+    sender: str
+    subject: str
+    body: str
+    original_body: str = ""
+    internalDate: int = 0
+    detected_at: float = 0.0
+
+
+class AmountRecord(msgspec.Struct, array_like=True):
+    currency: str
+    value: float
+
+
+class EmailFieldsRecord(msgspec.Struct, array_like=True):
+    sender_name: str = ""
+    amounts: List[AmountRecord] = []
+    dates: List[datetime.date] = []
+    rates: List[float] = []
+    account_suffixes: List[str] = []
+    signatories_count: int = 1
+
+
+_encoder = msgspec.msgpack.Encoder()
+_email_decoder = msgspec.msgpack.Decoder(EmailRecord)
+_fields_decoder = msgspec.msgpack.Decoder(EmailFieldsRecord)
+
+
+def encode_email(email: Email) -> bytes:
+    """Encodes an Email to compact msgpack bytes."""
+    return _encoder.encode(EmailRecord(
+        email.id, email.threadId, email.messageId, email.references,
+        email.sender, email.subject, email.body, email.original_body, email.internalDate,
+        email.detected_at,
+    ))
+
+
+def decode_email(data: bytes) -> Email:
+    """Decodes bytes written by encode_email."""
+    return Email.model_validate(_email_decoder.decode(data), from_attributes=True)
+
+
+def encode_fields(fields: EmailFields) -> bytes:
+    """Encodes EmailFields to compact msgpack bytes."""
+    return _encoder.encode(EmailFieldsRecord(
+        fields.sender_name,
+        [AmountRecord(amount.currency, amount.value) for amount in fields.amounts],
+        fields.dates, fields.rates, fields.account_suffixes, fields.signatories_count,
+    ))
+
+
+def decode_fields(data: bytes) -> EmailFields:
+    """Decodes bytes written by encode_fields."""
+    return EmailFields.model_validate(_fields_decoder.decode(data), from_attributes=True)
+
+
+class StateSerializer(JsonPlusSerializer):
+    """
+    Checkpoint serializer encoding the state models with the msgspec codec.
+
+    Every other value (messages, plain channels) goes through LangGraph's
+    msgpack serializer, with the state models allowed for decoding.
+    """
+
+    CODECS = {
+        "email": (Email, encode_email, decode_email),
+        "email_fields": (EmailFields, encode_fields, decode_fields),
+    }
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault("allowed_msgpack_modules", [
+            (Email.__module__, "Email"),
+            (EmailFields.__module__, "EmailFields"),
+            (Amount.__module__, "Amount"),
+            (EmailBudget.__module__, "EmailBudget"),
+        ])
+        super().__init__(**kwargs)
+
+    def dumps_typed(self, obj):
+        for type_, (model, encode, _) in self.CODECS.items():
+            if type(obj) is model:
+                return type_, encode(obj)
+        return super().dumps_typed(obj)
+
+    def loads_typed(self, data):
+        type_, data_ = data
+        if type_ in self.CODECS:
+            return self.CODECS[type_][2](data_)
+        return super().loads_typed(data)
@@ -0,0 +1,158 @@
+import os
+import json
+import threading
+import urllib.request
+from collections import defaultdict
+from colorama import Fore, Style
+from .latency import LatencyTracker
+
+# Stages of the inbox-to-draft latency of an email:
+#   detection   - Gmail receipt (internalDate) to the fetch that found the email
+#   queue_wait  - fetch to the start of its processing
+#   processing  - categorization, writing and review
+#   gmail_write - creation of the draft in Gmail
+#   total       - Gmail receipt to draft created, what the customer waits
+STAGES = ("detection", "queue_wait", "processing", "gmail_write", "total")
+
+# Inbox-to-draft target, in seconds, of every category, overridden per category
+# with SLA_SECONDS_<CATEGORY> (e.g. SLA_SECONDS_MATURITY_REPAYMENT=900)
+SLA_SECONDS = float(os.getenv("SLA_SECONDS", "3600"))
+# The SLA of a category is breached when this percentile of its total latency exceeds the target
+SLA_PERCENTILE = float(os.getenv("SLA_PERCENTILE", "95"))
+# Drafts of a category needed before its SLA is evaluated
+SLA_MIN_SAMPLES = int(os.getenv("SLA_MIN_SAMPLES", "5"))
+# URL receiving a JSON POST when a category starts or stops breaching its SLA, if set
+SLA_ALERT_WEBHOOK = os.getenv("SLA_ALERT_WEBHOOK", "")
+
+
+def sla_seconds(category):
+    """Returns the inbox-to-draft target of a category, in seconds."""
+    return float(os.getenv(f"SLA_SECONDS_{category.upper()}", SLA_SECONDS))
+
+
+def stage_latencies(email, started_at, write_started_at, drafted_at):
+    """
+    Splits the inbox-to-draft latency of an email into its stages.
+
+    @param email: Drafted Email, with its internalDate and detected_at
+    @param started_at: Epoch seconds at which its processing started
+    @param write_started_at: Epoch seconds at which the Gmail draft creation started
+    @param drafted_at: Epoch seconds at which the draft was created
+    @return: Dict of stage -> seconds, without the stages whose timestamps are unknown
+    """
+    arrived_at = email.internalDate / 1000 if email.internalDate else None
+    stages = {"processing": write_started_at - started_at, "gmail_write": drafted_at - write_started_at}
+    if email.detected_at:
+        stages["queue_wait"] = max(0.0, started_at - email.detected_at)
+        if arrived_at:
+            stages["detection"] = max(0.0, email.detected_at - arrived_at)
+    if arrived_at:
+        stages["total"] = max(0.0, drafted_at - arrived_at)
+    return stages
+
+
+class SlaTracker:
+    """
+    Inbox-to-draft latency per stage and email category, checked against the SLA.
+
+    A category enters alert once the SLA_PERCENTILE of its total latency
+    exceeds its target, and leaves it once back under. Both transitions are
+    logged and posted to SLA_ALERT_WEBHOOK.
+    """
+
+    def __init__(self, percentile=SLA_PERCENTILE, min_samples=SLA_MIN_SAMPLES, alert_webhook=SLA_ALERT_WEBHOOK,
+                 window=1000):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.alert_webhook = alert_webhook
+        self.stages = {stage: LatencyTracker(window) for stage in STAGES}
+        # Drafts whose own total latency exceeded the target, per category
+        self.breaches = defaultdict(int)
+        self._alerting = set()
+        self._lock = threading.Lock()
+
+    def record(self, category, stages):
+        """
+        Records the stage latencies of a drafted email and updates the alerts.
+
+        @param category: Email category
+        @param stages: Dict of stage -> seconds, see stage_latencies
+        """
+        for stage, seconds in stages.items():
+            self.stages[stage].record(category, seconds)
+        total = stages.get("total")
+        if total is None:
+            return
+        with self._lock:
+            if total > sla_seconds(category):
+                self.breaches[category] += 1
+        self._check(category)
+
+    def _check(self, category):
+        if self.stages["total"].count(category) < self.min_samples:
+            return
+        latency = self.stages["total"].percentile(category, self.percentile)
+        breached = latency > sla_seconds(category)
+        with self._lock:
+            if breached == (category in self._alerting):
+                return
+            if breached:
+                self._alerting.add(category)
+            else:
+                self._alerting.discard(category)
+        self._alert(category, breached, latency)
+
+    def _alert(self, category, breached, latency):
+        alert = {
+            "category": category,
+            "status": "breached" if breached else "recovered",
+            "percentile": self.percentile,
+            "latency_seconds": round(latency, 3),
+            "sla_seconds": sla_seconds(category),
+        }
+        color = Fore.RED if breached else Fore.GREEN
+        print(color + f"SLA {alert['status']} for {category}: p{self.percentile:g} inbox-to-draft "
+              f"{latency:.0f}s, target {alert['sla_seconds']:.0f}s" + Style.RESET_ALL)
+        if self.alert_webhook:
+            # Posted in the background, the draft being created is not held up
+            threading.Thread(target=self._post, args=(alert,), daemon=True).start()
+
+    def _post(self, alert):
+        request = urllib.request.Request(
+            self.alert_webhook, data=json.dumps(alert).encode(), headers={"Content-Type": "application/json"}
+        )
+        try:
+            urllib.request.urlopen(request, timeout=10).close()
+        except Exception as e:
+            print(Fore.RED + f"Error posting SLA alert: {e}" + Style.RESET_ALL)
+
+    def alerts(self):
+        """Categories currently breaching their SLA."""
+        with self._lock:
+            return sorted(self._alerting)
+
+    def total_percentiles(self):
+        """SLA_PERCENTILE of the total latency of each category, in seconds."""
+        return {category: self.stages["total"].percentile(category, self.percentile)
+                for category in self.stages["total"].summary()}
+
+    def report(self):
+        """Per category: SLA target, breaches, alert status and the percentiles of each stage."""
+        summaries = {stage: tracker.summary() for stage, tracker in self.stages.items()}
+        categories = sorted({category for summary in summaries.values() for category in summary})
+        alerting = set(self.alerts())
+        with self._lock:
+            breaches = dict(self.breaches)
+        return {
+            category: {
+                "sla_seconds": sla_seconds(category),
+                "breaches": breaches.get(category, 0),
+                "alert": category in alerting,
+                "stages": {stage: summary[category] for stage, summary in summaries.items() if category in summary},
+            }
+            for category in categories
+        }
+
+
+# Shared by every workflow of the process, served by GET /sla
+sla_tracker = SlaTracker()
@@ -1,5 +1,7 @@
 from pydantic import BaseModel, Field
 from typing import List, Annotated
+import operator
+from datetime import date
 from typing_extensions import TypedDict
 from langgraph.graph.message import add_messages
 
@@ -11,10 +13,36 @@ class Email(BaseModel):
     sender: str = Field(..., description="Email address of the sender")
     subject: str = Field(..., description="Subject line of the email")
     body: str = Field(..., description="Body content of the email")
+    original_body: str = Field("", description="Body as received, before quoted history, signatures and disclaimers were stripped")
+    internalDate: int = Field(0, description="Time Gmail received the email, in epoch milliseconds (0 if unknown)")
+    detected_at: float = Field(0.0, description="Time the email was fetched from Gmail, in epoch seconds (0 if unknown)")
+
+class Amount(BaseModel):
+    currency: str = Field(..., description="Currency code or symbol of the amount")
+    value: float = Field(..., description="Numeric value of the amount")
+
+class EmailFields(BaseModel):
+    sender_name: str = Field("", description="Display name of the sender, if any")
+    amounts: List[Amount] = Field(default_factory=list, description="Currency amounts mentioned in the email")
+    dates: List[date] = Field(default_factory=list, description="Dates mentioned in the email, such as maturity dates")
+    rates: List[float] = Field(default_factory=list, description="Interest rates mentioned in the email, in percent")
+    account_suffixes: List[str] = Field(default_factory=list, description="Trailing digits of accounts mentioned in the email")
+    signatories_count: int = Field(1, description="Number of authorized signatories required")
     
+class EmailBudget(BaseModel):
+    started_at: float = Field(..., description="Epoch seconds at which processing of the email started")
+    deadline: float = Field(..., description="Epoch seconds after which no more LLM call is made for the email")
+    max_tokens: int = Field(..., description="Tokens the email's LLM calls may consume")
+    max_llm_calls: int = Field(..., description="LLM calls the email may make")
+    tokens: int = Field(0, description="Tokens consumed so far")
+    llm_calls: int = Field(0, description="LLM calls made so far")
+
 class GraphState(TypedDict):
-    emails: List[Email]
-    current_email: Email
+    # Emails wait in an external EmailQueue, the state only carries their ids
+    queue_key: str
+    pending_emails: int
+    current_email_id: str
+    email_fields: EmailFields
     email_category: str
     signatories_count: int
     generated_email: str
@@ -22,4 +50,14 @@ class GraphState(TypedDict):
     retrieved_documents: str
     writer_messages: Annotated[list, add_messages]
     sendable: bool
-    trials: int
\ No newline at end of file
+    trials: int
+    # Emails set aside while the LLM provider is unavailable, retried on the next run
+    parked: bool
+    parked_emails: Annotated[List[str], operator.add]
+    # Owner id of this run's thread leases, and whether another worker holds the current thread
+    lease_owner: str
+    leased: bool
+    # Backpressure level the current email is handled at ("" for the full workflow)
+    degradation: str
+    # Time, token and LLM call budget of the current email
+    budget: EmailBudget
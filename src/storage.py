@@ -0,0 +1,54 @@
+import os
+import sqlite3
+from contextlib import contextmanager
+from langgraph.checkpoint.sqlite import SqliteSaver
+from .serialization import StateSerializer
+
+# SQLite files holding the runtime state of the automation
+RUNTIME_DB = os.getenv("RUNTIME_DB", "db/runtime.sqlite3")
+CHECKPOINT_DB = os.getenv("CHECKPOINT_DB", "db/checkpoints.sqlite3")
+
+
+def connect(path=RUNTIME_DB):
+    """
+    Opens a SQLite connection safe to share between threads and processes.
+
+    @param path: Database file, created with its directory if missing
+    @return: sqlite3.Connection in WAL mode, autocommit
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def reconnect(conn):
+    """
+    Opens a new connection to the database of a connection, e.g. in a forked
+    worker that must not share the connection opened by its parent.
+
+    @param conn: Connection to replace, left open for the parent
+    @return: New connection to the same file, conn itself for an in-memory database
+    """
+    path = next((row[2] for row in conn.execute("PRAGMA database_list") if row[1] == "main"), "")
+    return connect(path) if path else conn
+
+
+@contextmanager
+def transaction(conn):
+    """Runs the enclosed statements in one write transaction, rolled back on error."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def create_checkpointer(path=CHECKPOINT_DB):
+    """Returns a SQLite checkpointer persisting the graph state after every step."""
+    return SqliteSaver(connect(path), serde=StateSerializer())
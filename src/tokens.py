@@ -0,0 +1,59 @@
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken ships with langchain-openai, but keep a fallback
+    tiktoken = None
+
+# Rough chars-per-token ratio for English text, used when tiktoken is unavailable
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=8)
+def _get_encoding(model):
+    """Load (once) the tokenizer used by the given OpenAI model."""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception:
+        try:
+            return tiktoken.get_encoding("o200k_base")
+        except Exception:
+            return None
+
+
+def count_tokens(text, model="gpt-4o"):
+    """
+    Count the tokens of a text for the given model.
+
+    @param text: Text to measure
+    @param model: OpenAI model name used to pick the tokenizer
+    @return: Number of tokens (estimated from length if tiktoken is unavailable)
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text, max_tokens, model="gpt-4o"):
+    """
+    Cut a text down to at most max_tokens tokens, keeping its beginning.
+
+    @param text: Text to truncate
+    @param max_tokens: Token budget, must be positive
+    @param model: OpenAI model name used to pick the tokenizer
+    @return: The text itself if it fits, otherwise its leading part
+    """
+    if not text:
+        return text
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
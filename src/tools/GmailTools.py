@@ -1,22 +1,49 @@
 import os
 import re
+import time
 import uuid
 import base64
+import threading
 from bs4 import BeautifulSoup
 from datetime import datetime, timedelta
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
+from googleapiclient.errors import HttpError
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from ..normalize import normalize_body
+from ..cassette import cassette
 
 
 SCOPES = ['https://www.googleapis.com/auth/gmail.modify']
 
 class GmailToolsClass:
-    def __init__(self):
-        self.service = self._get_gmail_service()
+    def __init__(self, service=None):
+        # Connected on first use: importing or forking the app runs no OAuth flow
+        self._service = service
+        # An injected service is the caller's, reset() keeps it
+        self._owns_service = service is None
+        self._service_lock = threading.Lock()
+        # Label name -> label id, labels are looked up once
+        self._label_ids = {}
+
+    @property
+    def service(self):
+        if self._service is None:
+            with self._service_lock:
+                if self._service is None:
+                    # Recorded to, or replayed from, the cassette if CASSETTE_MODE is set
+                    self._service = cassette.gmail_service(self._get_gmail_service)
+        return self._service
+
+    def reset(self):
+        """Drops the Gmail connection it opened, opened again on next use (e.g. in a forked worker)."""
+        if not self._owns_service:
+            return
+        with self._service_lock:
+            self._service = None
         
     def fetch_unanswered_emails(self, max_results=50):
         """
@@ -53,6 +80,110 @@ class GmailToolsClass:
             print(f"An error occurred: {e}")
             return []
 
+    def fetch_emails_since(self, history_id, max_results=50):
+        """
+        Fetches the unanswered emails added to the inbox after a history id (incremental sync).
+
+        Messages are read oldest first, a history record at a time. Once
+        max_results threads are found, the next records are left for the next
+        sync: the returned history id is then the one of the last record read.
+
+        @param history_id: Gmail historyId the mailbox was last synced up to
+        @param max_results: Maximum number of new emails to return
+        @return: Tuple (emails, historyId to sync from next), or (None, None) if history_id is
+                 too old and a full fetch is needed
+        @raise HttpError: Gmail failed to list the history or to get a message, the cursor must not move
+        """
+        # (message id, id of its history record), oldest first
+        added_messages = []
+        latest_history_id = history_id
+        try:
+            request = self.service.users().history().list(
+                userId="me", startHistoryId=history_id, historyTypes=["messageAdded"], labelId="INBOX"
+            )
+            while request is not None:
+                response = request.execute()
+                latest_history_id = response.get("historyId", latest_history_id)
+                for record in response.get("history", []):
+                    for added in record.get("messagesAdded", []):
+                        added_messages.append((added["message"]["id"], record["id"]))
+                request = self.service.users().history().list_next(request, response)
+        except HttpError as error:
+            if error.resp.status == 404:
+                # History ids expire after about a week
+                return None, None
+            raise
+
+        threads_with_drafts = {draft['threadId'] for draft in self.fetch_draft_replies()}
+        # Thread id -> latest email of the thread, like fetch_recent_emails
+        latest_emails = {}
+        seen_messages = set()
+        synced_history_id = latest_history_id
+        for position, (message_id, record_id) in enumerate(added_messages):
+            if position and record_id != added_messages[position - 1][1] and len(latest_emails) >= max_results:
+                # Cut between two records: the next sync starts after the last record read
+                synced_history_id = added_messages[position - 1][1]
+                break
+            if message_id in seen_messages:
+                continue
+            seen_messages.add(message_id)
+            try:
+                email_info = self._get_email_info(message_id)
+            except HttpError as error:
+                if error.resp.status != 404:
+                    raise
+                # Deleted since the notification
+                print(f"Email {message_id} was deleted: {error}")
+                continue
+            if email_info["threadId"] not in threads_with_drafts:
+                latest_emails[email_info["threadId"]] = email_info
+        new_emails = [email for email in reversed(list(latest_emails.values())) if not self._should_skip_email(email)]
+        return new_emails, synced_history_id
+
+    def get_history_id(self):
+        """Returns the current historyId of the mailbox."""
+        return self.service.users().getProfile(userId="me").execute()["historyId"]
+
+    def get_email_address(self):
+        """Returns the email address of the mailbox."""
+        return self.service.users().getProfile(userId="me").execute()["emailAddress"]
+
+    def watch_inbox(self, topic):
+        """
+        Subscribes the inbox to Gmail push notifications, or renews the subscription.
+
+        @param topic: Pub/Sub topic receiving the notifications
+        @return: Watch response with the current historyId and the expiration (epoch ms)
+        """
+        return self.service.users().watch(
+            userId="me",
+            body={"labelIds": ["INBOX"], "topicName": topic}
+        ).execute()
+
+    def get_email(self, msg_id):
+        """Returns the email with the given message id, in the format of fetch_unanswered_emails."""
+        return self._get_email_info(msg_id)
+
+    def label_email(self, email, label_name):
+        """
+        Adds a label to an email, creating the label if the mailbox does not have it.
+
+        @param email: Email to label
+        @param label_name: Name of the label, "/" separates nested labels
+        """
+        label_id = self._label_ids.get(label_name)
+        if label_id is None:
+            labels = self.service.users().labels().list(userId="me").execute().get("labels", [])
+            label_id = next((label["id"] for label in labels if label["name"] == label_name), None)
+        if label_id is None:
+            label_id = self.service.users().labels().create(
+                userId="me", body={"name": label_name}
+            ).execute()["id"]
+        self._label_ids[label_name] = label_id
+        self.service.users().messages().modify(
+            userId="me", id=email.id, body={"addLabelIds": [label_id]}
+        ).execute()
+
     def fetch_recent_emails(self, max_results=50):
         try:
             # Set delay of 8 hours
@@ -179,6 +310,8 @@ class GmailToolsClass:
 
         payload = message.get('payload', {})
         headers = {header["name"].lower(): header["value"] for header in payload.get("headers", [])}
+        # Keep the raw body for audit, the LLM chains only see the normalized one
+        raw_body = self._get_email_body(payload)
 
         return {
             "id": msg_id,
@@ -187,13 +320,17 @@ class GmailToolsClass:
             "references": headers.get("references", ""),
             "sender": headers.get("from", "Unknown"),
             "subject": headers.get("subject", "No Subject"),
-            "body": self._get_email_body(payload),
+            "body": self._clean_body_text(normalize_body(raw_body)),
+            "original_body": raw_body,
+            "internalDate": int(message.get("internalDate", 0)),
+            "detected_at": time.time(),
         }
     
     def _get_email_body(self, payload):
         """
         Extract the email body, prioritizing text/plain over text/html.
         Handles multipart messages, avoids duplicating content, and strips HTML if necessary.
+        Line breaks are kept so quoted history and signatures can still be detected.
         """
         def decode_data(data):
             """Decode base64-encoded data."""
@@ -224,7 +361,7 @@ class GmailToolsClass:
             if payload.get('mimeType') == 'text/html':
                 body = self._extract_main_content_from_html(body)
 
-        return self._clean_body_text(body)
+        return body
 
     def _extract_main_content_from_html(self, html_content):
         """
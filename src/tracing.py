@@ -0,0 +1,275 @@
+import os
+import json
+import time
+import uuid
+import bisect
+import itertools
+import functools
+import threading
+import contextvars
+from collections import deque, defaultdict
+
+# Spans around every graph node, LLM call and Gmail call. When off, nodes and
+# clients are not wrapped at all and span() returns a shared no-op.
+TRACING = os.getenv("TRACING", "true").lower() == "true"
+# Finished spans are appended to this file as JSON lines, if set
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+# Finished spans kept in memory for GET /traces
+TRACE_HISTORY = int(os.getenv("TRACE_HISTORY", "1000"))
+
+# Upper bounds, in seconds, of the span latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# Span attributes summed into the parent span and counted per span name
+COUNTED_ATTRIBUTES = ("tokens", "llm_calls", "retries")
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+def _series(metric, labels):
+    if not labels:
+        return metric
+    return metric + "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+
+class Metrics:
+    """
+    Counters and latency histograms rendered in the Prometheus text format.
+
+    Gauges are read from callbacks registered with register_gauge when the
+    metrics are rendered.
+    """
+
+    def __init__(self, prefix="finpower", buckets=LATENCY_BUCKETS):
+        self.prefix = prefix
+        self.buckets = buckets
+        self._counters = defaultdict(lambda: defaultdict(float))
+        self._histograms = defaultdict(dict)
+        self._gauges = {}
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, labels=(), value=1.0, help=""):
+        with self._lock:
+            self._counters[name][tuple(labels)] += value
+            self._help.setdefault(name, help)
+
+    def observe(self, name, labels, seconds, help=""):
+        with self._lock:
+            histogram = self._histograms[name].get(tuple(labels))
+            if histogram is None:
+                # Per-bucket counts, cumulated when rendered, then sum and count
+                histogram = self._histograms[name][tuple(labels)] = [[0] * len(self.buckets), 0.0, 0]
+                self._help.setdefault(name, help)
+            index = bisect.bisect_left(self.buckets, seconds)
+            if index < len(self.buckets):
+                histogram[0][index] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    def register_gauge(self, name, collect, help=""):
+        """Registers a gauge, collect() returns its value or a dict {labels tuple: value}."""
+        with self._lock:
+            self._gauges[name] = collect
+            self._help[name] = help
+
+    def render(self):
+        """Returns every metric in the Prometheus text exposition format."""
+        with self._lock:
+            counters = {name: dict(values) for name, values in self._counters.items()}
+            histograms = {name: {labels: (list(h[0]), h[1], h[2]) for labels, h in values.items()}
+                          for name, values in self._histograms.items()}
+            gauges = dict(self._gauges)
+            help = dict(self._help)
+        lines = []
+        for name, values in sorted(counters.items()):
+            metric = f"{self.prefix}_{name}_total"
+            lines += [f"# HELP {metric} {help[name]}", f"# TYPE {metric} counter"]
+            lines += [f"{_series(metric, labels)} {value:g}" for labels, value in sorted(values.items())]
+        for name, values in sorted(histograms.items()):
+            metric = f"{self.prefix}_{name}"
+            lines += [f"# HELP {metric} {help[name]}", f"# TYPE {metric} histogram"]
+            for labels, (counts, total, count) in sorted(values.items()):
+                cumulated = 0
+                for bound, bucket in zip(self.buckets, counts):
+                    cumulated += bucket
+                    lines.append(f'{_series(metric + "_bucket", labels + (("le", f"{bound:g}"),))} {cumulated}')
+                lines.append(f'{_series(metric + "_bucket", labels + (("le", "+Inf"),))} {count}')
+                lines.append(f"{_series(metric + '_sum', labels)} {total:.6f}")
+                lines.append(f"{_series(metric + '_count', labels)} {count}")
+        for name, collect in sorted(gauges.items()):
+            metric = f"{self.prefix}_{name}"
+            try:
+                values = collect()
+            except Exception:
+                continue
+            if not isinstance(values, dict):
+                values = {(): values}
+            lines += [f"# HELP {metric} {help[name]}", f"# TYPE {metric} gauge"]
+            lines += [f"{_series(metric, labels)} {float(value):g}" for labels, value in sorted(values.items())]
+        return "\n".join(lines) + "\n"
+
+
+class Span:
+    """A timed operation (node, LLM call, Gmail call) with its attributes."""
+
+    def __init__(self, tracer, kind, name, attributes):
+        self.tracer = tracer
+        self.kind = kind
+        self.name = name
+        self.attributes = attributes
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent = None
+        self.start = None
+        self.duration = None
+        self.error = None
+        self._token = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def add(self, name, value):
+        self.attributes[name] = self.attributes.get(name, 0) + value
+
+    def __enter__(self):
+        self.parent = _current_span.get()
+        # Child spans (LLM and Gmail calls) belong to the email of their node
+        if self.parent is not None and "email_id" in self.parent.attributes:
+            self.attributes.setdefault("email_id", self.parent.attributes["email_id"])
+        self._token = _current_span.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        _current_span.reset(self._token)
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        self.tracer.finish(self)
+        return False
+
+    def to_dict(self):
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent.span_id if self.parent else None,
+            "kind": self.kind,
+            "name": self.name,
+            "ms": round(self.duration * 1000, 3),
+            "error": self.error,
+            **self.attributes,
+        }
+
+
+class _NoopSpan:
+    def set(self, **attributes):
+        pass
+
+    def add(self, name, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """
+    Records spans and aggregates them into metrics.
+
+    Every finished span updates the span_seconds histogram and the spans
+    counter (by kind, name and status) and its token, LLM call and retry
+    attributes are added to the matching counters and to its parent span.
+    """
+
+    def __init__(self, enabled=TRACING, metrics=None, trace_file=TRACE_FILE, history=TRACE_HISTORY):
+        self.enabled = enabled
+        self.metrics = metrics or Metrics()
+        self.trace_file = trace_file
+        self._recent = deque(maxlen=history)
+        self._file_lock = threading.Lock()
+
+    def span(self, kind, name, **attributes):
+        """Returns a context manager timing an operation, a shared no-op when tracing is off."""
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(self, kind, name, attributes)
+
+    def annotate(self, **attributes):
+        """Sets attributes on the current span, e.g. the email a node picked."""
+        span = _current_span.get()
+        if span is not None:
+            span.set(**attributes)
+
+    def finish(self, span):
+        labels = (("kind", span.kind), ("name", span.name))
+        self.metrics.observe("span_seconds", labels, span.duration, "Duration of traced nodes, LLM and Gmail calls")
+        self.metrics.inc("spans", labels + (("status", "error" if span.error else "ok"),),
+                         help="Traced nodes, LLM and Gmail calls")
+        for attribute in COUNTED_ATTRIBUTES:
+            value = span.attributes.get(attribute)
+            if value:
+                self.metrics.inc(attribute, labels, value, f"{attribute.replace('_', ' ').capitalize()} of traced spans")
+                if span.parent is not None:
+                    span.parent.add(attribute, value)
+        record = span.to_dict()
+        self._recent.append(record)
+        if self.trace_file:
+            with self._file_lock, open(self.trace_file, "a") as f:
+                f.write(json.dumps(record, default=str) + "\n")
+
+    def recent(self, limit=100, email_id=None):
+        """Returns the latest finished spans, newest first, optionally only those of one email."""
+        spans = reversed(list(self._recent))
+        if email_id:
+            spans = (span for span in spans if span.get("email_id") == email_id)
+        return list(itertools.islice(spans, limit))
+
+    def wrap_node(self, name, node):
+        """Wraps a graph node in a span carrying the id of the email it processed."""
+        if not self.enabled:
+            return node
+
+        @functools.wraps(node)
+        def traced_node(state):
+            with self.span("node", name, email_id=state.get("current_email_id", "")) as span:
+                update = node(state)
+                if isinstance(update, dict) and update.get("current_email_id"):
+                    span.set(email_id=update["current_email_id"])
+                return update
+
+        return traced_node
+
+    def traced(self, client, kind):
+        """Returns a proxy of the client running each of its public methods in a span."""
+        if not self.enabled or client is None:
+            return client
+        return TracedClient(client, self, kind)
+
+
+class TracedClient:
+    """Proxy tracing the method calls of a client (e.g. GmailToolsClass)."""
+
+    def __init__(self, client, tracer, kind):
+        self._client = client
+        self._tracer = tracer
+        self._kind = kind
+
+    def __getattr__(self, name):
+        attribute = getattr(self._client, name)
+        if name.startswith("_") or not callable(attribute):
+            return attribute
+
+        @functools.wraps(attribute)
+        def traced_call(*args, **kwargs):
+            with self._tracer.span(self._kind, name):
+                return attribute(*args, **kwargs)
+
+        return traced_call
+
+
+# Shared by every workflow of the process, served by GET /metrics
+tracer = Tracer()
@@ -0,0 +1,89 @@
+import threading
+from collections import defaultdict
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+class UsageTracker:
+    """
+    Aggregates the token usage reported by the LLM, per chain.
+
+    Cached tokens are the prompt tokens served from the provider's prompt-prefix
+    cache; their share of the input tokens is the chain's cache-hit ratio.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._usage = defaultdict(lambda: {"calls": 0, "input_tokens": 0, "cached_tokens": 0, "output_tokens": 0})
+
+    def callback(self, chain):
+        """Returns a callback handler recording the usage of the given chain."""
+        return UsageCallbackHandler(self, chain)
+
+    def record(self, chain, input_tokens, output_tokens, cached_tokens=0):
+        with self._lock:
+            usage = self._usage[chain]
+            usage["calls"] += 1
+            usage["input_tokens"] += input_tokens
+            usage["output_tokens"] += output_tokens
+            usage["cached_tokens"] += cached_tokens
+
+    def cache_hit_ratio(self, chain):
+        """Share of the chain's input tokens that were served from the prompt cache."""
+        with self._lock:
+            usage = self._usage.get(chain)
+            if not usage or not usage["input_tokens"]:
+                return 0.0
+            return usage["cached_tokens"] / usage["input_tokens"]
+
+    def summary(self):
+        """Returns a copy of the usage per chain, including its cache-hit ratio."""
+        with self._lock:
+            return {
+                chain: {
+                    **usage,
+                    "cache_hit_ratio": usage["cached_tokens"] / usage["input_tokens"] if usage["input_tokens"] else 0.0,
+                }
+                for chain, usage in self._usage.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._usage.clear()
+
+
+class UsageCallbackHandler(BaseCallbackHandler):
+    """Reads the token usage of every LLM response and reports it to a UsageTracker."""
+
+    def __init__(self, tracker, chain):
+        self.tracker = tracker
+        self.chain = chain
+
+    def on_llm_end(self, response, **kwargs):
+        for generations in response.generations:
+            for generation in generations:
+                usage = extract_usage(generation, response.llm_output)
+                if usage:
+                    self.tracker.record(self.chain, *usage)
+
+
+def extract_usage(generation, llm_output=None):
+    """
+    Returns (input_tokens, output_tokens, cached_tokens) of an LLM generation, or None.
+
+    Prefers the message's usage_metadata and falls back to the raw OpenAI
+    token_usage block of the response.
+    """
+    message = getattr(generation, "message", None)
+    usage = getattr(message, "usage_metadata", None)
+    if usage:
+        cached = (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+        return usage.get("input_tokens", 0), usage.get("output_tokens", 0), cached
+    token_usage = (llm_output or {}).get("token_usage")
+    if token_usage:
+        cached = (token_usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0) or 0
+        return token_usage.get("prompt_tokens", 0), token_usage.get("completion_tokens", 0), cached
+    return None
+
+
+# Shared by every Agents instance of the process
+usage_tracker = UsageTracker()
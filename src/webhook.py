@@ -0,0 +1,142 @@
+import os
+import json
+import time
+import uuid
+import base64
+import threading
+import traceback
+from collections import OrderedDict
+from colorama import Fore, Style
+from .state import Email
+
+# Pushes for a mailbox arriving within this window are merged into one sync
+WEBHOOK_COALESCE_SECONDS = float(os.getenv("WEBHOOK_COALESCE_SECONDS", "2"))
+# Pub/Sub message ids remembered to drop redeliveries
+WEBHOOK_SEEN_MESSAGES = int(os.getenv("WEBHOOK_SEEN_MESSAGES", "10000"))
+
+
+def decode_notification(envelope):
+    """
+    Decodes a Pub/Sub push envelope of a Gmail notification.
+
+    @param envelope: JSON body of the push request
+    @return: Tuple (message_id, mailbox, history_id), or None if it holds no message.
+             history_id is None when the notification does not carry one.
+    """
+    message = envelope.get("message") or {}
+    data = message.get("data")
+    if not data:
+        return None
+    notification = json.loads(base64.urlsafe_b64decode(data).decode())
+    # Manual triggers carry no Pub/Sub id, they are never deduplicated
+    message_id = message.get("messageId") or message.get("message_id") or uuid.uuid4().hex
+    history_id = notification.get("historyId")
+    return message_id, notification.get("emailAddress", "me"), int(history_id) if history_id else None
+
+
+class NotificationCoalescer:
+    """
+    Queues Gmail push notifications and syncs each mailbox once per burst.
+
+    submit() only records the notification and returns. A background consumer
+    waits for the coalescing window, then calls sync(mailbox, history_id) once
+    per mailbox with the highest history id notified. Notifications arriving
+    during a sync trigger one more sync after it. Redelivered Pub/Sub message
+    ids are dropped.
+    """
+
+    def __init__(self, sync, window=WEBHOOK_COALESCE_SECONDS, seen_size=WEBHOOK_SEEN_MESSAGES):
+        self.sync = sync
+        self.window = window
+        self.seen_size = seen_size
+        self.stats = {"received": 0, "duplicates": 0, "syncs": 0, "errors": 0}
+        self._seen = OrderedDict()
+        # Mailbox -> highest notified history id (None if unknown), waiting for a sync
+        self._pending = {}
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def submit(self, message_id, mailbox, history_id=None):
+        """Records a notification, returns False if the message id was already seen."""
+        with self._condition:
+            self.stats["received"] += 1
+            if message_id in self._seen:
+                self.stats["duplicates"] += 1
+                return False
+            self._seen[message_id] = True
+            if len(self._seen) > self.seen_size:
+                self._seen.popitem(last=False)
+            known = self._pending.get(mailbox)
+            self._pending[mailbox] = max(filter(None, (known, history_id)), default=None)
+            self._start()
+            self._condition.notify()
+        return True
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._consume, name="gmail-webhook", daemon=True)
+            self._thread.start()
+
+    def _consume(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending)
+            # Let the rest of the burst arrive
+            time.sleep(self.window)
+            with self._condition:
+                pending, self._pending = self._pending, {}
+            for mailbox, history_id in pending.items():
+                try:
+                    self.sync(mailbox, history_id)
+                    self._count("syncs")
+                except Exception as e:
+                    self._count("errors")
+                    print(Fore.RED + f"Error syncing mailbox {mailbox}: {e}" + Style.RESET_ALL)
+                    traceback.print_exc()
+
+    def _count(self, stat):
+        with self._condition:
+            self.stats[stat] += 1
+
+
+class InboxSync:
+    """
+    Syncs a mailbox from its last history id and hands the new emails to the workflow.
+
+    The emails are preloaded in the workflow's email queue under a new queue
+    key, and submit(initial_state) starts a run on that queue. Returns the
+    result of submit, or None when there was no new email.
+    """
+
+    def __init__(self, gmail_tools, progress, queue, submit):
+        self.gmail_tools = gmail_tools
+        self.progress = progress
+        self.queue = queue
+        self.submit = submit
+        # Push-triggered and polled syncs of a mailbox never overlap
+        self._lock = threading.Lock()
+
+    def __call__(self, mailbox, history_id=None):
+        with self._lock:
+            return self._sync(mailbox, history_id)
+
+    def _sync(self, mailbox, history_id):
+        cursor = self.progress.history_cursor(mailbox)
+        emails, latest = (None, None)
+        if cursor is not None:
+            emails, latest = self.gmail_tools.fetch_emails_since(cursor)
+        if emails is None:
+            # First sync or expired cursor: fall back to a full fetch
+            emails = self.gmail_tools.fetch_unanswered_emails()
+            latest = history_id or self.gmail_tools.get_history_id()
+        # Not the notified history id: a capped fetch stops at the last history record it read
+        self.progress.save_history_cursor(mailbox, int(latest))
+
+        drafted = self.progress.drafted_ids(email["id"] for email in emails)
+        emails = [Email(**email) for email in emails if email["id"] not in drafted]
+        print(Fore.YELLOW + f"Mailbox {mailbox}: {len(emails)} new emails" + Style.RESET_ALL)
+        if not emails:
+            return None
+        queue_key = f"push-{uuid.uuid4().hex}"
+        self.queue.put_many(queue_key, emails)
+        return self.submit({"queue_key": queue_key})
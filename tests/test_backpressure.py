@@ -0,0 +1,122 @@
+import time
+import pytest
+import src.email_queue as email_queue
+from src.backpressure import BackpressureController, template_reply
+from src.email_queue import InMemoryEmailQueue, SqliteEmailQueue
+from src.leases import InMemoryLeaseManager
+from src.nodes import Nodes
+from src.progress import ProgressStore
+from src.state import Email, EmailFields
+
+
+def email(email_id):
+    return Email(id=email_id, threadId=f"t{email_id}", messageId=f"m{email_id}", references="",
+                 sender="alice@example.com", subject="Maturity", body="Please reinvest on maturity.")
+
+
+def controller(**kwargs):
+    return BackpressureController(**{"depth_levels": [50, 150, 400], "latency_levels": [20, 40, 90],
+                                     "hysteresis": 0.8, "enabled": True, **kwargs})
+
+
+def test_level_rises_with_the_backlog():
+    backpressure = controller()
+    assert backpressure.level(0) == ""
+    assert backpressure.level(50) == "skip_proofreader"
+    assert backpressure.level(150) == "template_reply"
+    assert backpressure.level(400) == "deferred"
+    assert backpressure.deferring
+
+
+def test_level_falls_below_the_hysteresis_only():
+    backpressure = controller()
+    backpressure.level(150)
+    # 130 is below 150 but above 0.8 * 150
+    assert backpressure.level(130) == "template_reply"
+    assert backpressure.level(110) == "skip_proofreader"
+    assert backpressure.level(10) == ""
+
+
+def test_level_rises_with_the_llm_latency():
+    backpressure = controller()
+    for _ in range(20):
+        backpressure.record_latency(45)
+    assert backpressure.level(0) == "template_reply"
+
+
+def test_disabled_controller_never_degrades():
+    assert controller(enabled=False).level(1000) == ""
+
+
+def test_template_reply_per_signatories():
+    one = template_reply("maturity_repayment", EmailFields(sender_name="Ann"))
+    two = template_reply("maturity_repayment", EmailFields(signatories_count=2))
+    assert one.startswith("Dear Ann,") and "repay on maturity" in one
+    assert two.startswith("Dear Customer,") and "second signatory" in two
+    assert template_reply("unrelated", EmailFields()) is None
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def queue(request, tmp_path):
+    if request.param == "memory":
+        return InMemoryEmailQueue()
+    return SqliteEmailQueue(str(tmp_path / "runtime.db"))
+
+
+def test_backlog_counts_distinct_emails_of_the_other_queues(queue):
+    queue.put_many("run-a", [email(str(index)) for index in range(50)])
+    # The same inbox fetched by another worker
+    queue.put_many("run-b", [email(str(index)) for index in range(60)])
+    assert queue.backlog() == 60
+    assert queue.backlog(exclude="run-a") == 60
+    assert queue.backlog(exclude="run-b") == 50
+    queue.put_many("run-c", [email("new")])
+    assert queue.backlog(exclude="run-c") == 60
+
+
+def test_backlog_leaves_out_abandoned_queues(queue, monkeypatch):
+    queue.put_many("abandoned", [email(str(index)) for index in range(100)])
+    monkeypatch.setattr(email_queue, "EMAIL_QUEUE_LIVE_SECONDS", 60)
+    real_time = time.time
+    monkeypatch.setattr(email_queue.time, "time", lambda: real_time() + 120)
+    queue.put_many("live", [email("new")])
+    assert queue.backlog() == 1
+
+
+def test_dropped_queue_leaves_the_backlog(queue):
+    queue.put_many("run-a", [email("1"), email("2")])
+    queue.put_many("run-b", [email("2")])
+    queue.drop("run-a")
+    assert queue.size("run-a") == 0
+    assert queue.backlog() == 1
+    assert queue.get("2").id == "2"
+    with pytest.raises(KeyError):
+        queue.get("1")
+
+
+class FakeGmail:
+    def label_email(self, email, label):
+        pass
+
+
+@pytest.fixture
+def deferred_nodes(tmp_path):
+    nodes = Nodes(progress=ProgressStore(str(tmp_path / "runtime.db")), queue=InMemoryEmailQueue(), agents=object(),
+                  gmail_tools=FakeGmail(), leases=InMemoryLeaseManager(), backpressure=controller())
+    nodes.queue.put_many("queue", [email("1")])
+    nodes.progress.save_degradation(email("1"), "deferred")
+    return nodes
+
+
+def reprocessed(email_id):
+    return {"queue_key": "queue", "current_email_id": email_id, "lease_owner": "w", "degradation": "", "parked": True}
+
+
+def test_parked_deferred_email_stays_deferred(deferred_nodes):
+    deferred_nodes.park_email(reprocessed("1"))
+    assert [record["email_id"] for record in deferred_nodes.progress.degraded("deferred", drafted=False)] == ["1"]
+
+
+def test_skipped_deferred_email_is_no_longer_deferred(deferred_nodes):
+    deferred_nodes.skip_unrelated_email(reprocessed("1"))
+    assert deferred_nodes.progress.degraded("deferred", drafted=False) == []
@@ -0,0 +1,44 @@
+from src.budget import new_budget, charge, exhausted, can_afford_round, spend, resume_budget
+
+
+def budget_at(started_at, seconds=100, tokens=1000, llm_calls=10):
+    return new_budget(seconds, tokens, llm_calls).model_copy(
+        update={"started_at": started_at, "deadline": started_at + seconds})
+
+
+def test_charge_returns_a_copy():
+    budget = budget_at(0)
+    charged = charge(budget, 300, 2)
+    assert (charged.tokens, charged.llm_calls) == (300, 2)
+    assert (budget.tokens, budget.llm_calls) == (0, 0)
+
+
+def test_exhausted_reports_the_spent_part():
+    budget = budget_at(0)
+    assert exhausted(None) is None
+    assert exhausted(budget, now=50) is None
+    assert exhausted(budget, now=100) == "time"
+    assert exhausted(charge(budget, 1000, 1), now=50) == "tokens"
+    assert exhausted(charge(budget, 10, 10), now=50) == "llm_calls"
+
+
+def test_can_afford_round_extrapolates_the_average_round():
+    budget = charge(budget_at(0), 400, 4)
+    assert can_afford_round(budget, 1, now=40)
+    assert not can_afford_round(budget, 1, now=60)
+    assert not can_afford_round(charge(budget, 200, 0), 1, now=10)
+    assert can_afford_round(budget_at(0), 0, now=10)
+
+
+def test_spend_measures_from_the_start():
+    assert spend(charge(budget_at(10), 5, 1), now=12.5) == {"seconds": 2.5, "tokens": 5, "llm_calls": 1}
+
+
+def test_resume_budget_skips_the_downtime():
+    # Crashed 30s into the email, resumed an hour later
+    budget = charge(budget_at(0), 300, 2)
+    resumed = resume_budget(budget, stopped_at=30, now=3630)
+    assert exhausted(budget, now=3630) == "time"
+    assert exhausted(resumed, now=3630) is None
+    assert spend(resumed, now=3630)["seconds"] == 30
+    assert (resumed.tokens, resumed.llm_calls) == (300, 2)
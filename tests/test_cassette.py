@@ -0,0 +1,99 @@
+import json
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration
+from src.cassette import Cassette, CassetteMissError
+
+
+class FakeRequest:
+    def __init__(self, response):
+        self.response = response
+
+    def execute(self):
+        if isinstance(self.response, Exception):
+            raise self.response
+        return self.response
+
+
+class FakeGmailService:
+    """users().messages().get(...) and users().drafts().create(...) of a live Gmail service."""
+
+    def __init__(self, messages):
+        self.messages_by_id = messages
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def drafts(self):
+        return self
+
+    def get(self, userId, id):
+        return FakeRequest(self.messages_by_id.get(id) or HttpError(httplib2.Response({"status": 404}), b"Not found"))
+
+    def create(self, userId, body):
+        return FakeRequest({"id": "draft-1", "message": {"id": "m9", "threadId": body["message"]["threadId"]}})
+
+
+def record(path):
+    cassette = Cassette("record", str(path))
+    service = cassette.gmail_service(lambda: FakeGmailService({"1": {"id": "1", "snippet": "Please reinvest"}}))
+    assert service.users().messages().get(userId="me", id="1").execute()["snippet"] == "Please reinvest"
+    with pytest.raises(HttpError):
+        service.users().messages().get(userId="me", id="2").execute()
+    cassette.close()
+    return cassette
+
+
+def test_gmail_responses_and_errors_are_replayed(tmp_path):
+    path = tmp_path / "day.jsonl.gz"
+    assert record(path).summary() == {"gmail_recorded": 2}
+    replay = Cassette("replay", str(path)).gmail_service(lambda: pytest.fail("no live service in replay"))
+    assert replay.users().messages().get(userId="me", id="1").execute() == {"id": "1", "snippet": "Please reinvest"}
+    with pytest.raises(HttpError) as error:
+        replay.users().messages().get(userId="me", id="2").execute()
+    assert error.value.resp.status == 404
+
+
+def test_unrecorded_reads_fail_and_writes_are_synthesized(tmp_path):
+    path = tmp_path / "day.jsonl.gz"
+    record(path)
+    cassette = Cassette("replay", str(path))
+    service = cassette.gmail_service(lambda: None)
+    with pytest.raises(CassetteMissError):
+        service.users().messages().get(userId="me", id="3").execute()
+    draft = service.users().drafts().create(userId="me", body={"message": {"threadId": "t1"}}).execute()
+    assert draft["message"]["threadId"] == "t1"
+    assert cassette.summary()["gmail_synthesized"] == 1
+
+
+def prompt(*contents):
+    return json.dumps([{"kwargs": {"content": content}} for content in contents])
+
+
+def generation(content, input_tokens):
+    usage = {"input_tokens": input_tokens, "output_tokens": 5, "total_tokens": input_tokens + 5}
+    return [ChatGeneration(message=AIMessage(content=content, usage_metadata=usage))]
+
+
+def test_llm_generations_are_replayed_by_prompt_then_by_last_message(tmp_path):
+    path = tmp_path / "day.jsonl.gz"
+    recording = Cassette("record", str(path))
+    cache = recording.llm_cache()
+    assert cache.lookup(prompt("system", "email"), "gpt") is None
+    cache.update(prompt("system", "email"), "gpt", generation("Dear Alice", 100))
+    recording.close()
+
+    replay = Cassette("replay", str(path)).llm_cache()
+    assert replay.lookup(prompt("system", "email"), "gpt")[0].message.content == "Dear Alice"
+    # A longer system prompt still gets the answer, its input tokens adjusted
+    relaxed = replay.lookup(prompt("a much longer system prompt", "email"), "gpt")[0].message
+    assert relaxed.content == "Dear Alice"
+    assert relaxed.usage_metadata["input_tokens"] > 100
+    with pytest.raises(CassetteMissError):
+        replay.lookup(prompt("system", "another email"), "gpt")
+    assert Cassette("replay", str(path), on_miss="live").llm_cache().lookup(prompt("system", "email"), "other") is None
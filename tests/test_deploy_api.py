@@ -0,0 +1,11 @@
+import os
+import sys
+import subprocess
+
+
+def test_import_opens_no_database(tmp_path):
+    env = {**os.environ, "RUNTIME_DB": str(tmp_path / "runtime.sqlite3"),
+           "CHECKPOINT_DB": str(tmp_path / "checkpoints.sqlite3"), "OPENAI_API_KEY": ""}
+    subprocess.run([sys.executable, "-c", "import deploy_api"], env=env, check=True,
+                   cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,77 @@
+import time
+import threading
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from src.embedding_cache import CachedEmbeddings, model_namespace
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    calls: list = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        self.calls.append([text])
+        return super().embed_query(text)
+
+
+@pytest.fixture
+def embeddings():
+    return CountingEmbeddings(size=8, calls=[])
+
+
+def test_misses_are_embedded_once_in_one_request(embeddings, tmp_path):
+    cache = CachedEmbeddings(embeddings, path=str(tmp_path / "e.db"))
+    vectors = cache.embed_documents(["a", "b", "a"])
+    assert embeddings.calls == [["a", "b"]]
+    assert vectors[0] == vectors[2]
+    assert cache.embed_documents(["b", "a"]) == [vectors[1], vectors[0]]
+    assert embeddings.calls == [["a", "b"]]
+    assert cache.summary()["memory_hits"] == 2
+
+
+def test_vectors_persist_across_processes(embeddings, tmp_path):
+    first = CachedEmbeddings(embeddings, path=str(tmp_path / "e.db"))
+    vector = first.embed_query("rates")
+    second = CachedEmbeddings(embeddings, path=str(tmp_path / "e.db"))
+    assert second.embed_query("rates") == vector
+    assert second.summary() == {"memory_hits": 0, "disk_hits": 1, "misses": 0, "embedding_calls": 0, "hit_rate": 1.0}
+
+
+def test_queries_documents_and_models_never_share_a_key(embeddings, tmp_path):
+    path = str(tmp_path / "e.db")
+    cache = CachedEmbeddings(embeddings, path=path)
+    cache.embed_query("rates")
+    cache.embed_documents(["rates"])
+    other = CachedEmbeddings(embeddings, path=path, namespace="other-model")
+    other.embed_query("rates")
+    assert len(embeddings.calls) == 3
+    assert model_namespace(embeddings) == "CountingEmbeddings::8"
+
+
+def test_concurrent_misses_embed_a_text_once(tmp_path):
+    started, release = threading.Event(), threading.Event()
+
+    class SlowEmbeddings(CountingEmbeddings):
+        def embed_documents(self, texts):
+            started.set()
+            release.wait(5)
+            return super().embed_documents(texts)
+
+    embeddings = SlowEmbeddings(size=8, calls=[])
+    cache = CachedEmbeddings(embeddings, path=str(tmp_path / "e.db"))
+    results = []
+    first = threading.Thread(target=lambda: results.append(cache.embed_documents(["a"])))
+    first.start()
+    started.wait(5)
+    second = threading.Thread(target=lambda: results.append(cache.embed_documents(["a"])))
+    second.start()
+    # Let the second call find the text pending
+    time.sleep(0.1)
+    release.set()
+    first.join(5)
+    second.join(5)
+    assert embeddings.calls == [["a"]]
+    assert results[0] == results[1]
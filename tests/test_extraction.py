@@ -0,0 +1,58 @@
+from datetime import date
+from src.extraction import extract_fields, extract_sender_name, format_fields
+from src.state import Email, Amount
+
+REFERENCE = date(2025, 3, 1)
+
+
+def fields(body, subject="", sender="alice@example.com"):
+    email = Email(id="1", threadId="t1", messageId="m1", references="", sender=sender, subject=subject, body=body)
+    return extract_fields(email, REFERENCE)
+
+
+def test_amounts_with_currencies_and_multipliers():
+    extracted = fields("Please reinvest $25,000.50 and NZD 1.5m, also 300 dollars and 10k EUR.")
+    assert extracted.amounts == [
+        Amount(currency="USD", value=25000.5),
+        Amount(currency="NZD", value=1_500_000),
+        Amount(currency="USD", value=300),
+        Amount(currency="EUR", value=10_000),
+    ]
+
+
+def test_amount_repeated_in_the_subject_is_kept_once():
+    assert len(fields("Reinvest the $10,000 please.", subject="Reinvest $10,000").amounts) == 1
+
+
+def test_dates_in_every_format():
+    extracted = fields("Maturing on 1 June, then March 3rd 2026, 2025-07-15 or 20/08/25. Repay by 5-9-2025.")
+    assert extracted.dates == [date(2025, 6, 1), date(2025, 7, 15), date(2025, 8, 20), date(2025, 9, 5),
+                               date(2026, 3, 3)]
+
+
+def test_year_less_dates_roll_forward():
+    assert fields("It matured on 1 Feb.").dates == [date(2026, 2, 1)]
+
+
+def test_month_abbreviations_inside_words_are_not_dates():
+    assert fields("We have 2 decades of history with 3 junior staff and 4 marketing leads.").dates == []
+
+
+def test_dotted_and_out_of_range_numbers_are_not_dates():
+    assert fields("Upgrade to version 10.11.12, see clause 4.2.1. Ref 13/13/2025 and 32-01-2025.").dates == []
+
+
+def test_rates_accounts_and_signatories():
+    extracted = fields("Refix at 5.25% (or 5.5 per cent) on the account ending in 4321, acct no. xxxx-8765. "
+                       "Our account needs two signatories.")
+    assert extracted.rates == [5.25, 5.5]
+    assert extracted.account_suffixes == ["4321", "8765"]
+    assert extracted.signatories_count == 2
+
+
+def test_sender_name_and_format():
+    assert extract_sender_name('"Ann Lee" <ann@example.com>') == "Ann Lee"
+    assert extract_sender_name("ann@example.com") == ""
+    extracted = fields("Repay $5,000 on 1 June.", sender="Ann Lee <ann@example.com>")
+    assert format_fields(extracted) == ("- sender name: Ann Lee\n- amounts: USD 5,000.00\n- dates: 2025-06-01\n"
+                                        "- authorized signatories: 1")
@@ -0,0 +1,64 @@
+import pytest
+from langchain_chroma import Chroma
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from src.indexing import KnowledgeBaseIndexer, split_source
+from src.retriever import NumpyVectorStore
+
+EMBEDDING = {"provider": "fake", "model": "deterministic", "dimensions": 8}
+KNOWLEDGE = "# Deposits\nTerm deposits pay 4% a year.\n\n# Loans\nPersonal loans start at 7%.\n"
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    embedded: list = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return super().embed_documents(texts)
+
+
+@pytest.fixture
+def indexer(tmp_path):
+    store = Chroma(collection_name="knowledge", persist_directory=str(tmp_path / "chroma"),
+                   embedding_function=CountingEmbeddings(size=8, embedded=[]))
+    return KnowledgeBaseIndexer(store=store, manifest_path=str(tmp_path / "index.json"),
+                                numpy_dir=str(tmp_path / "vectors"), embedding=EMBEDDING)
+
+
+def write(tmp_path, text):
+    path = tmp_path / "agency.txt"
+    path.write_text(text)
+    return str(path)
+
+
+def test_split_source_keys_chunks_by_content():
+    chunks = split_source("kb.txt", KNOWLEDGE)
+    assert [metadata["section"] for _, _, metadata in chunks] == ["Deposits", "Loans"]
+    edited = split_source("kb.txt", KNOWLEDGE.replace("7%", "6%"))
+    assert chunks[0][0] == edited[0][0]
+    assert chunks[1][0] != edited[1][0]
+    # The same text twice gets two ids
+    twice = split_source("kb.txt", "Same.\n\nSame.")
+    assert twice[0][0] != twice[1][0]
+
+
+def test_sync_embeds_only_what_changed(indexer, tmp_path):
+    path = write(tmp_path, KNOWLEDGE)
+    embedded = indexer.store.embeddings.embedded
+    assert indexer.sync([path])["added"] == 2
+    assert indexer.sync([path])["files_skipped"] == 1
+    assert len(embedded) == 2
+    write(tmp_path, KNOWLEDGE.replace("7%", "6%"))
+    stats = indexer.sync([path])
+    assert (stats["added"], stats["deleted"], stats["kept"]) == (1, 1, 1)
+    assert embedded[-1] == "# Loans\nPersonal loans start at 6%."
+    index = NumpyVectorStore.load(indexer.numpy_dir, indexer.store.embeddings, mmap=False)
+    assert sorted(index._index[2]) == sorted(indexer.store.get()["documents"])
+
+
+def test_sync_rebuilds_for_another_embedding_model(indexer, tmp_path):
+    path = write(tmp_path, KNOWLEDGE)
+    indexer.sync([path])
+    indexer.embedding = {**EMBEDDING, "model": "other"}
+    stats = indexer.sync([path])
+    assert (stats["added"], stats["deleted"]) == (2, 2)
+    assert indexer.store._collection.count() == 2
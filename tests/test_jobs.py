@@ -0,0 +1,63 @@
+import threading
+import pytest
+from src.jobs import JobManager
+
+
+class FakeWorkflow:
+    """Runs of one node per item of the initial state's "nodes", failing on "fail"."""
+    node_names = {}
+
+    def __init__(self):
+        self.dropped = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def stream(self, initial_state, **kwargs):
+        self.release.wait(5)
+        for node in initial_state.get("nodes", []):
+            if node == "fail":
+                raise RuntimeError("gmail down")
+            yield {node: {"current_email_id": "1", "email_category": "maturity_repayment"}}
+
+    def drop_queue(self, thread_id):
+        self.dropped.append(thread_id)
+
+
+def finished(manager, job):
+    while not job.done:
+        manager.wait_events(job.id, len(job.events), timeout=1)
+    return job
+
+
+def test_job_records_the_email_status():
+    manager = JobManager(FakeWorkflow())
+    job = finished(manager, manager.submit({"nodes": ["categorize_email", "send_email"]}))
+    assert job.status == "succeeded"
+    assert job.summary() == {"drafted": 1}
+
+
+def test_failed_job_drops_its_queue():
+    workflow = FakeWorkflow()
+    manager = JobManager(workflow)
+    job = finished(manager, manager.submit({"nodes": ["fail"]}))
+    assert job.status == "failed" and job.error == "gmail down"
+    assert workflow.dropped == [job.thread_id]
+
+
+def test_events_of_an_evicted_job_end_cleanly():
+    manager = JobManager(FakeWorkflow(), history=1)
+    first = finished(manager, manager.submit({}))
+    finished(manager, manager.submit({}))
+    assert manager.get(first.id) is None
+    assert manager.wait_events(first.id, after=len(first.events), timeout=0.1) == []
+
+
+def test_profiled_run_is_refused_while_other_runs_are_in_progress():
+    workflow = FakeWorkflow()
+    workflow.release.clear()
+    manager = JobManager(workflow, max_workers=2)
+    running = manager.submit({})
+    with pytest.raises(RuntimeError):
+        manager.submit({}, profile=True)
+    workflow.release.set()
+    finished(manager, running)
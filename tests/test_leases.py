@@ -0,0 +1,72 @@
+from src.nodes import Nodes
+from src.state import Email
+from src.leases import InMemoryLeaseManager
+from src.progress import ProgressStore
+from src.email_queue import InMemoryEmailQueue
+
+EMAIL = Email(id="1", threadId="t1", messageId="m1", references="", sender="alice@example.com",
+              subject="Reinvestment", body="Please reinvest my bond on maturity.")
+
+
+class FakeGmail:
+    def __init__(self):
+        self.drafts = []
+
+    def create_draft_reply(self, email, text):
+        self.drafts.append(email.id)
+        return {"id": "draft"}
+
+
+def worker_state(nodes, owner):
+    """State of a worker that categorized EMAIL and wrote its draft."""
+    nodes.queue.put_many("queue", [EMAIL])
+    assert nodes.leases.acquire(EMAIL.threadId, owner)
+    return {"queue_key": "queue", "current_email_id": EMAIL.id, "lease_owner": owner, "email_category": "reinvestment",
+            "generated_email": "Dear Alice, ...", "sendable": True, "degradation": "", "trials": 1}
+
+
+def take_over(leases, owner, new_owner):
+    """Expires the owner's lease and lets another worker claim it."""
+    assert leases.acquire(EMAIL.threadId, owner, ttl=-1)
+    assert leases.acquire(EMAIL.threadId, new_owner)
+
+
+def make_nodes(tmp_path):
+    return Nodes(progress=ProgressStore(str(tmp_path / "runtime.db")), queue=InMemoryEmailQueue(), agents=object(),
+                 gmail_tools=FakeGmail(), leases=InMemoryLeaseManager())
+
+
+def test_no_draft_once_the_lease_is_taken_over(tmp_path):
+    nodes = make_nodes(tmp_path)
+    state = worker_state(nodes, "worker-a")
+    take_over(nodes.leases, "worker-a", "worker-b")
+
+    update = nodes.create_draft_response(state)
+
+    assert nodes.gmail_tools.drafts == []
+    assert not nodes.progress.get(EMAIL.id).get("drafted")
+    assert update["pending_emails"] == 0
+    # The new owner keeps its lease
+    assert nodes.leases.holder(EMAIL.threadId) == "worker-b"
+
+
+def test_rewrite_skips_the_email_once_the_lease_is_taken_over(tmp_path):
+    nodes = make_nodes(tmp_path)
+    state = worker_state(nodes, "worker-a")
+    take_over(nodes.leases, "worker-a", "worker-b")
+
+    update = nodes.write_draft_email(state)
+
+    assert update == {"leased": True}
+    assert nodes.check_parked({**state, **update}) == "leased"
+    assert nodes.leases.holder(EMAIL.threadId) == "worker-b"
+
+
+def test_draft_created_while_the_lease_is_held(tmp_path):
+    nodes = make_nodes(tmp_path)
+    state = worker_state(nodes, "worker-a")
+
+    nodes.create_draft_response(state)
+
+    assert nodes.gmail_tools.drafts == [EMAIL.id]
+    assert nodes.leases.holder(EMAIL.threadId) is None
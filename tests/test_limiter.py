@@ -0,0 +1,102 @@
+import time
+import threading
+import pytest
+from benchmarks.fake_llm import provider_error
+from src.limiter import TokenBucket, AdaptiveConcurrency, CircuitBreaker, CircuitOpenError, LLMGuard
+
+
+def test_token_bucket_waits_for_the_refill():
+    bucket = TokenBucket(per_minute=600)
+    start = time.monotonic()
+    bucket.acquire(600)
+    assert time.monotonic() - start < 0.05
+    # 10 units per second: 2 units take about 0.2s
+    bucket.acquire(2)
+    assert time.monotonic() - start == pytest.approx(0.2, abs=0.1)
+
+
+def test_token_bucket_caps_a_call_at_its_capacity():
+    bucket = TokenBucket(per_minute=6000)
+    bucket.acquire(10 ** 6)
+    assert bucket.available == pytest.approx(0, abs=1)
+
+
+def test_adaptive_concurrency_halves_and_grows_back():
+    concurrency = AdaptiveConcurrency(max_limit=8)
+    concurrency.acquire()
+    concurrency.release(throttled=True)
+    assert concurrency.limit == 4
+    for _ in range(4):
+        concurrency.acquire()
+        concurrency.release()
+    assert 4.9 < concurrency.limit < 5
+    for _ in range(100):
+        concurrency.acquire()
+        concurrency.release()
+    assert concurrency.limit == 8
+
+
+def test_adaptive_concurrency_blocks_above_the_limit():
+    concurrency = AdaptiveConcurrency(max_limit=1)
+    concurrency.acquire()
+    acquired = threading.Event()
+    waiter = threading.Thread(target=lambda: (concurrency.acquire(), acquired.set()))
+    waiter.start()
+    assert not acquired.wait(0.1)
+    concurrency.release()
+    assert acquired.wait(1)
+    waiter.join(1)
+
+
+def test_circuit_opens_then_lets_one_trial_through():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.1)
+    breaker.record_failure()
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == breaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    time.sleep(0.1)
+    breaker.before_call()
+    assert breaker.state == breaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == breaker.CLOSED
+    breaker.before_call()
+
+
+def test_failed_trial_reopens_the_circuit():
+    breaker = CircuitBreaker(failure_threshold=5, reset_seconds=0)
+    for _ in range(5):
+        breaker.record_failure()
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == breaker.OPEN
+
+
+def guard():
+    return LLMGuard(requests_per_minute=6000, tokens_per_minute=10 ** 6, max_concurrency=4,
+                    breaker=CircuitBreaker(failure_threshold=2, reset_seconds=60))
+
+
+def fail(error):
+    def call():
+        raise error
+    return call
+
+
+def test_guard_opens_the_circuit_on_provider_errors_only():
+    llm_guard = guard()
+    for error in (ValueError("bad output"), provider_error(rate_limited=True), ValueError("bad output")):
+        with pytest.raises(type(error)):
+            llm_guard.call(fail(error), 10)
+    assert llm_guard.breaker.state == CircuitBreaker.CLOSED
+    # Halved by the rate limit error, grown back by the call that reached the provider
+    assert llm_guard.concurrency.limit == 2.5
+    for _ in range(2):
+        with pytest.raises(type(provider_error())):
+            llm_guard.call(fail(provider_error()), 10)
+    with pytest.raises(CircuitOpenError):
+        llm_guard.call(lambda: "draft", 10)
+    assert llm_guard.stats == {"calls": 5, "rate_limited": 1, "provider_errors": 2, "rejected": 1}
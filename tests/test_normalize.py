@@ -0,0 +1,39 @@
+from src.normalize import normalize_body
+
+
+def test_customer_confidential_instruction_is_kept():
+    body = ("Hi,\n\nPlease reinvest on maturity. This instruction is confidential and intended for the FinPower team "
+            "only.\n\nRegards, Ann")
+    assert normalize_body(body) == body
+
+
+def test_disclaimers_are_stripped():
+    body = (
+        "Hi,\n\nPlease reinvest on maturity.\n\nRegards, Ann\n\n"
+        "This e-mail and any attachments are confidential and may be privileged. If you are not the intended "
+        "recipient, please notify the sender and delete it.\n\n"
+        "Please consider the environment before printing this email."
+    )
+    assert normalize_body(body) == "Hi,\n\nPlease reinvest on maturity.\n\nRegards, Ann"
+
+
+def test_disclaimer_received_in_error_is_stripped():
+    body = ("Hello,\n\nWhat is the rate of a 3-year term?\n\n"
+            "The information in this message is intended solely for the addressee. If you have received this "
+            "message in error, please delete it.")
+    assert normalize_body(body) == "Hello,\n\nWhat is the rate of a 3-year term?"
+
+
+def test_transfer_instruction_from_to_lines_are_kept():
+    body = ("Hi,\nPlease move funds as follows\nFrom: term deposit ending 1234\nTo: cheque account ending 5678\n"
+            "Amount: $5,000\nThanks")
+    assert normalize_body(body) == body
+
+
+def test_outlook_header_block_drops_the_quoted_message():
+    body = (
+        "Please repay on maturity.\n\nThanks,\nAnn\n\n"
+        "From: FinPower Operations <ops@finpower.example>\nSent: Monday, 3 March 2025 10:00\n"
+        "To: Ann <ann@example.com>\nSubject: Your term deposit\n\nYour deposit matures on 1 June."
+    )
+    assert normalize_body(body) == "Please repay on maturity.\n\nThanks,\nAnn"
@@ -0,0 +1,59 @@
+from datetime import date, datetime
+import pytest
+from src.email_queue import InMemoryEmailQueue, SqliteEmailQueue
+from src.priority import pre_categorize, base_priority, priority_key, priority_class, days_to_deadline
+from src.state import Email
+
+TODAY = date(2025, 3, 1)
+RECEIVED = datetime(2025, 3, 1, 9).timestamp()
+
+
+def email(email_id, body, subject="", hours_ago=0):
+    return Email(id=email_id, threadId=f"t{email_id}", messageId=f"m{email_id}", references="",
+                 sender="alice@example.com", subject=subject, body=body,
+                 internalDate=int((RECEIVED - hours_ago * 3600) * 1000))
+
+
+def test_pre_category_from_keywords():
+    assert pre_categorize(email("1", "Please repay the deposit.")) == "maturity_repayment"
+    assert pre_categorize(email("1", "", subject="Reinvestment on maturity")) == "maturity_reinvestment"
+    assert pre_categorize(email("1", "We would like to fix the rate.")) == "refix_interest_rate"
+    assert pre_categorize(email("1", "Lunch on Friday?")) == "unrelated"
+
+
+def test_nearer_deadlines_rank_higher():
+    soon = email("1", "Please reinvest, it matures on 3 March.")
+    later = email("2", "Please reinvest, it matures on 10 March.")
+    undated = email("3", "Please reinvest on maturity.")
+    assert days_to_deadline(soon, TODAY) == 2
+    assert days_to_deadline(undated, TODAY) is None
+    assert base_priority(soon, TODAY) > base_priority(later, TODAY) > base_priority(undated, TODAY) == 24
+    # Past dates are no deadline
+    assert days_to_deadline(email("4", "It matured on 1 Feb 2025."), TODAY) is None
+
+
+def test_priority_class():
+    assert priority_class(email("1", "Please reinvest, it matures on 3 March."), TODAY) == "urgent"
+    assert priority_class(email("2", "Please reinvest on maturity."), TODAY) == "normal"
+    assert priority_class(email("3", "Lunch on Friday?"), TODAY) == "low"
+
+
+def test_waiting_emails_age_past_newer_urgent_ones():
+    old_low = email("1", "Lunch on Friday?", hours_ago=30)
+    new_normal = email("2", "Please reinvest on maturity.")
+    assert priority_key(old_low) > priority_key(new_normal)
+    assert priority_key(email("3", "Lunch on Friday?", hours_ago=10)) < priority_key(new_normal)
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_queue_serves_the_highest_priority_first(backend, tmp_path):
+    queue = InMemoryEmailQueue() if backend == "memory" else SqliteEmailQueue(str(tmp_path / "queue.db"))
+    emails = [email("low", "Lunch on Friday?"), email("normal", "Please reinvest on maturity."),
+              email("low2", "Lunch on Saturday?"), email("repay", "Please repay the deposit.")]
+    queue.put_many("q", emails)
+    served = []
+    while queue.peek("q"):
+        served.append(queue.peek("q"))
+        queue.remove("q", served[-1])
+    # Equal priorities are served last-in first-out
+    assert served == ["repay", "normal", "low2", "low"]
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from src.retriever import NumpyVectorStore, load_index
+
+
+@pytest.fixture
+def store():
+    store = NumpyVectorStore(DeterministicFakeEmbedding(size=16))
+    store.add_embeddings(["north", "east", "south"], [[0, 1], [1, 0], [0, -1]],
+                         [{"source": "n"}, {"source": "e"}, {"source": "s"}], ["n", "e", "s"])
+    return store
+
+
+def test_search_returns_the_exact_top_k_best_first(store):
+    assert store.search_by_vector([0.1, 2], k=2) == [(0, pytest.approx(0.9988, abs=1e-4)),
+                                                     (1, pytest.approx(0.0499, abs=1e-4))]
+    # k above the number of chunks returns them all
+    assert [row for row, _ in store.search_by_vector([1, -0.1], k=10)] == [1, 2, 0]
+    assert store.search_by_vector([1, 0], k=0) == []
+
+
+def test_documents_carry_their_id_and_metadata(store):
+    document, score = store.similarity_search_with_score_by_vector([0, 3], k=1)[0]
+    assert (document.id, document.page_content, document.metadata) == ("n", "north", {"source": "n"})
+    assert score == pytest.approx(1.0)
+
+
+def test_delete_removes_rows_by_id(store):
+    assert store.delete(["e", "missing"])
+    assert not store.delete(["missing"])
+    assert len(store) == 2
+    assert [document.id for document in store.similarity_search_by_vector([1, 0], k=2)] == ["n", "s"]
+
+
+def test_relevance_scores_stay_within_zero_and_one(store):
+    relevance = store._select_relevance_score_fn()
+    assert relevance(-1.0) == 0.0
+    assert relevance(1.0000001) == 1.0
+    assert relevance(0.5) == 0.5
+
+
+def test_save_and_load_round_trip(store, tmp_path):
+    store.save(str(tmp_path))
+    loaded = NumpyVectorStore.load(str(tmp_path), store.embedding, mmap=False)
+    assert len(loaded) == 3
+    assert np.allclose(np.linalg.norm(loaded._index[0], axis=1), 1)
+    assert loaded.similarity_search_by_vector([0, -5], k=1)[0].page_content == "south"
+    # Saving again replaces the index read by later loads
+    loaded.delete(["s"])
+    loaded.save(str(tmp_path))
+    assert load_index.cache_info().currsize == 0
+    assert len(NumpyVectorStore.load(str(tmp_path), store.embedding, mmap=False)) == 2
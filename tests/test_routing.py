@@ -0,0 +1,63 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from langchain_core.runnables import RunnableLambda
+from src.routing import HedgedRunnable, LatencyWindow
+
+
+def hedged(function):
+    chain = HedgedRunnable(RunnableLambda(function), "test", min_delay=0.05, min_samples=2)
+    for _ in range(2):
+        chain.latencies.record(0.01)
+    return chain
+
+
+def test_latency_window_percentile():
+    window = LatencyWindow(size=3)
+    assert window.percentile(95) is None
+    for seconds in (5, 1, 2, 3):
+        window.record(seconds)
+    assert len(window) == 3
+    assert window.percentile(50) == 2
+    assert window.percentile(100) == 3
+
+
+def test_fast_call_is_not_hedged():
+    chain = hedged(lambda x: x + 1)
+    assert chain.invoke(1) == 2
+    assert chain.hedged_calls == 0
+
+
+def test_slow_call_is_duplicated_and_the_first_answer_wins():
+    calls = []
+    lock = threading.Lock()
+
+    def first_call_slow(x):
+        with lock:
+            calls.append(x)
+            slow = len(calls) == 1
+        time.sleep(1 if slow else 0)
+        return "slow" if slow else "fast"
+
+    chain = hedged(first_call_slow)
+    assert chain.invoke(1) == "fast"
+    assert chain.hedged_calls == 1
+
+
+def test_error_of_both_calls_is_raised():
+    def fail(x):
+        time.sleep(0.1)
+        raise ValueError("provider down")
+
+    with pytest.raises(ValueError):
+        hedged(fail).invoke(1)
+
+
+def test_hedged_calls_are_counted_across_threads():
+    chain = hedged(lambda x: time.sleep(0.1) or x)
+    # Every call outlasts the delay, whatever latencies the window records meanwhile
+    chain.hedge_delay = lambda: 0.01
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        assert list(pool.map(chain.invoke, range(16))) == list(range(16))
+    assert chain.hedged_calls == 16
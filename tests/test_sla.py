@@ -0,0 +1,41 @@
+from src.sla import SlaTracker, SLA_SECONDS, stage_latencies, sla_seconds
+from src.state import Email
+
+
+def email(internal_date=0, detected_at=0.0):
+    return Email(id="1", threadId="t1", messageId="m1", references="", sender="alice@example.com",
+                 subject="Maturity", body="Please reinvest.", internalDate=internal_date, detected_at=detected_at)
+
+
+def test_stage_latencies_split_the_wait():
+    stages = stage_latencies(email(internal_date=100_000, detected_at=130.0), started_at=150.0,
+                             write_started_at=170.0, drafted_at=171.5)
+    assert stages == {"detection": 30.0, "queue_wait": 20.0, "processing": 20.0, "gmail_write": 1.5, "total": 71.5}
+
+
+def test_stage_latencies_skip_unknown_timestamps():
+    assert set(stage_latencies(email(), 0.0, 2.0, 3.0)) == {"processing", "gmail_write"}
+
+
+def test_sla_of_a_category_can_be_overridden(monkeypatch):
+    monkeypatch.setenv("SLA_SECONDS_MATURITY_REPAYMENT", "900")
+    assert sla_seconds("maturity_repayment") == 900
+    assert sla_seconds("maturity_reinvestment") == SLA_SECONDS
+
+
+def test_category_alerts_on_breach_and_recovers(monkeypatch):
+    monkeypatch.setenv("SLA_SECONDS_MATURITY_REPAYMENT", "60")
+    tracker = SlaTracker(percentile=50, min_samples=3, alert_webhook="", window=3)
+    alerts = []
+    monkeypatch.setattr(tracker, "_alert", lambda category, breached, latency: alerts.append((category, breached)))
+    for total in (90, 100):
+        tracker.record("maturity_repayment", {"total": total})
+    assert tracker.alerts() == []
+    tracker.record("maturity_repayment", {"total": 30})
+    assert tracker.alerts() == ["maturity_repayment"]
+    for total in (20, 10):
+        tracker.record("maturity_repayment", {"total": total})
+    assert tracker.alerts() == []
+    assert alerts == [("maturity_repayment", True), ("maturity_repayment", False)]
+    report = tracker.report()["maturity_repayment"]
+    assert (report["sla_seconds"], report["breaches"], report["alert"]) == (60, 2, False)